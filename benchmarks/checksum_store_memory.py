@@ -0,0 +1,68 @@
+"""
+Compares the memory needed to hold the checksums of a large runfolder in a plain dict and in a
+CompactChecksumStore, as well as the time needed for lookups.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.checksum_store_memory [number of files]
+"""
+import hashlib
+import sys
+import time
+import tracemalloc
+
+from delivery.models.checksums import CompactChecksumStore
+
+
+def synthetic_checksums(nbr_of_files):
+    runfolder = "180124_A00181_0019_BH72M5DMXX"
+    checksums = []
+    for i in range(nbr_of_files):
+        # eight files per sample, i.e. two reads on each of four lanes, and 96 samples per project
+        sample_no = i // 8
+        project = "AB-{}".format(sample_no // 96)
+        sample = "Sample_{}".format(sample_no)
+        path = "{}/Unaligned/{}/{}/{}_S{}_L00{}_R{}_001.fastq.gz".format(
+            runfolder, project, sample, sample, sample_no % 96 + 1, (i % 8) // 2 + 1, i % 2 + 1)
+        checksums.append((path, hashlib.md5(path.encode()).hexdigest()))
+    return checksums
+
+
+def measure(build, entries):
+    tracemalloc.start()
+    obj = build(entries)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, peak
+
+
+def time_lookups(obj, paths):
+    start = time.perf_counter()
+    for path in paths:
+        obj[path]
+    return (time.perf_counter() - start) / len(paths)
+
+
+def main(nbr_of_files):
+    lines = ["{}  {}\n".format(checksum, path) for path, checksum in synthetic_checksums(nbr_of_files)]
+
+    def _entries():
+        for line in lines:
+            checksum, path = line.strip().split(maxsplit=1)
+            yield path, checksum
+
+    as_dict, dict_size, dict_peak = measure(lambda entries: {path: checksum for path, checksum in entries}, _entries())
+    compact, compact_size, compact_peak = measure(CompactChecksumStore, _entries())
+    assert as_dict == compact
+
+    paths = list(as_dict.keys())
+    print("files:                    {:>12,}".format(nbr_of_files))
+    print("dict size (bytes):        {:>12,}  peak while building: {:,}".format(dict_size, dict_peak))
+    print("compact size (bytes):     {:>12,}  peak while building: {:,}".format(compact_size, compact_peak))
+    print("reduction:                {:>12.1f}x".format(dict_size / compact_size))
+    print("dict lookup (us):         {:>12.2f}".format(time_lookups(as_dict, paths) * 1e6))
+    print("compact lookup (us):      {:>12.2f}".format(time_lookups(compact, paths) * 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
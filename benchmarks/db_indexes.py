@@ -0,0 +1,129 @@
+"""
+Compares the time needed for the hot repository queries against a database holding a large number of staging
+and delivery orders, with and without the indexes on the queried columns.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.db_indexes [number of orders]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from delivery.models.db_models import SQLAlchemyBase, StagingOrder, StagingStatus, DeliveryOrder, DeliveryStatus, \
+    DeliverySource
+from delivery.repositories.deliveries_repository import DatabaseBasedDeliveriesRepository
+from delivery.repositories.delivery_sources_repository import DatabaseBasedDeliverySourcesRepository
+from delivery.repositories.staging_repository import DatabaseBasedStagingRepository
+
+# the indexes which are dropped to get the timings without indexes
+INDEXES = ["ix_staging_orders_source",
+           "ix_staging_orders_status",
+           "ix_delivery_orders_delivery_source",
+           "ix_delivery_orders_delivery_status",
+           "ix_delivery_sources_project_name_batch"]
+
+# the number of times each query is repeated
+NBR_OF_QUERIES = 50
+
+INSERT_CHUNK_SIZE = 50000
+
+
+def source_path(i):
+    return "/proj/ngi2016001/incoming/180124_A00181_{:04d}_BH72M5DMXX/Projects/AB-{}".format(i // 10, i)
+
+
+def project_name(i):
+    return "AB-{}".format(i // 10)
+
+
+def _status(i, finished, in_progress):
+    # almost all orders have finished, and one in a thousand is still in progress
+    return in_progress.name if i % 1000 == 0 else finished.name
+
+
+def populate(engine, nbr_of_orders):
+    def _insert(table, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == INSERT_CHUNK_SIZE:
+                engine.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            engine.execute(table.insert(), chunk)
+
+    _insert(StagingOrder.__table__,
+            ({"source": source_path(i),
+              "status": _status(i, StagingStatus.staging_successful, StagingStatus.staging_in_progress),
+              "priority": 0} for i in range(nbr_of_orders)))
+    _insert(DeliveryOrder.__table__,
+            ({"delivery_source": source_path(i),
+              "delivery_project": project_name(i),
+              "delivery_status": _status(i, DeliveryStatus.delivery_successful, DeliveryStatus.delivery_in_progress),
+              "staging_order_id": i + 1} for i in range(nbr_of_orders)))
+    _insert(DeliverySource.__table__,
+            ({"project_name": project_name(i),
+              "source_name": "batch{}".format(i % 10),
+              "path": source_path(i),
+              "batch": i % 10 + 1} for i in range(nbr_of_orders)))
+
+
+def time_queries(session_factory, nbr_of_orders):
+    staging_repo = DatabaseBasedStagingRepository(session_factory)
+    delivery_repo = DatabaseBasedDeliveriesRepository(session_factory)
+    delivery_sources_repo = DatabaseBasedDeliverySourcesRepository(session_factory)
+
+    rand = random.Random(42)
+    order_nbrs = [rand.randrange(nbr_of_orders) for _ in range(NBR_OF_QUERIES)]
+    queries = [
+        ("staging orders by source",
+         lambda i: staging_repo.get_staging_order_by_source(source_path(i))),
+        ("staging orders by status",
+         lambda i: staging_repo.get_staging_orders_by_status(StagingStatus.staging_in_progress)),
+        ("delivery orders by source",
+         lambda i: delivery_repo.get_delivery_orders_for_source(source_path(i))),
+        ("delivery orders by status",
+         lambda i: delivery_repo.get_delivery_orders_by_status(DeliveryStatus.delivery_in_progress)),
+        ("highest batch of a project",
+         lambda i: delivery_sources_repo.find_highest_batch_nbr(project_name(i))),
+    ]
+
+    timings = []
+    for name, query in queries:
+        start = time.perf_counter()
+        for i in order_nbrs:
+            query(i)
+        timings.append((name, (time.perf_counter() - start) / len(order_nbrs)))
+    return timings
+
+
+def main(nbr_of_orders):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine("sqlite:///{}".format(os.path.join(tmp_dir, "benchmark.db")))
+        SQLAlchemyBase.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+
+        start = time.perf_counter()
+        populate(engine, nbr_of_orders)
+        print("orders:                       {:>12,}  (inserted in {:.1f} s)".format(
+            nbr_of_orders, time.perf_counter() - start))
+
+        with_indexes = time_queries(session_factory, nbr_of_orders)
+        for index in INDEXES:
+            engine.execute("DROP INDEX {}".format(index))
+        without_indexes = time_queries(session_factory, nbr_of_orders)
+
+        print("{:<28}  {:>12}  {:>12}  {:>9}".format("query (ms)", "no indexes", "indexes", "speedup"))
+        for (name, indexed), (_, unindexed) in zip(with_indexes, without_indexes):
+            print("{:<28}  {:>12.3f}  {:>12.3f}  {:>8.0f}x".format(name, unindexed * 1e3, indexed * 1e3,
+                                                                  unindexed / indexed))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
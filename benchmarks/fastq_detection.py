@@ -0,0 +1,138 @@
+"""
+Compares the time needed to find out which directories in the Unaligned directory of a runfolder are projects, i.e.
+have fastq files beneath them, in a synthetic runfolder where each project also holds a deep tree of QC output
+without any fastq files, and the Reports directory holds a deep tree of html files.
+
+The order in which the entries of a directory are listed depends on the file system, and decides how much of a QC
+tree a depth-first walk goes through before it gets to the samples. The inventories used are therefore sorted by name,
+which puts the QC trees first, the worst case for a depth-first walk. The detectors compared are:
+
+    os.walk             the original detector, `any` over `os.walk` of each directory, in the order of the file system
+    scan + bfs          a scan of the Unaligned directory into a new FileInventory, followed by
+                        FileInventory.contains_file_with_suffix, i.e. the whole cost of a cold detection
+    inventory, walk     `any` over the files of each directory in the FileInventory, in the order of os.walk
+    inventory, bfs      FileInventory.contains_file_with_suffix, on a new inventory
+    inventory, memo     FileInventory.contains_file_with_suffix, on an inventory where all directories have been
+                        checked before
+
+The rows starting with "inventory" do not include the time of the scan. The scan is not made for the detection
+alone: the project repository scans the Unaligned directory once, and then also finds the reports and the samples
+of the projects in the inventory, so it is shared between them. For a single cold detection, the inventory is
+slower than os.walk.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.fastq_detection [number of projects] [depth of the QC trees]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from delivery.services.file_system_service import FileSystemService
+
+SAMPLES_PER_PROJECT = 20
+
+# the number of subdirectories of each directory in the QC trees, and the number of files in each of them
+QC_FANOUT = 2
+QC_FILES_PER_DIR = 3
+
+# the number of times each detector is run
+NBR_OF_ROUNDS = 5
+
+FASTQ_SUFFIX = "fastq.gz"
+
+
+def _touch(path):
+    open(path, "w").close()
+
+
+def _make_qc_tree(path, depth):
+    os.makedirs(path)
+    for i in range(QC_FILES_PER_DIR):
+        _touch(os.path.join(path, "plot_{}.png".format(i)))
+    if depth > 1:
+        for i in range(QC_FANOUT):
+            _make_qc_tree(os.path.join(path, "qc_{}".format(i)), depth - 1)
+
+
+def populate(unaligned_dir, nbr_of_projects, qc_depth):
+    for p in range(nbr_of_projects):
+        project_dir = os.path.join(unaligned_dir, "AB-{}".format(p))
+        _make_qc_tree(os.path.join(project_dir, "QC"), qc_depth)
+        for s in range(SAMPLES_PER_PROJECT):
+            sample_dir = os.path.join(project_dir, "Sample_{}".format(s))
+            os.makedirs(sample_dir)
+            for read in ("R1", "R2"):
+                _touch(os.path.join(sample_dir, "Sample_{}_S{}_L001_{}_001.fastq.gz".format(s, s + 1, read)))
+    _make_qc_tree(os.path.join(unaligned_dir, "Reports"), qc_depth)
+
+
+def detect_with_os_walk(unaligned_dir):
+    filesystem_service = FileSystemService()
+    return [d for d in filesystem_service.find_project_directories(unaligned_dir)
+            if any(f.endswith(FASTQ_SUFFIX) for f in filesystem_service.list_files_recursively(d))]
+
+
+def detect_with_inventory_walk(inventory):
+    return [d for d in inventory.directories()
+            if any(f.endswith(FASTQ_SUFFIX) for f in inventory.files(d))]
+
+
+def detect_with_inventory_bfs(inventory):
+    return [d for d in inventory.directories()
+            if inventory.contains_file_with_suffix(d, FASTQ_SUFFIX)]
+
+
+def scan_sorted(unaligned_dir):
+    inventory = FileSystemService.scan_tree(unaligned_dir)
+    for entries in inventory._children.values():
+        entries.sort(key=lambda entry: entry.name)
+    return inventory
+
+
+def _time(f, setup=lambda: None):
+    total = 0
+    for _ in range(NBR_OF_ROUNDS):
+        arg = setup()
+        start = time.perf_counter()
+        result = f(arg)
+        total += time.perf_counter() - start
+    return total / NBR_OF_ROUNDS, result
+
+
+def main(nbr_of_projects, qc_depth):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        unaligned_dir = os.path.join(tmp_dir, "Unaligned")
+        populate(unaligned_dir, nbr_of_projects, qc_depth)
+        scan_time, inventory = _time(lambda _: scan_sorted(unaligned_dir))
+        warm_inventory = scan_sorted(unaligned_dir)
+        detect_with_inventory_bfs(warm_inventory)
+
+        timings = [
+            ("os.walk", _time(lambda _: detect_with_os_walk(unaligned_dir))),
+            ("scan + bfs", _time(lambda _: detect_with_inventory_bfs(scan_sorted(unaligned_dir)))),
+            ("inventory, walk", _time(detect_with_inventory_walk, lambda: inventory)),
+            ("inventory, bfs", _time(detect_with_inventory_bfs, lambda: scan_sorted(unaligned_dir))),
+            ("inventory, memo", _time(detect_with_inventory_bfs, lambda: warm_inventory)),
+        ]
+        results = set(tuple(sorted(result)) for _, (_, result) in timings)
+        assert len(results) == 1, "the detectors found different projects"
+
+        print("projects: {}, directories: {}, scan of the Unaligned directory: {:.3f} ms".format(
+            len(results.pop()), len(inventory._children), scan_time * 1e3))
+        print("the rows starting with 'inventory' exclude the scan, which is shared with finding the samples and "
+              "reports")
+        print("{:<20}  {:>10}  {:>9}".format("detector", "time (ms)", "speedup"))
+        baseline = timings[0][1][0]
+        for name, (elapsed, _) in timings:
+            print("{:<20}  {:>10.3f}  {:>8.1f}x".format(name, elapsed * 1e3, baseline / elapsed))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 8)
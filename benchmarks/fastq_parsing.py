@@ -0,0 +1,74 @@
+"""
+Compares the time needed to create SampleFile objects from the paths of the files in a project, by parsing the files
+one by one with `sample_file_from_sample_path`, as the sample repository used to, and with the batch parser
+`sample_files_from_sample_paths`. No files are created, the paths are parsed and looked up in the checksums of the
+runfolder only.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.fastq_parsing [number of files]
+"""
+import os
+import re
+import sys
+import time
+
+from delivery.models.runfolder import Runfolder
+from delivery.repositories.sample_repository import RunfolderProjectBasedSampleRepository
+
+# one in this many files in the project is not a fastq file
+NON_FASTQ_INTERVAL = 10
+
+# the number of times each parser is run
+NBR_OF_ROUNDS = 3
+
+
+def project_paths(project_path, nbr_of_files):
+    for i in range(nbr_of_files):
+        sample = i // 8
+        if i % NON_FASTQ_INTERVAL == 0:
+            yield os.path.join(project_path, "Sample_{}".format(sample), "Sample_{}.stats.json".format(sample))
+        else:
+            yield os.path.join(
+                project_path,
+                "Sample_{}".format(sample),
+                "Sample_{}_S{}_L00{}_{}{}_001.fastq.gz".format(sample, sample + 1, i % 8 // 2 + 1, "RI"[i % 3 == 0],
+                                                              i % 2 + 1))
+
+
+def parse_one_by_one(sample_repo, paths, runfolder):
+    return [sample_repo.sample_file_from_sample_path(path, runfolder)
+            for path in paths if re.match(sample_repo.filename_regexp, path) is not None]
+
+
+def parse_in_batch(sample_repo, paths, runfolder):
+    return sample_repo.sample_files_from_sample_paths(paths, runfolder)
+
+
+def main(nbr_of_files):
+    runfolder = Runfolder(name="180124_A00181_0019_BH72M5DMXX", path="/proj/incoming/180124_A00181_0019_BH72M5DMXX")
+    paths = list(project_paths(os.path.join(runfolder.path, "Unaligned", "AB-1234"), nbr_of_files))
+    runfolder.checksums = {os.path.relpath(path, os.path.dirname(runfolder.path)): "{:032x}".format(i)
+                           for i, path in enumerate(paths)}
+    sample_repo = RunfolderProjectBasedSampleRepository()
+
+    timings = []
+    for name, parser in [("one by one", parse_one_by_one), ("batch", parse_in_batch)]:
+        elapsed = float("inf")
+        for _ in range(NBR_OF_ROUNDS):
+            start = time.perf_counter()
+            sample_files = parser(sample_repo, paths, runfolder)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        timings.append((name, elapsed, sample_files))
+
+    assert timings[0][2] == timings[1][2], "the parsers gave different results"
+
+    print("files: {:,}, sample files: {:,}".format(len(paths), len(timings[0][2])))
+    print("{:<12}  {:>10}  {:>14}  {:>8}".format("parser", "time (ms)", "per file (us)", "speedup"))
+    for name, elapsed, _ in timings:
+        print("{:<12}  {:>10.1f}  {:>14.2f}  {:>7.1f}x".format(
+            name, elapsed * 1e3, elapsed / len(paths) * 1e6, timings[0][1] / elapsed))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
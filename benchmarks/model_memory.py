@@ -0,0 +1,83 @@
+"""
+Reports the memory used by the models of a runfolder with a large number of fastq files, i.e. the Runfolder, its
+RunfolderProjects, their Samples and the SampleFile of each file, as created by the sample repository. The models are
+measured together with the strings they hold, but not the listed paths and the checksums they are created from.
+
+Run from the root of the repository with:
+
+    python -m benchmarks.model_memory [number of files]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+from delivery.models.project import RunfolderProject
+from delivery.models.runfolder import Runfolder
+from delivery.repositories.sample_repository import RunfolderProjectBasedSampleRepository
+
+PROJECTS = 10
+FILES_PER_SAMPLE = 8
+
+
+def file_paths(runfolder, nbr_of_files):
+    files_per_project = nbr_of_files // PROJECTS
+    for p in range(PROJECTS):
+        project_path = os.path.join(runfolder.path, "Unaligned", "AB-{}".format(p))
+        paths = []
+        for i in range(files_per_project):
+            sample = i // FILES_PER_SAMPLE
+            paths.append(os.path.join(
+                project_path,
+                "Sample_{}".format(sample),
+                "Sample_{}_S{}_L00{}_R{}_001.fastq.gz".format(sample, sample + 1, i % 8 // 2 + 1, i % 2 + 1)))
+        yield project_path, paths
+
+
+def create_models(runfolder, paths_by_project):
+    sample_repo = RunfolderProjectBasedSampleRepository()
+    projects = []
+    for project_path, paths in paths_by_project:
+        project = RunfolderProject(
+            name=os.path.basename(project_path),
+            path=project_path,
+            runfolder_path=runfolder.path,
+            runfolder_name=runfolder.name)
+        project.samples = list(sample_repo.get_samples(project, runfolder, inventory=_FakeInventory(paths)))
+        projects.append(project)
+    runfolder.projects = projects
+    return runfolder
+
+
+class _FakeInventory(object):
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def files(self, path):
+        return iter(self.paths)
+
+
+def main(nbr_of_files):
+    runfolder = Runfolder(name="180124_A00181_0019_BH72M5DMXX", path="/proj/incoming/180124_A00181_0019_BH72M5DMXX")
+    paths_by_project = list(file_paths(runfolder, nbr_of_files))
+    checksums = {os.path.relpath(path, os.path.dirname(runfolder.path)): "{:032x}".format(i)
+                 for i, path in enumerate(path for _, paths in paths_by_project for path in paths)}
+    runfolder.checksums = checksums
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    create_models(runfolder, paths_by_project)
+    gc.collect()
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    used = sum(stat.size_diff for stat in end.compare_to(start, "filename"))
+    nbr_of_sample_files = sum(len(sample.sample_files) for project in runfolder.projects for sample in project.samples)
+    print("sample files: {:,}, memory used by the models: {:.1f} MiB, {:.0f} bytes per file".format(
+        nbr_of_sample_files, used / 2 ** 20, used / nbr_of_sample_files))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000)
@@ -1,10 +1,12 @@
 
 import os
 
+from concurrent.futures import ThreadPoolExecutor
+
 from tornado.web import URLSpec as url
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import sessionmaker
 
 from alembic.config import Config as AlembicConfig
 from alembic.command import upgrade as upgrade_db
@@ -15,13 +17,16 @@ from delivery.handlers.utility_handlers import VersionHandler
 from delivery.handlers.runfolder_handlers import RunfolderHandler
 from delivery.handlers.project_handlers import ProjectHandler, ProjectsForRunfolderHandler, \
     BestPracticeProjectSampleHandler
-from delivery.handlers.delivery_handlers import DeliverByStageIdHandler, DeliveryStatusHandler
+from delivery.handlers.delivery_handlers import DeliverByStageIdHandler, DeliveryStatusHandler, \
+    DeliveryStatusesHandler
 from delivery.handlers.staging_handlers import StagingRunfolderHandler, StagingHandler,\
-    StageGeneralDirectoryHandler, StagingProjectRunfoldersHandler
-from delivery.handlers.organise_handlers import OrganiseRunfolderHandler
+    StageGeneralDirectoryHandler, StagingProjectRunfoldersHandler, StagingStatusesHandler
+from delivery.handlers.organise_handlers import OrganiseRunfolderHandler, OrganiseStatusHandler
 
 from delivery.repositories.runfolder_repository import FileSystemBasedRunfolderRepository, \
-    FileSystemBasedUnorganisedRunfolderRepository
+    FileSystemBasedUnorganisedRunfolderRepository, IndexedRunfolderRepository
+from delivery.repositories.runfolder_index_repository import DatabaseBasedRunfolderIndexRepository
+from delivery.repositories.organise_repository import DatabaseBasedOrganiseRepository
 from delivery.repositories.staging_repository import DatabaseBasedStagingRepository
 from delivery.repositories.deliveries_repository import DatabaseBasedDeliveriesRepository
 from delivery.repositories.project_repository import GeneralProjectRepository, UnorganisedRunfolderProjectRepository
@@ -32,11 +37,14 @@ from delivery.repositories.sample_repository import RunfolderProjectBasedSampleR
 from delivery.services.mover_service import MoverDeliveryService
 from delivery.services.external_program_service import ExternalProgramService
 from delivery.services.staging_service import StagingService
+from delivery.services.staging_backends import RsyncStagingBackend, NativeCopyStagingBackend, LinkStagingBackend, \
+    ChecksumVerifyingStagingBackend
 from delivery.services.file_system_service import FileSystemService
 from delivery.services.delivery_service import DeliveryService
 from delivery.services.runfolder_service import RunfolderService
 from delivery.services.best_practice_analysis_service import BestPracticeAnalysisService
 from delivery.services.organise_service import OrganiseService
+from delivery.services.metadata_service import CachingMetadataService, ChecksumFileCache
 
 
 def routes(**kwargs):
@@ -58,6 +66,7 @@ def routes(**kwargs):
 
         url(r"/api/1.0/organise/runfolder/([^/]+)", OrganiseRunfolderHandler,
             name="organise_runfolder", kwargs=kwargs),
+        url(r"/api/1.0/organise/(\d+)", OrganiseStatusHandler, name="organise_status", kwargs=kwargs),
 
         url(r"/api/1.0/stage/project/runfolders/(.+)", StagingProjectRunfoldersHandler,
             name="stage_multiple_runfolders_one_project", kwargs=kwargs),
@@ -66,11 +75,14 @@ def routes(**kwargs):
         url(r"/api/1.0/stage/project/(.+)", StageGeneralDirectoryHandler,
             name="stage_project", kwargs=kwargs),
 
+        url(r"/api/1.0/stage", StagingStatusesHandler, name="stage_statuses", kwargs=kwargs),
         url(r"/api/1.0/stage/(\d+)", StagingHandler, name="stage_status", kwargs=kwargs),
 
         url(r"/api/1.0/deliver/stage_id/(.+)", DeliverByStageIdHandler,
             name="delivery_by_state_id", kwargs=kwargs),
 
+        url(r"/api/1.0/deliver/status", DeliveryStatusesHandler,
+            name="delivery_statuses", kwargs=kwargs),
         url(r"/api/1.0/deliver/status/(.+)", DeliveryStatusHandler,
             name="delivery_status", kwargs=kwargs),
 
@@ -94,6 +106,55 @@ def create_and_migrate_db(db_engine, alembic_path, db_connection_string):
         upgrade_db(alembic_cfg, "head")
 
 
+def get_optional_config_value(config, key, default):
+    """
+    Get a value from the configuration, falling back to a default if the key has not been configured. This is
+    used for configuration options which have been added later on, so that older configuration files remain valid.
+    :param config: a configuration instance
+    :param key: to look up
+    :param default: value to return if the key is not present in the configuration
+    :return: the configured value, or the default
+    """
+    try:
+        return config[key]
+    except KeyError:
+        return default
+
+
+def create_staging_backend(config, external_program_service):
+    """
+    Create the backend which copies the files of staging orders, as set by `staging_backend` in the config
+    :param config: the application config
+    :param external_program_service: a instance of ExternalProgramService
+    :return: a instance of StagingBackend
+    """
+    backend_name = get_optional_config_value(config, "staging_backend", "rsync")
+    # the native and link backends, the verification, and the partitioning of the source between parallel rsync
+    # processes, do their work in a thread pool, so that it does not block the IOLoop
+    rsync_backend = RsyncStagingBackend(external_program_service,
+                                        rsync_workers=get_optional_config_value(config, "staging_rsync_workers", 1),
+                                        executor=ThreadPoolExecutor(max_workers=1))
+
+    if backend_name == "rsync":
+        backend = rsync_backend
+    elif backend_name == "native":
+        backend = NativeCopyStagingBackend(executor=ThreadPoolExecutor(
+            max_workers=get_optional_config_value(config, "staging_native_copy_workers", 8)))
+    elif backend_name == "link":
+        backend = LinkStagingBackend(executor=ThreadPoolExecutor(
+            max_workers=get_optional_config_value(config, "max_concurrent_stagings", None) or 1),
+            fallback_backend=rsync_backend)
+    else:
+        raise ValueError("Unknown staging_backend: {}, valid backends are: rsync, native and link".format(
+            backend_name))
+
+    if get_optional_config_value(config, "staging_verify_checksums", False):
+        backend = ChecksumVerifyingStagingBackend(backend, executor=ThreadPoolExecutor(
+            max_workers=get_optional_config_value(config, "max_concurrent_stagings", None) or 1))
+
+    return backend
+
+
 def compose_application(config):
     """
     Instantiates all service, repos, etc which are then used by the application.
@@ -116,13 +177,17 @@ def compose_application(config):
     project_links_directory = config["project_links_directory"]
     _assert_is_dir(project_links_directory)
 
-    runfolder_repo = FileSystemBasedRunfolderRepository(runfolder_dir)
+    metadata_service = CachingMetadataService(
+        ChecksumFileCache(max_checksums=get_optional_config_value(config, "checksum_cache_max_checksums", 500000)))
+
     project_repository = UnorganisedRunfolderProjectRepository(
-        sample_repository=RunfolderProjectBasedSampleRepository()
+        sample_repository=RunfolderProjectBasedSampleRepository(),
+        metadata_service=metadata_service
     )
     unorganised_runfolder_repo = FileSystemBasedUnorganisedRunfolderRepository(
         runfolder_dir,
-        project_repository=project_repository
+        project_repository=project_repository,
+        metadata_service=metadata_service
     )
 
     general_project_dir = config['general_project_directory']
@@ -137,18 +202,36 @@ def compose_application(config):
     alembic_path = config["alembic_path"]
     create_and_migrate_db(engine, alembic_path, db_connection_string)
 
-    session_factory = scoped_session(sessionmaker())
-    session_factory.configure(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    if get_optional_config_value(config, "use_runfolder_index", False):
+        runfolder_index_repo = DatabaseBasedRunfolderIndexRepository(session_factory=session_factory)
+        runfolder_repo = IndexedRunfolderRepository(
+            runfolder_dir,
+            runfolder_index_repo=runfolder_index_repo,
+            refresh_interval=get_optional_config_value(config, "runfolder_index_refresh_interval", 60),
+            metadata_service=metadata_service)
+    else:
+        runfolder_repo = FileSystemBasedRunfolderRepository(runfolder_dir, metadata_service=metadata_service)
 
     staging_repo = DatabaseBasedStagingRepository(session_factory=session_factory)
 
+    staging_backend = create_staging_backend(config, external_program_service)
+
     staging_service = StagingService(external_program_service=external_program_service,
                                      runfolder_repo=runfolder_repo,
                                      project_dir_repo=general_project_repo,
                                      staging_repo=staging_repo,
                                      staging_dir=staging_dir,
                                      project_links_directory=project_links_directory,
-                                     session_factory=session_factory)
+                                     max_concurrent_stagings=get_optional_config_value(
+                                         config, "max_concurrent_stagings", None),
+                                     max_concurrent_stagings_per_device=get_optional_config_value(
+                                         config, "max_concurrent_stagings_per_device", None),
+                                     staging_backend=staging_backend)
+
+    # resume any stagings which were interrupted when the service was last stopped
+    staging_service.restart_unfinished_orders()
 
     delivery_repo = DatabaseBasedDeliveriesRepository(session_factory=session_factory)
 
@@ -156,8 +239,13 @@ def compose_application(config):
     mover_delivery_service = MoverDeliveryService(external_program_service=external_program_service,
                                                   staging_service=staging_service,
                                                   delivery_repo=delivery_repo,
-                                                  session_factory=session_factory,
-                                                  path_to_mover=path_to_mover)
+                                                  path_to_mover=path_to_mover,
+                                                  max_concurrent_status_polls=get_optional_config_value(
+                                                      config, "mover_status_max_concurrent_polls", 10))
+
+    mover_status_poll_interval = get_optional_config_value(config, "mover_status_poll_interval", None)
+    if mover_status_poll_interval:
+        mover_delivery_service.start_status_poller(mover_status_poll_interval)
 
     delivery_sources_repo = DatabaseBasedDeliverySourcesRepository(session_factory=session_factory)
     runfolder_service = RunfolderService(runfolder_repo)
@@ -171,8 +259,13 @@ def compose_application(config):
 
     best_practice_analysis_service = BestPracticeAnalysisService(general_project_repo)
 
+    organise_repo = DatabaseBasedOrganiseRepository(session_factory=session_factory)
+    organise_executor = ThreadPoolExecutor(
+        max_workers=get_optional_config_value(config, "organise_max_workers", 1))
     organise_service = OrganiseService(
-        runfolder_service=RunfolderService(unorganised_runfolder_repo))
+        runfolder_service=RunfolderService(unorganised_runfolder_repo),
+        organise_repo=organise_repo,
+        executor=organise_executor)
 
     return dict(config=config,
                 runfolder_repo=runfolder_repo,
@@ -84,3 +84,10 @@ class ProjectsDirNotfoundException(Exception):
     Should be raised when a directory containing projects could not be found
     """
     pass
+
+
+class StagingFailedException(Exception):
+    """
+    Should be raised by a staging backend when the staging of a StagingOrder did not succeed
+    """
+    pass
@@ -5,7 +5,8 @@ import logging
 from tornado.gen import coroutine
 
 from delivery.handlers import *
-from delivery.handlers.utility_handlers import ArteriaDeliveryBaseHandler
+from delivery.handlers.utility_handlers import ArteriaDeliveryBaseHandler, MAX_PAGE_SIZE
+from delivery.models.db_models import DeliveryStatus
 
 log = logging.getLogger(__name__)
 
@@ -57,9 +58,95 @@ class DeliveryStatusHandler(ArteriaDeliveryBaseHandler):
 
     @coroutine
     def get(self, delivery_order_id):
-        delivery_order = yield self.mover_delivery_service.update_delivery_status(delivery_order_id)
+        """
+        Returns the status of the delivery order. If the service polls Mover for the status of the deliveries in the
+        background, the status from the last poll is returned, otherwise Mover is asked for the status. The status
+        last reported by Mover, and when (in UTC) it was reported, are included. Return format looks like:
+        {
+           "id": 1,
+           "status": "delivery_in_progress",
+           "mover_delivery_id": "TestCase_31-ngi2016001-1484739218",
+           "mover_status": "Pending",
+           "mover_status_updated_at": "2017-01-19T00:23:31.123456"
+        }
+        """
+        delivery_order = yield self.mover_delivery_service.get_delivery_order_with_status(delivery_order_id)
+
+        self.write_json(_delivery_order_status_as_dict(delivery_order))
+        self.set_status(OK)
+
 
-        self.write_json({'id': delivery_order.id,
-                         'status': delivery_order.delivery_status.name,
-                         'mover_delivery_id': delivery_order.mover_delivery_id})
+class DeliveryStatusesHandler(ArteriaDeliveryBaseHandler):
+
+    def initialize(self, **kwargs):
+        self.mover_delivery_service = kwargs["mover_delivery_service"]
+        super(DeliveryStatusesHandler, self).initialize(kwargs)
+
+    def get(self):
+        """
+        Returns the status of many delivery orders at once, e.g. for dashboards. The delivery orders can be
+        filtered on a comma separated list of (at most 1000) ids, a project and a status with the query arguments
+        `ids`, `project` and `status`, e.g:
+
+            /api/1.0/deliver/status?project=ABC_123&status=delivery_in_progress
+
+        The orders are listed by id, a page at a time. The size of the page is set with `limit` (100 by default,
+        and at most 1000), and the page with `offset`. If there are more matching orders, a link to the next page
+        is included. The statuses are read from the database, so Mover is not asked for them, and they are as of
+        the last poll of Mover, if the service polls Mover in the background. Return format looks like:
+        {
+           "delivery_orders": [
+              {
+                 "id": 1,
+                 "status": "delivery_in_progress",
+                 "mover_delivery_id": "TestCase_31-ngi2016001-1484739218",
+                 "mover_status": "Pending",
+                 "mover_status_updated_at": "2017-01-19T00:23:31.123456"
+              }
+           ],
+           "next": "http://localhost:8080/api/1.0/deliver/status?project=ABC_123&offset=100&limit=100"
+        }
+        """
+        delivery_order_ids = self.get_list_argument("ids")
+        delivery_project = self.get_query_argument("project", None)
+        delivery_status = self.get_query_argument("status", None)
+        offset, limit = self.get_paging_arguments()
+
+        if delivery_order_ids is not None and len(delivery_order_ids) > MAX_PAGE_SIZE:
+            self.set_status(BAD_REQUEST, reason="At most {} ids can be given".format(MAX_PAGE_SIZE))
+            return
+
+        try:
+            if delivery_order_ids is not None:
+                delivery_order_ids = [int(delivery_order_id) for delivery_order_id in delivery_order_ids]
+            if delivery_status is not None:
+                delivery_status = DeliveryStatus[delivery_status]
+        except (ValueError, KeyError):
+            self.set_status(BAD_REQUEST,
+                            reason="ids have to be integers, and status one of: {}".format(
+                                [s.name for s in DeliveryStatus]))
+            return
+
+        # ask for one more order than fits on the page, to find out if there is a next page
+        delivery_orders = self.mover_delivery_service.get_delivery_orders(delivery_order_ids=delivery_order_ids,
+                                                                          delivery_project=delivery_project,
+                                                                          delivery_status=delivery_status,
+                                                                          offset=offset,
+                                                                          limit=limit + 1)
+        next_page = self.page_link("delivery_statuses", offset + limit, limit) \
+            if len(delivery_orders) > limit else None
+
+        self.write_json({'delivery_orders': [_delivery_order_status_as_dict(delivery_order)
+                                             for delivery_order in delivery_orders[:limit]],
+                         'next': next_page})
         self.set_status(OK)
+
+
+def _delivery_order_status_as_dict(delivery_order):
+    mover_status_updated_at = delivery_order.mover_status_updated_at.isoformat() \
+        if delivery_order.mover_status_updated_at else None
+    return {'id': delivery_order.id,
+            'status': delivery_order.delivery_status.name,
+            'mover_delivery_id': delivery_order.mover_delivery_id,
+            'mover_status': delivery_order.mover_status,
+            'mover_status_updated_at': mover_status_updated_at}
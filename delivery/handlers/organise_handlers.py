@@ -3,14 +3,20 @@ import logging
 
 from arteria.web.handlers import BaseRestHandler
 from delivery.exceptions import ProjectsDirNotfoundException, ChecksumFileNotFoundException, FileNameParsingException, \
-    SamplesheetNotFoundException, ProjectReportNotFoundException, ProjectAlreadyOrganisedException
-from delivery.handlers import OK, NOT_FOUND, INTERNAL_SERVER_ERROR, FORBIDDEN
+    SamplesheetNotFoundException, ProjectReportNotFoundException, ProjectAlreadyOrganisedException, \
+    RunfolderNotFoundException, ProjectNotFoundException
+from delivery.handlers import OK, ACCEPTED, NOT_FOUND, INTERNAL_SERVER_ERROR, FORBIDDEN
 
 log = logging.getLogger(__name__)
 
 
 class BaseOrganiseHandler(BaseRestHandler):
-    pass
+
+    def _construct_status_endpoint(self, status_id):
+        status_end_point = "{0}://{1}{2}".format(self.request.protocol,
+                                                 self.request.host,
+                                                 self.reverse_url("organise_status", status_id))
+        return status_end_point
 
 
 class OrganiseRunfolderHandler(BaseOrganiseHandler):
@@ -44,6 +50,15 @@ class OrganiseRunfolderHandler(BaseOrganiseHandler):
         The return format looks like:
             {"organised_path": "/path/to/organised/runfolder/160930_ST-E00216_0111_BH37CWALXX"}
 
+        If the flag 'async' is set in the request body, the runfolder will be organised in the background instead,
+        and status 202 is returned together with the id of an organise order and a link that can be queried for the
+        status of the organisation. E.g:
+
+            payload = "{'projects': ['ABC_123'], 'async': True}"
+
+        The return format then looks like:
+            {"organise_order_id": 12, "organise_order_link": "http://localhost:8080/api/1.0/organise/12"}
+
         """
 
         log.info("Trying to organise runfolder with id: {}".format(runfolder_id))
@@ -63,13 +78,23 @@ class OrganiseRunfolderHandler(BaseOrganiseHandler):
                     [force, lanes, projects]))
 
         try:
+            if request_data.get("async", False):
+                organise_order = self.organise_service.create_organise_order(runfolder_id, lanes, projects, force)
+                self.set_status(ACCEPTED)
+                self.write_json({
+                    "organise_order_id": organise_order.id,
+                    "organise_order_link": self._construct_status_endpoint(organise_order.id)})
+                return
+
             organised_runfolder = self.organise_service.organise_runfolder(runfolder_id, lanes, projects, force)
 
             self.set_status(OK)
             self.write_json({
                 "runfolder": organised_runfolder.path,
                 "projects": [project.name for project in organised_runfolder.projects]})
-        except (ProjectsDirNotfoundException,
+        except (RunfolderNotFoundException,
+                ProjectNotFoundException,
+                ProjectsDirNotfoundException,
                 ChecksumFileNotFoundException,
                 SamplesheetNotFoundException,
                 ProjectReportNotFoundException) as e:
@@ -81,3 +106,34 @@ class OrganiseRunfolderHandler(BaseOrganiseHandler):
         except FileNameParsingException as e:
             log.error(str(e), exc_info=e)
             self.set_status(INTERNAL_SERVER_ERROR, reason=str(e))
+
+
+class OrganiseStatusHandler(BaseOrganiseHandler):
+    """
+    Handler class for checking the status of runfolders being organised in the background
+    """
+
+    def initialize(self, organise_service, **kwargs):
+        self.organise_service = organise_service
+
+    def get(self, organise_order_id):
+        """
+        Returns the current status as json of the organise order, or 404 if the order is unknown.
+        Possible values for status are: pending, organising_in_progress, organising_successful, organising_failed
+        Return format looks like:
+        {
+           "status": "organising_successful",
+           "runfolder": "/path/to/organised/runfolder/160930_ST-E00216_0111_BH37CWALXX",
+           "projects": ["ABC_123"],
+           "message": null
+        }
+        """
+        organise_order = self.organise_service.get_organise_order_by_id(organise_order_id)
+        if organise_order:
+            self.write_json({
+                "status": organise_order.status.name,
+                "runfolder": organise_order.organised_path,
+                "projects": organise_order.projects.split(",") if organise_order.projects else [],
+                "message": organise_order.message})
+        else:
+            self.set_status(NOT_FOUND, reason="No organise order with id: {} found.".format(organise_order_id))
@@ -2,12 +2,15 @@
 import logging
 
 from tornado.gen import coroutine
+from tornado.web import HTTPError
 
 from arteria.web.handlers import BaseRestHandler
 
 from delivery.handlers import *
+from delivery.handlers.utility_handlers import ArteriaDeliveryBaseHandler
 from delivery.exceptions import ProjectNotFoundException,ProjectAlreadyDeliveredException
 
+from delivery.models.db_models import StagingStatus
 from delivery.models.delivery_modes import DeliveryMode
 
 log = logging.getLogger(__name__)
@@ -30,6 +33,20 @@ class BaseStagingHandler(BaseRestHandler):
 
         return link_results, id_results
 
+    @staticmethod
+    def _priority_from_request(request_data):
+        """
+        Get the priority of the staging orders to create from the body of a request, which defaults to 0
+        :param request_data: the body of the request as a dict
+        :return: the priority as an int
+        :raises HTTPError: with status BAD_REQUEST if the priority is not an integer
+        """
+        priority = request_data.get("priority", 0)
+        # bool is a subclass of int, but true or false is not a priority
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise HTTPError(BAD_REQUEST, reason="priority has to be an integer")
+        return priority
+
 
 class StagingProjectRunfoldersHandler(BaseStagingHandler):
     """
@@ -56,7 +73,8 @@ class StagingProjectRunfoldersHandler(BaseStagingHandler):
 
             url = "http://molmed-43:8080/api/1.0/stage/project/runfolders/ABC_123"
 
-            payload = {'delivery_mode': 'BATCH'}
+            # the priority is optional, orders with a higher priority are staged first
+            payload = {'delivery_mode': 'BATCH', 'priority': 10}
             headers = {
             'content-type': "application/json",
             }
@@ -77,11 +95,13 @@ class StagingProjectRunfoldersHandler(BaseStagingHandler):
             request_data = {}
 
         requested_delivery_mode = request_data.get("delivery_mode", None)
+        priority = self._priority_from_request(request_data)
         try:
             delivery_mode = DeliveryMode[requested_delivery_mode]
             log.info("Will attempt to stage runfolders for project {} with type {}".format(project_id, delivery_mode))
 
-            project_and_stage_id, projects = self.delivery_service.deliver_all_runfolders_for_project(project_id, delivery_mode)
+            project_and_stage_id, projects = self.delivery_service.deliver_all_runfolders_for_project(
+                project_id, delivery_mode, priority=priority)
             links, staging_ids_ids = self._construct_response_from_project_and_status(project_and_stage_id)
             project_and_staged_id_dict = list(map(lambda project: project.to_dict(), projects))
 
@@ -122,13 +142,14 @@ class StagingRunfolderHandler(BaseStagingHandler):
         Attempt to stage projects from the the specified runfolder, so that they can then be delivered.
         Will return a set of status links, one for each project that can be queried for the status of
         that staging attempt. A list of project names can be specified in the request body to limit which projects
-        should be staged. E.g:
+        should be staged, and a priority can be given to the staging orders, where orders with a higher priority
+        are staged first. E.g:
 
             import requests
 
             url = "http://localhost:8080/api/1.0/stage/runfolder/160930_ST-E00216_0111_BH37CWALXX"
 
-            payload = "{'projects': ['ABC_123']}"
+            payload = "{'projects': ['ABC_123'], 'priority': 10}"
             headers = {
                 'content-type': "application/json",
             }
@@ -152,12 +173,14 @@ class StagingRunfolderHandler(BaseStagingHandler):
         try:
             projects_to_stage = request_data.get("projects", [])
             force_delivery = request_data.get("force_delivery", False)
+            priority = self._priority_from_request(request_data)
 
             log.debug("Got the following projects to stage: {}".format(projects_to_stage))
 
             staging_order_projects_and_ids = self.delivery_service.deliver_single_runfolder(runfolder_id,
                                                                                             projects_to_stage,
-                                                                                            force_delivery)
+                                                                                            force_delivery,
+                                                                                            priority=priority)
 
             link_results, id_results = self._construct_response_from_project_and_status(staging_order_projects_and_ids)
 
@@ -195,8 +218,8 @@ class StageGeneralDirectoryHandler(BaseStagingHandler):
             }
 
             # Optionally send a project alias (when the name of the dir is something else
-            than the project name) or force the delivery
-            data = {"project_alias": "my_test_project_batch1", "force_delivery": "True"}
+            than the project name), force the delivery or give the staging order a priority
+            data = {"project_alias": "my_test_project_batch1", "force_delivery": "True", "priority": 10}
 
             response = requests.request("POST", url, data='', headers=headers)
 
@@ -217,12 +240,14 @@ class StageGeneralDirectoryHandler(BaseStagingHandler):
 
         project_alias = request_data.get("project_alias", None)
         force_delivery = request_data.get("force_delivery", False)
+        priority = self._priority_from_request(request_data)
 
         try:
             stage_order_and_id = self.delivery_service.\
                 deliver_arbitrary_directory_project(project_name=directory_name,
                                                     dir_name=project_alias,
-                                                    force_delivery=force_delivery)
+                                                    force_delivery=force_delivery,
+                                                    priority=priority)
 
             link_results, id_results = self._construct_response_from_project_and_status(stage_order_and_id)
 
@@ -241,14 +266,26 @@ class StagingHandler(BaseRestHandler):
         """
         Returns the current status as json of the of the staging order, or 404 if the order is unknown.
         Possible values for status are: pending, staging_in_progress, staging_successful, staging_failed
+        While the staging is in progress, the number of bytes transferred so far, the transfer rate in bytes per
+        second and the estimated number of seconds remaining are updated periodically. If the staged files are
+        verified against their checksums, any files which were missing or did not match are listed. The project
+        and the creation time (in UTC) are null for orders created before they were recorded.
         Return format looks like:
         {
-           "status": "staging_successful"
+           "id": 12,
+           "project_name": "ABC_123",
+           "created_at": "2017-01-19T00:23:31.123456",
+           "status": "staging_in_progress",
+           "size": null,
+           "bytes_transferred": 207707566,
+           "transfer_rate": 103557529.6,
+           "eta": 2,
+           "checksum_mismatches": []
         }
         """
         stage_order = self.delivery_service.check_staging_status(stage_id)
         if stage_order:
-            self.write_json({'status': stage_order.status.name, 'size': stage_order.size})
+            self.write_json(_staging_order_status_as_dict(stage_order))
         else:
             self.set_status(NOT_FOUND, reason='No stage order with id: {} found.'.format(stage_id))
 
@@ -266,3 +303,80 @@ class StagingHandler(BaseRestHandler):
                                    "which allows it to be killed, or the pid associated with the stage order "
                                    "did not allow itself to be killed. Consult the server logs for an exact "
                                    "reason.")
+
+
+class StagingStatusesHandler(ArteriaDeliveryBaseHandler):
+
+    def initialize(self, delivery_service, **kwargs):
+        self.delivery_service = delivery_service
+        super(StagingStatusesHandler, self).initialize(**kwargs)
+
+    def get(self):
+        """
+        Returns the status of many staging orders at once, e.g. for monitoring. The staging orders can be filtered
+        on status, project and creation time (in UTC) with the query arguments `status`, `project`,
+        `created_after` and `created_before`, where the times are dates, or dates and times, in ISO 8601 format, e.g:
+
+            /api/1.0/stage?status=staging_in_progress&created_after=2017-01-19T00:00:00
+
+        The orders are listed by id, a page at a time. The size of the page is set with `limit` (100 by default,
+        and at most 1000), and the page with `offset`. If there are more matching orders, a link to the next page
+        is included. Each order is described as by the status endpoint of a single order. Return format looks like:
+        {
+           "staging_orders": [
+              {
+                 "id": 12,
+                 "project_name": "ABC_123",
+                 "created_at": "2017-01-19T00:23:31.123456",
+                 "status": "staging_in_progress",
+                 "size": null,
+                 "bytes_transferred": 207707566,
+                 "transfer_rate": 103557529.6,
+                 "eta": 2,
+                 "checksum_mismatches": []
+              }
+           ],
+           "next": "http://localhost:8080/api/1.0/stage?status=staging_in_progress&offset=100&limit=100"
+        }
+        """
+        status = self.get_query_argument("status", None)
+        project_name = self.get_query_argument("project", None)
+        created_after = self.get_datetime_argument("created_after")
+        created_before = self.get_datetime_argument("created_before")
+        offset, limit = self.get_paging_arguments()
+
+        if status is not None:
+            try:
+                status = StagingStatus[status]
+            except KeyError:
+                self.set_status(BAD_REQUEST,
+                                reason="status has to be one of: {}".format([s.name for s in StagingStatus]))
+                return
+
+        # ask for one more order than fits on the page, to find out if there is a next page
+        stage_orders = self.delivery_service.check_staging_statuses(status=status,
+                                                                    project_name=project_name,
+                                                                    created_after=created_after,
+                                                                    created_before=created_before,
+                                                                    offset=offset,
+                                                                    limit=limit + 1)
+        next_page = self.page_link("stage_statuses", offset + limit, limit) if len(stage_orders) > limit else None
+
+        self.write_json({'staging_orders': [_staging_order_status_as_dict(stage_order)
+                                            for stage_order in stage_orders[:limit]],
+                         'next': next_page})
+        self.set_status(OK)
+
+
+def _staging_order_status_as_dict(stage_order):
+    checksum_mismatches = stage_order.checksum_mismatches.split("\n") if stage_order.checksum_mismatches else []
+    created_at = stage_order.created_at.isoformat() if stage_order.created_at else None
+    return {'id': stage_order.id,
+            'project_name': stage_order.project_name,
+            'created_at': created_at,
+            'status': stage_order.status.name,
+            'size': stage_order.size,
+            'bytes_transferred': stage_order.bytes_transferred,
+            'transfer_rate': stage_order.transfer_rate,
+            'eta': stage_order.eta,
+            'checksum_mismatches': checksum_mismatches}
@@ -1,9 +1,20 @@
 
 import json
+import datetime
+from urllib.parse import urlencode
 
 from arteria.web.handlers import BaseRestHandler
+from tornado.web import HTTPError
 
 from delivery import __version__ as version
+from delivery.handlers import BAD_REQUEST
+
+# The number of items in a page of a list, unless another limit is requested, and the largest limit allowed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# The formats accepted for query arguments holding a date, or a date and time
+DATETIME_ARGUMENT_FORMATS = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f"]
 
 
 class ArteriaDeliveryBaseHandler(BaseRestHandler):
@@ -20,13 +31,79 @@ class ArteriaDeliveryBaseHandler(BaseRestHandler):
         """
         self.config = config
 
+    @staticmethod
+    def _model_as_dict(model):
+        if hasattr(model, "to_dict"):
+            return model.to_dict()
+        return model.__dict__
+
     def write_list_of_models_as_json(self, model_list, key):
         if model_list:
-            as_json = json.dumps({key: model_list}, default=lambda x: x.__dict__)
+            as_json = json.dumps({key: model_list}, default=self._model_as_dict)
             self.write_json(as_json)
         else:
             self.write_json({key: list()})
 
+    def get_list_argument(self, name):
+        """
+        Get a query argument which holds a comma separated list, and may be repeated, e.g. `?ids=1,2&ids=3`
+        :param name: of the argument
+        :return: a list of the values, or None if the argument was not given
+        """
+        values = [value for argument in self.get_query_arguments(name) for value in argument.split(",") if value]
+        return values or None
+
+    def get_datetime_argument(self, name):
+        """
+        Get a query argument which holds a date, or a date and time, in ISO 8601 format, e.g. `2017-01-19` or
+        `2017-01-19T00:23:31`
+        :param name: of the argument
+        :return: the argument as a datetime, or None if the argument was not given
+        :raises HTTPError: with status BAD_REQUEST if the argument is not a valid date
+        """
+        value = self.get_query_argument(name, None)
+        if value is None:
+            return None
+        for datetime_format in DATETIME_ARGUMENT_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, datetime_format)
+            except ValueError:
+                pass
+        raise HTTPError(BAD_REQUEST, reason="{} has to be a date or a date and time in ISO 8601 format".format(name))
+
+    def get_paging_arguments(self):
+        """
+        Get the `offset` and `limit` query arguments used to page through a list. The limit defaults to
+        DEFAULT_PAGE_SIZE, and may not be larger than MAX_PAGE_SIZE.
+        :return: the offset and the limit as a tuple
+        :raises HTTPError: with status BAD_REQUEST if the arguments are not valid
+        """
+        try:
+            offset = int(self.get_query_argument("offset", 0))
+            limit = int(self.get_query_argument("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise HTTPError(BAD_REQUEST, reason="offset and limit have to be integers")
+        if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+            raise HTTPError(BAD_REQUEST, reason="offset has to be positive, and limit between 1 and {}".format(
+                MAX_PAGE_SIZE))
+        return offset, limit
+
+    def page_link(self, url_name, offset, limit):
+        """
+        Construct a link to a page of a list, keeping any other query arguments of the current request
+        :param url_name: the name of the route for the list
+        :param offset: of the page
+        :param limit: of the page
+        :return: the link
+        """
+        query_arguments = {name: [value.decode() for value in values]
+                           for name, values in self.request.query_arguments.items()}
+        query_arguments.update(offset=offset, limit=limit)
+        return "{0}://{1}{2}?{3}".format(self.request.protocol,
+                                         self.request.host,
+                                         self.reverse_url(url_name),
+                                         urlencode(query_arguments, doseq=True))
+
 
 class VersionHandler(ArteriaDeliveryBaseHandler):
 
@@ -1,9 +1,45 @@
 
 
 class BaseModel(object):
-    
+
+    # models with many instances declare their attributes in __slots__, and present them with a `to_dict` method
+    __slots__ = ()
+
     def __str__(self):
+        if hasattr(self, "to_dict"):
+            return str(self.to_dict())
         return str(self.__dict__)
 
     def __repr__(self):
         return self.__str__()
+
+
+class IdentifiedModel(BaseModel):
+    """
+    Base class for models which are identified by an immutable key, typically made from the path of a file or
+    directory on disk, so that they can be used in sets and as keys in dicts, e.g. to memoise results in the
+    repositories. Models which are equal always have the same key. The key is made the first time it is needed and is
+    then kept on the instance, so the attributes it is made from must not be changed after that.
+    """
+
+    __slots__ = ("_identity_key",)
+
+    def _identity(self):
+        """
+        :return: a tuple of the immutable values which identify the model
+        """
+        raise NotImplementedError()
+
+    @property
+    def identity_key(self):
+        try:
+            return self._identity_key
+        except AttributeError:
+            self._identity_key = self._identity()
+            return self._identity_key
+
+    def __eq__(self, other):
+        return isinstance(other, IdentifiedModel) and self.identity_key == other.identity_key
+
+    def __hash__(self):
+        return hash(self.identity_key)
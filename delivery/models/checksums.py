@@ -0,0 +1,151 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+
+class CompactChecksumStore(Mapping):
+    """
+    A read-only mapping of file paths to MD5 checksums, which uses a fraction of the memory of a dict holding the same
+    data. This matters for runfolders with tens of thousands of files, whose checksums are kept in memory.
+
+    The paths are grouped by directory, so that each directory is only stored once, and the file names are stored
+    sorted in a single byte string. The checksums are stored as 16 byte binary digests. Looking up a path is done
+    with binary searches on the directories and the file names. Checksums which are not lowercase hexadecimal MD5
+    digests are stored as they are, on the side.
+    """
+
+    DIGEST_SIZE = 16
+
+    ENCODING = "utf-8"
+    ENCODING_ERRORS = "surrogatepass"
+
+    def __init__(self, checksums=()):
+        """
+        Instantiate a new CompactChecksumStore
+        :param checksums: a mapping of paths to checksums, or an iterable of (path, checksum) tuples. If the same path
+        occurs more than once, the last checksum is used.
+        """
+        if isinstance(checksums, Mapping):
+            checksums = checksums.items()
+
+        # the entries are first stored compactly in the order they are given, with the indices of the entries in
+        # each directory on the side, so that only the file names of one directory at a time have to be held as
+        # objects while they are sorted
+        names, name_offsets, digests, other_checksums = bytearray(), array("L", [0]), bytearray(), {}
+        entries_by_dir = {}
+        for path, checksum in checksums:
+            directory, name = self._split(path)
+            index = len(name_offsets) - 1
+            entries_by_dir.setdefault(directory, array("L")).append(index)
+            names.extend(name.encode(self.ENCODING, self.ENCODING_ERRORS))
+            name_offsets.append(len(names))
+            self._add_checksum(checksum, index, digests, other_checksums)
+
+        self._dirs = sorted(entries_by_dir)
+        self._dir_starts = array("L")
+        self._name_offsets = array("L", [0])
+        self._other_checksums = {}
+        sorted_names = bytearray()
+        sorted_digests = bytearray()
+
+        for directory in self._dirs:
+            self._dir_starts.append(len(self._name_offsets) - 1)
+            # entries for the same path are sorted by their index, i.e. in the order they were given
+            dir_entries = sorted(
+                (bytes(names[name_offsets[index]:name_offsets[index + 1]]), index)
+                for index in entries_by_dir.pop(directory))
+            for i, (name, index) in enumerate(dir_entries):
+                # only keep the last of the entries for the same path
+                if i + 1 < len(dir_entries) and dir_entries[i + 1][0] == name:
+                    continue
+                sorted_names.extend(name)
+                self._name_offsets.append(len(sorted_names))
+                if index in other_checksums:
+                    self._other_checksums[len(self._name_offsets) - 2] = other_checksums[index]
+                sorted_digests.extend(digests[index * self.DIGEST_SIZE:(index + 1) * self.DIGEST_SIZE])
+
+        self._dir_starts.append(len(self._name_offsets) - 1)
+        self._names = bytes(sorted_names)
+        self._digests = bytes(sorted_digests)
+
+    @classmethod
+    def _add_checksum(cls, checksum, index, digests, other_checksums):
+        digest = cls._to_digest(checksum)
+        if isinstance(digest, bytes):
+            digests.extend(digest)
+        else:
+            other_checksums[index] = digest
+            digests.extend(bytes(cls.DIGEST_SIZE))
+
+    @staticmethod
+    def _split(path):
+        """
+        Split a path into a directory part, including the trailing separator, and a file name part, so that the
+        path can be restored by concatenating them.
+        """
+        split_at = path.rfind("/") + 1
+        return path[:split_at], path[split_at:]
+
+    @classmethod
+    def _to_digest(cls, checksum):
+        """
+        Convert a hexadecimal MD5 checksum to a binary digest. Checksums which could not be restored from their
+        digests are returned unchanged.
+        """
+        if len(checksum) == 2 * cls.DIGEST_SIZE and checksum == checksum.lower():
+            try:
+                digest = bytes.fromhex(checksum)
+                if len(digest) == cls.DIGEST_SIZE:
+                    return digest
+            except ValueError:
+                pass
+        return checksum
+
+    def _name(self, index):
+        return self._names[self._name_offsets[index]:self._name_offsets[index + 1]]
+
+    def _checksum(self, index):
+        if index in self._other_checksums:
+            return self._other_checksums[index]
+        return self._digests[index * self.DIGEST_SIZE:(index + 1) * self.DIGEST_SIZE].hex()
+
+    def _find(self, path):
+        directory, name = self._split(path)
+        dir_index = bisect_left(self._dirs, directory)
+        if dir_index == len(self._dirs) or self._dirs[dir_index] != directory:
+            return None
+
+        name = name.encode(self.ENCODING, self.ENCODING_ERRORS)
+        lo, hi = self._dir_starts[dir_index], self._dir_starts[dir_index + 1]
+        end = hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < end and self._name(lo) == name:
+            return lo
+        return None
+
+    def __getitem__(self, path):
+        if not isinstance(path, str):
+            raise KeyError(path)
+        index = self._find(path)
+        if index is None:
+            raise KeyError(path)
+        return self._checksum(index)
+
+    def __contains__(self, path):
+        return isinstance(path, str) and self._find(path) is not None
+
+    def __iter__(self):
+        for dir_index, directory in enumerate(self._dirs):
+            for index in range(self._dir_starts[dir_index], self._dir_starts[dir_index + 1]):
+                yield directory + self._name(index).decode(self.ENCODING, self.ENCODING_ERRORS)
+
+    def __len__(self):
+        return len(self._name_offsets) - 1
+
+    def __repr__(self):
+        return "CompactChecksumStore({} checksums)".format(len(self))
@@ -1,8 +1,9 @@
 
 import os
+import datetime
 import enum as base_enum
 
-from sqlalchemy import Column, Integer, BigInteger, String, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Enum, Float, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 """
@@ -30,6 +31,9 @@ class DeliverySource(SQLAlchemyBase):
 
     batch = Column(Integer, nullable=False, default=1)
 
+    # The highest batch number of a project is looked up when delivering a new batch of it
+    __table_args__ = (Index('ix_delivery_sources_project_name_batch', 'project_name', 'batch'),)
+
     def __repr__(self):
         return "Delivery source: {project_name: %s, source: %s, path: %s, batch: %s}" % \
                (self.project_name,
@@ -61,11 +65,17 @@ class StagingOrder(SQLAlchemyBase):
     # Unique identified of the staging
     id = Column(Integer, primary_key=True, autoincrement=True)
 
-    # The directory or file which should be staged
-    source = Column(String, nullable=False)
+    # The directory or file which should be staged, indexed since orders are looked up by source
+    source = Column(String, nullable=False, index=True)
+
+    # The name of the project which is staged, indexed since the staging orders of a project are listed together
+    project_name = Column(String, index=True)
 
-    # The current status of the staging order
-    status = Column(Enum(StagingStatus), nullable=False)
+    # When (in UTC) the order was created, indexed since staging orders are listed by creation time
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+    # The current status of the staging order, indexed since orders are looked up by status
+    status = Column(Enum(StagingStatus), nullable=False, index=True)
 
     # The target path into which the file/directory will be moved
     staging_target = Column(String)
@@ -77,6 +87,18 @@ class StagingOrder(SQLAlchemyBase):
     # which did do it if the status is no longer in progress.
     pid = Column(Integer)
 
+    # Pending orders with a higher priority are staged before orders with a lower priority
+    priority = Column(Integer, nullable=False, default=0)
+
+    # The progress of the staging as last reported by rsync: the number of bytes transferred so far,
+    # the transfer rate in bytes per second and the estimated number of seconds remaining.
+    bytes_transferred = Column(BigInteger)
+    transfer_rate = Column(Float)
+    eta = Column(Integer)
+
+    # The staged files which did not match their checksums, one per line, if the staging was verified
+    checksum_mismatches = Column(String)
+
     def get_staging_path(self):
         return os.path.join(self.staging_target)
 
@@ -110,8 +132,10 @@ class DeliveryOrder(SQLAlchemyBase):
     __tablename__ = 'delivery_orders'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    delivery_source = Column(String, nullable=False)
-    delivery_project = Column(String, nullable=False)
+    # Indexed since delivery orders are looked up by source
+    delivery_source = Column(String, nullable=False, index=True)
+    # Indexed since the delivery orders of a project are listed together
+    delivery_project = Column(String, nullable=False, index=True)
 
     # Optional path to md5sum file
     md5sum_file = Column(String)
@@ -123,7 +147,14 @@ class DeliveryOrder(SQLAlchemyBase):
     # a delivery status
     mover_delivery_id = Column(String)
 
-    delivery_status = Column(Enum(DeliveryStatus))
+    # Indexed since delivery orders are looked up by status, e.g. when polling Mover
+    delivery_status = Column(Enum(DeliveryStatus), index=True)
+
+    # The status last reported by moverinfo for a delivery in progress, e.g. "Delivered",
+    # and when (in UTC) it was reported
+    mover_status = Column(String)
+    mover_status_updated_at = Column(DateTime)
+
     # TODO This should really be enforcing a foreign key constraint
     # against the staging order table, but this does not seem to
     # be simple to get working with sqlite and alembic, so I'm
@@ -135,3 +166,93 @@ class DeliveryOrder(SQLAlchemyBase):
                                                                                    self.delivery_source,
                                                                                    self.delivery_project,
                                                                                    self.delivery_status)
+
+
+class OrganiseStatus(base_enum.Enum):
+    """
+    Enumerate possible organise statuses
+    """
+
+    pending = 'pending'
+
+    organising_in_progress = 'organising_in_progress'
+    organising_successful = 'organising_successful'
+    organising_failed = 'organising_failed'
+
+
+class OrganiseOrder(SQLAlchemyBase):
+    """
+    Models an order to organise a runfolder, which is carried out in the background. Code using it is responsible
+    for updating the status, and the outcome of the organisation, as this information becomes available.
+    """
+
+    __tablename__ = 'organise_orders'
+
+    # Unique identifier of the organise order
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    # The name of the runfolder which should be organised
+    runfolder = Column(String, nullable=False)
+
+    # The current status of the organise order
+    status = Column(Enum(OrganiseStatus), nullable=False)
+
+    # The path to the organised runfolder, once it has been organised successfully
+    organised_path = Column(String)
+
+    # A comma-separated list of the projects which were organised
+    projects = Column(String)
+
+    # A message describing why the organisation failed
+    message = Column(String)
+
+    def __repr__(self):
+        return "Organise order: {id: %s, runfolder: %s, status: %s}" % (str(self.id),
+                                                                         self.runfolder,
+                                                                         self.status)
+
+
+class RunfolderIndexEntry(SQLAlchemyBase):
+    """
+    Models a runfolder which has been picked up by the runfolder index. The index is used to avoid having to list
+    and parse the entire runfolder directory each time runfolders or projects are requested.
+    """
+
+    __tablename__ = 'runfolder_index'
+
+    # The name of the runfolder, i.e. the name of its directory
+    name = Column(String, primary_key=True)
+
+    # The path to the runfolder on disk
+    path = Column(String, nullable=False)
+
+    # The modification time of the runfolder's project directory at the time the projects were last indexed,
+    # or None if the projects have not been indexed yet.
+    projects_mtime = Column(Float)
+
+    def __repr__(self):
+        return "Runfolder index entry: {name: %s, path: %s, projects_mtime: %s}" % (self.name,
+                                                                                  self.path,
+                                                                                  self.projects_mtime)
+
+
+class RunfolderIndexProject(SQLAlchemyBase):
+    """
+    Models a project directory found in a runfolder picked up by the runfolder index.
+    """
+
+    __tablename__ = 'runfolder_index_projects'
+
+    # The name of the runfolder in which the project is located
+    runfolder_name = Column(String, primary_key=True)
+
+    # The name of the project, indexed since projects are looked up by name
+    name = Column(String, primary_key=True, index=True)
+
+    # The path to the project directory on disk
+    path = Column(String, nullable=False)
+
+    def __repr__(self):
+        return "Runfolder index project: {runfolder_name: %s, name: %s, path: %s}" % (self.runfolder_name,
+                                                                                    self.name,
+                                                                                    self.path)
@@ -24,11 +24,13 @@ class Execution(BaseModel):
     Model a ongoing execution and provides a handle for the associated process object
     """
 
-    def __init__(self, pid, process_obj):
+    def __init__(self, pid, process_obj, stream_output=False):
         """
         Instantiate a ongoing external program execution
         :param pid: of the process
         :param process_obj: the python process object associated with the execution
+        :param stream_output: True if the output of the process is available as streams
         """
         self.pid = pid
         self.process_obj = process_obj
+        self.stream_output = stream_output
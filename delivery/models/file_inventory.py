@@ -0,0 +1,144 @@
+import os
+
+
+class FileInventory(object):
+    """
+    An in-memory inventory of the files and directories beneath a directory, made with a single traversal of the
+    file system (see `FileSystemService.scan_tree`). Listing the files beneath a directory, and checking if a path
+    exists, can then be answered without asking the file system again, which is slow on network file systems.
+
+    The entries are os.DirEntry objects, so the type of an entry is known from the traversal, and the size of a file
+    is only looked up when asked for, and then cached. Like os.walk, the traversal does not follow symbolic links to
+    directories, unless they are directly beneath the root and the traversal was asked to follow those.
+    """
+
+    def __init__(self, root, children):
+        """
+        Instantiate a new FileInventory
+        :param root: the directory which has been traversed
+        :param children: a dict with the path to each traversed directory as key, and a list of the os.DirEntry objects
+        in the directory as value
+        """
+        self.root = os.path.normpath(root)
+        self._children = children
+        self._entries = {entry.path: entry for entries in children.values() for entry in entries}
+        # the results of `contains_file_with_suffix`, by directory and suffix
+        self._contains_suffix = {}
+
+    @staticmethod
+    def _is_dir(entry):
+        try:
+            return entry.is_dir()
+        except OSError:
+            return False
+
+    def covers(self, path):
+        """
+        Check if a path is beneath the root of the inventory, in which case the inventory knows if it exists
+        :param path: to check
+        :return: True if the path is the root or beneath it, False otherwise
+        """
+        path = os.path.normpath(path)
+        return path == self.root or path.startswith(os.path.join(self.root, ""))
+
+    def exists(self, path):
+        """
+        Check if a path beneath the root of the inventory exists
+        :param path: to check
+        :return: True if there is a file or directory with the path in the inventory, False otherwise
+        """
+        path = os.path.normpath(path)
+        return path == self.root or path in self._entries
+
+    def isdir(self, path):
+        """
+        Check if a path beneath the root of the inventory is a directory
+        :param path: to check
+        :return: True if the path is a directory, False otherwise
+        """
+        path = os.path.normpath(path)
+        return path == self.root or (path in self._entries and self._is_dir(self._entries[path]))
+
+    def size(self, path):
+        """
+        Get the size of a file in the inventory
+        :param path: to the file
+        :return: the size of the file in bytes
+        :raises KeyError: if the file is not in the inventory
+        """
+        return self._entries[os.path.normpath(path)].stat().st_size
+
+    def directories(self, path=None):
+        """
+        List the directories directly beneath a directory in the inventory
+        :param path: to the directory, defaults to the root of the inventory
+        :return: a list of paths to the directories
+        """
+        path = self.root if path is None else os.path.normpath(path)
+        return [entry.path for entry in self._children.get(path, []) if self._is_dir(entry)]
+
+    def contains_file_with_suffix(self, path, suffix):
+        """
+        Check if there is a file with a name ending with suffix beneath a directory in the inventory, e.g. a fastq
+        file beneath a project directory. The directory is searched breadth-first, checking the files in a directory
+        before descending into its subdirectories, so a file near the top is found without first going through deep
+        subtrees without any such files, like QC output. The results are remembered, both for the directory and for
+        the directories searched on the way, so asking again, or about a directory which has been searched as part of
+        another, is answered at once.
+        :param path: to the directory
+        :param suffix: the file name suffix to look for
+        :return: True if a file with the suffix was found, False otherwise
+        """
+        path = os.path.normpath(path)
+        memo = self._contains_suffix
+        if (path, suffix) in memo:
+            return memo[(path, suffix)]
+
+        # the directory each searched directory was reached from, to mark the way back up once a file has been found
+        parents = {path: None}
+        level = [path]
+        while level:
+            next_level = []
+            for dir_path in level:
+                found = memo.get((dir_path, suffix))
+                if found is None:
+                    subdirs = []
+                    for entry in self._children.get(dir_path, []):
+                        if not self._is_dir(entry):
+                            if entry.name.endswith(suffix):
+                                found = True
+                                break
+                        elif entry.path in self._children:
+                            subdirs.append(entry.path)
+                    else:
+                        for subdir in subdirs:
+                            parents[subdir] = dir_path
+                        next_level.extend(subdirs)
+                if found:
+                    while dir_path is not None:
+                        memo[(dir_path, suffix)] = True
+                        dir_path = parents[dir_path]
+                    return True
+            level = next_level
+
+        # the whole tree has been searched, so none of the directories in it has a file with the suffix
+        for dir_path in parents:
+            memo[(dir_path, suffix)] = False
+        return False
+
+    def files(self, path=None):
+        """
+        List the files beneath a directory in the inventory, recursively, in the same order as
+        `FileSystemService.list_files_recursively` would
+        :param path: to the directory, defaults to the root of the inventory
+        :return: a generator of paths to the files
+        """
+        dirs = [self.root if path is None else os.path.normpath(path)]
+        while dirs:
+            subdirs = []
+            for entry in self._children.get(dirs.pop(), []):
+                if not self._is_dir(entry):
+                    yield entry.path
+                elif entry.path in self._children:
+                    subdirs.append(entry.path)
+            dirs.extend(reversed(subdirs))
@@ -1,25 +1,20 @@
 import os
 
-from delivery.models import BaseModel
+from delivery.models import IdentifiedModel
 
 
-class BaseProject(BaseModel):
+class BaseProject(IdentifiedModel):
     """
     Base class for the different project models
     """
 
-    def __eq__(self, other):
+    __slots__ = ()
+
+    def _identity(self):
         """
         Two project should be considered the same if the represent the same directory on disk
-        :param other: instance of RunfolderProject
-        :return: true if the same project, otherwise false
         """
-        if isinstance(other, self.__class__):
-            return self.path == other.path
-        return False
-
-    def __hash__(self):
-        return hash((self.__class__, self.path))
+        return self.__class__, self.path
 
 
 class RunfolderProject(BaseProject):
@@ -28,6 +23,8 @@ class RunfolderProject(BaseProject):
     to the idea of projects as subdirectories in a demultiplexed Illumina runfolder.
     """
 
+    __slots__ = ("name", "path", "runfolder_path", "runfolder_name", "samples", "project_files", "__weakref__")
+
     def __init__(self, name, path, runfolder_path, runfolder_name, samples=None, project_files=None):
         """
         Instantiate a new `RunfolderProject` object
@@ -52,19 +49,12 @@ class RunfolderProject(BaseProject):
                 "samples": self.samples,
                 "project_files": self.project_files}
 
-    def __hash__(self):
-        return hash((
-            super().__hash__(),
-            self.name,
-            self.runfolder_path,
-            self.runfolder_path,
-            self.runfolder_name,
-            self.samples,
-            self.project_files))
-
     def __eq__(self, other):
         return super().__eq__(other) and other.samples == self.samples and other.project_files == self.project_files
 
+    def __hash__(self):
+        return super().__hash__()
+
 
 class GeneralProject(BaseProject):
     """
@@ -1,43 +1,99 @@
 
 import os
 
-from delivery.models import BaseModel
+from delivery.models import IdentifiedModel
 
 
-class Runfolder(BaseModel):
+class Runfolder(IdentifiedModel):
     """
     Models the concept of a runfolder on disk
     """
 
+    __slots__ = ("name", "path", "projects", "_checksums", "_checksums_loader")
+
     def __init__(self, name, path, projects=None, checksums=None):
         """
         Instantiate a new runfolder instance
         :param name: of the runfolder
         :param path: to the runfolder
         :param projects: all projects which are located under this runfolder
+        :param checksums: a mapping of file paths, relative to the runfolder's parent directory, to checksums
         """
         self.name = name
         self.path = os.path.abspath(path)
         self.projects = projects
-        self.checksums = checksums
+        self._checksums = checksums
+        self._checksums_loader = None
 
-    def __eq__(self, other):
+    @property
+    def checksums(self):
         """
-        Two runfolders should be considered the same if the represent the same directory on disk
-        :param other: runfolder instance to compare to
-        :return: True if the represent the same folder on disk, otherwise false.
+        The checksums for files in this runfolder. If a checksums loader has been set, it will be called the first
+        time the checksums are accessed and the result is kept for subsequent accesses.
+        :return: a mapping of file paths, relative to the runfolder's parent directory, to checksums, or None
         """
-        if isinstance(other, self.__class__):
-            return self.path == other.path
-        return False
+        if self._checksums_loader is not None:
+            self._checksums = self._checksums_loader()
+            self._checksums_loader = None
+        return self._checksums
+
+    @checksums.setter
+    def checksums(self, checksums):
+        self._checksums = checksums
+        self._checksums_loader = None
+
+    def set_checksums_loader(self, checksums_loader):
+        """
+        Defer loading the checksums for this runfolder until they are needed
+        :param checksums_loader: a callable without arguments which returns the checksums for this runfolder
+        :return: None
+        """
+        self._checksums = None
+        self._checksums_loader = checksums_loader
+
+    def to_dict(self):
+        """
+        The checksums are not included here, since they are not of interest when presenting the runfolder and
+        including them would force them to be loaded.
+        """
+        return {"name": self.name,
+                "path": self.path,
+                "projects": self.projects}
+
+    def _identity(self):
+        """
+        Two runfolders should be considered the same if they represent the same directory on disk
+        """
+        return Runfolder, self.path
 
-    def __hash__(self):
-        return hash((self.name, self.path, self.projects))
 
+class RunfolderFile(IdentifiedModel):
+    """
+    Models a file in a runfolder. There is one instance per file, which can be tens of thousands for a runfolder, so
+    the attributes are kept in slots, and the file name is derived from the path when needed rather than stored.
+    """
 
-class RunfolderFile(object):
+    __slots__ = ("file_path", "checksum")
 
     def __init__(self, file_path, file_checksum=None):
         self.file_path = os.path.abspath(file_path)
-        self.file_name = os.path.basename(file_path)
         self.checksum = file_checksum
+
+    @property
+    def file_name(self):
+        return os.path.basename(self.file_path)
+
+    def _identity(self):
+        # a SampleFile is the same file as a RunfolderFile with the same path
+        return RunfolderFile, self.file_path
+
+    def __eq__(self, other):
+        return super(RunfolderFile, self).__eq__(other) and other.checksum == self.checksum
+
+    def __hash__(self):
+        return super(RunfolderFile, self).__hash__()
+
+    def to_dict(self):
+        return {"file_path": self.file_path,
+                "file_name": self.file_name,
+                "checksum": self.checksum}
@@ -1,14 +1,17 @@
 
 import os
 
+from delivery.models import IdentifiedModel
 from delivery.models.runfolder import RunfolderFile
 
 
-class Sample(object):
+class Sample(IdentifiedModel):
     """
     Models the concept of a sample on disk
     """
 
+    __slots__ = ("name", "sample_id", "project_name", "sample_files")
+
     def __init__(self, name, project_name, sample_id=None, sample_files=None):
         """
         Instantiate a new `Sample` object.
@@ -23,14 +26,20 @@ class Sample(object):
         self.project_name = project_name
         self.sample_files = sample_files
 
+    def to_dict(self):
+        return {"name": self.name,
+                "sample_id": self.sample_id,
+                "project_name": self.project_name,
+                "sample_files": self.sample_files}
+
+    def _identity(self):
+        return Sample, self.project_name, self.sample_id, self.name
+
     def __eq__(self, other):
-        return other.name == self.name and \
-               other.sample_id == self.sample_id and \
-               other.project_name == self.project_name and \
-               other.sample_files == self.sample_files
+        return super(Sample, self).__eq__(other) and other.sample_files == self.sample_files
 
     def __hash__(self):
-        return hash((self.name, self.sample_id, self.project_name, self.sample_files))
+        return super(Sample, self).__hash__()
 
 
 class SampleFile(RunfolderFile):
@@ -38,6 +47,8 @@ class SampleFile(RunfolderFile):
     Models the concept of a sequence file belonging to a sample
     """
 
+    __slots__ = ("sample_name", "sample_index", "lane_no", "read_no", "is_index")
+
     def __init__(
             self,
             sample_path,
@@ -65,16 +76,12 @@ class SampleFile(RunfolderFile):
         self.read_no = read_no
         self.is_index = is_index
 
-    def __eq__(self, other):
-        return other.file_path == self.file_path and other.checksum == self.checksum
+    def to_dict(self):
+        sample_file_dict = super(SampleFile, self).to_dict()
+        sample_file_dict.update(sample_name=self.sample_name,
+                                sample_index=self.sample_index,
+                                lane_no=self.lane_no,
+                                read_no=self.read_no,
+                                is_index=self.is_index)
+        return sample_file_dict
 
-    def __hash__(self):
-        return hash((
-            self.file_path,
-            self.file_name,
-            self.sample_name,
-            self.sample_index,
-            self.lane_no,
-            self.read_no,
-            self.is_index,
-            self.checksum))
@@ -0,0 +1,49 @@
+
+from contextlib import contextmanager
+
+
+class DatabaseBasedRepository(object):
+    """
+    Base class for repositories backed by a database. Each call to the repository is a unit of work of its own,
+    carried out in a new sqlalchemy Session which is committed and closed before the call returns. The objects
+    returned are thus detached from any session: they hold the state they had when they were read, and are not
+    kept alive by the repository, so the memory used does not grow with the number of requests and background tasks
+    which have been served. Changes to objects which have been read from the repository are written back with `save`.
+
+    Since a session is never shared between calls, objects can be read in one thread (or coroutine) and saved in
+    another, and no session has to be passed around.
+    """
+
+    def __init__(self, session_factory):
+        """
+        Instantiate a new DatabaseBasedRepository
+        :param session_factory: a factory method that can create a new sqlalchemy Session object.
+        """
+        self.session_factory = session_factory
+
+    @contextmanager
+    def session_scope(self):
+        """
+        Provide a session for a unit of work. The session is committed if the unit of work succeeds, and rolled back
+        otherwise. The objects loaded in the session keep their state once it has been closed.
+        :return: a context manager providing the session
+        """
+        session = self.session_factory(expire_on_commit=False)
+        try:
+            yield session
+            session.commit()
+        except:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def save(self, *instances):
+        """
+        Write any changes to the given objects, which have been read from (or created by) the repository, to the
+        database
+        :param instances: the objects to save
+        :return: None
+        """
+        with self.session_scope() as session:
+            session.add_all(instances)
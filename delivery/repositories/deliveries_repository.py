@@ -2,9 +2,10 @@
 from sqlalchemy.orm.exc import NoResultFound
 
 from delivery.models.db_models import DeliveryOrder
+from delivery.repositories.database_repository import DatabaseBasedRepository
 
 
-class DatabaseBasedDeliveriesRepository(object):
+class DatabaseBasedDeliveriesRepository(DatabaseBasedRepository):
     """
     Creates database deliveries and stores theme in the backing database. Can also return objects
     from the database given different factors.
@@ -15,7 +16,7 @@ class DatabaseBasedDeliveriesRepository(object):
         Instantiate a new DatabaseBasedDeliveriesRepository
         :param session_factory: a factory method that can create a new sqlalchemy Session object.
         """
-        self.session = session_factory()
+        super(DatabaseBasedDeliveriesRepository, self).__init__(session_factory)
 
     def get_delivery_orders_for_source(self, source_directory):
         """
@@ -23,34 +24,61 @@ class DatabaseBasedDeliveriesRepository(object):
         :param source_directory: to search for
         :return: all matching delivery orders as a list.
         """
-        return self.session.query(DeliveryOrder).filter(DeliveryOrder.delivery_source == source_directory).all()
+        with self.session_scope() as session:
+            return session.query(DeliveryOrder).filter(DeliveryOrder.delivery_source == source_directory).all()
 
-    def get_delivery_order_by_id(self, delivery_order_id, custom_session=None):
+    def get_delivery_order_by_id(self, delivery_order_id):
         """
         Get the delivery order matching the given id
-        The custom_session used here is used because in the `DeliveryService` it is necessary to
-        make this query from a separate thread, something which sqlalchemy does not allow. Therefore
-        I've made it possible to provide a separate session here (in that case a new session instantiate in the
-        thread), while hacky it appears to work. /JD 20161212
         :param delivery_order_id: to search for
-        :param custom_session: provide an other session object if that is necessary for your use case.
         :return: the matching delivery order, or None, if no order was found matching id
         """
-        if custom_session:
-            session = custom_session
-        else:
-            session = self.session
-        try:
-            return session.query(DeliveryOrder).filter(DeliveryOrder.id == delivery_order_id).one()
-        except NoResultFound:
-            return None
+        with self.session_scope() as session:
+            try:
+                return session.query(DeliveryOrder).filter(DeliveryOrder.id == delivery_order_id).one()
+            except NoResultFound:
+                return None
+
+    def get_delivery_orders_by_status(self, delivery_status):
+        """
+        Get all delivery orders with a specific status
+        :param delivery_status: the DeliveryStatus to search for
+        :return: all delivery orders with that status as a list, ordered by id
+        """
+        with self.session_scope() as session:
+            return session.query(DeliveryOrder).\
+                filter(DeliveryOrder.delivery_status == delivery_status).\
+                order_by(DeliveryOrder.id).\
+                all()
+
+    def get_delivery_orders_by_filter(self, delivery_order_ids=None, delivery_project=None, delivery_status=None,
+                                      offset=0, limit=None):
+        """
+        Get a page of the delivery orders matching all of the given filters, with a single query
+        :param delivery_order_ids: if given, only orders with one of these ids are returned
+        :param delivery_project: if given, only orders to this project are returned
+        :param delivery_status: if given, only orders with this DeliveryStatus are returned
+        :param offset: the number of matching orders to skip
+        :param limit: the maximum number of orders to return, or None for no limit
+        :return: the matching delivery orders as a list, ordered by id
+        """
+        with self.session_scope() as session:
+            query = session.query(DeliveryOrder)
+            if delivery_order_ids is not None:
+                query = query.filter(DeliveryOrder.id.in_(delivery_order_ids))
+            if delivery_project is not None:
+                query = query.filter(DeliveryOrder.delivery_project == delivery_project)
+            if delivery_status is not None:
+                query = query.filter(DeliveryOrder.delivery_status == delivery_status)
+            return query.order_by(DeliveryOrder.id).offset(offset).limit(limit).all()
 
     def get_delivery_orders(self):
         """
         Return all delivery orders for the database as a list
         :return:
         """
-        return self.session.query(DeliveryOrder).all()
+        with self.session_scope() as session:
+            return session.query(DeliveryOrder).all()
 
     def create_delivery_order(self,
                               delivery_source,
@@ -74,7 +102,7 @@ class DatabaseBasedDeliveriesRepository(object):
                               delivery_status=delivery_status,
                               staging_order_id=staging_order_id,
                               md5sum_file=md5sum_file)
-        self.session.add(order)
-        self.session.commit()
+        with self.session_scope() as session:
+            session.add(order)
 
         return order
@@ -3,8 +3,9 @@ from sqlalchemy import exists
 from sqlalchemy.sql.expression import func
 
 from delivery.models.db_models import DeliverySource, StagingOrder, StagingStatus, DeliveryOrder, DeliveryStatus
+from delivery.repositories.database_repository import DatabaseBasedRepository
 
-class DatabaseBasedDeliverySourcesRepository(object):
+class DatabaseBasedDeliverySourcesRepository(DatabaseBasedRepository):
     """
     TODO
     """
@@ -14,14 +15,17 @@ class DatabaseBasedDeliverySourcesRepository(object):
         Instantiate a new DatabaseBasedDeliveryProjectsRepository
         :param session_factory: a factory method that can create a new sqlalchemy Session object.
         """
-        self.session = session_factory()
+        super(DatabaseBasedDeliverySourcesRepository, self).__init__(session_factory)
 
     def get_projects(self):
-        for project in self.session.query(DeliverySource).distinct(DeliverySource.project_name).all():
+        with self.session_scope() as session:
+            projects = session.query(DeliverySource).distinct(DeliverySource.project_name).all()
+        for project in projects:
             yield project
 
     def get_sources(self):
-        return self.session.query(DeliverySource).all()
+        with self.session_scope() as session:
+            return session.query(DeliverySource).all()
 
     @staticmethod
     def create_source(project_name, source_name, path, batch_nbr=None):
@@ -31,26 +35,35 @@ class DatabaseBasedDeliverySourcesRepository(object):
                               batch=batch_nbr)
 
     def add_source(self, source):
-        self.session.add(source)
-        self.session.commit()
+        with self.session_scope() as session:
+            session.add(source)
 
     def get_source(self, project_name, source_name):
-        return self.session.query(DeliverySource).\
-            filter(DeliverySource.project_name == project_name).\
-            filter(DeliverySource.source_name == source_name).scalar()
+        with self.session_scope() as session:
+            return session.query(DeliverySource).\
+                filter(DeliverySource.project_name == project_name).\
+                filter(DeliverySource.source_name == source_name).scalar()
 
     def update_path_of_source(self, source, new_path):
+        # the source is typically a new object describing a source which has been delivered before, so the stored
+        # source is updated rather than the object saved
         source.path = new_path
-        self.session.commit()
+        with self.session_scope() as session:
+            session.query(DeliverySource).\
+                filter(DeliverySource.project_name == source.project_name).\
+                filter(DeliverySource.source_name == source.source_name).\
+                update({DeliverySource.path: new_path}, synchronize_session=False)
 
     def source_exists(self, source):
-        does_exist = self.session.query(exists().
-                                        where(DeliverySource.project_name == source.project_name).
-                                        where(DeliverySource.source_name == source.source_name))
-        return does_exist.scalar()
+        with self.session_scope() as session:
+            does_exist = session.query(exists().
+                                       where(DeliverySource.project_name == source.project_name).
+                                       where(DeliverySource.source_name == source.source_name))
+            return does_exist.scalar()
 
     def find_highest_batch_nbr(self, project_name):
-        return self.session.\
-            query(func.max(DeliverySource.batch)).\
-            filter(DeliverySource.project_name == project_name).\
-            scalar()
+        with self.session_scope() as session:
+            return session.\
+                query(func.max(DeliverySource.batch)).\
+                filter(DeliverySource.project_name == project_name).\
+                scalar()
@@ -0,0 +1,42 @@
+
+from sqlalchemy.orm.exc import NoResultFound
+
+from delivery.models.db_models import OrganiseOrder, OrganiseStatus
+from delivery.repositories.database_repository import DatabaseBasedRepository
+
+
+class DatabaseBasedOrganiseRepository(DatabaseBasedRepository):
+    """
+    A repository of organise orders backed by a database. It is able to create and commit new organise orders
+    to the database, and fetch them by id.
+    """
+
+    def __init__(self, session_factory):
+        """
+        Instantiate a new DatabaseBasedOrganiseRepository
+        :param session_factory: a factory method that can create a new sqlalchemy Session object.
+        """
+        super(DatabaseBasedOrganiseRepository, self).__init__(session_factory)
+
+    def get_organise_order_by_id(self, identifier):
+        """
+        Get an organise order by id
+        :param identifier: the organise order id to search for
+        :return: the matching OrganiseOrder or None, if there was no matching organise order.
+        """
+        with self.session_scope() as session:
+            try:
+                return session.query(OrganiseOrder).filter(OrganiseOrder.id == identifier).one()
+            except NoResultFound:
+                return None
+
+    def create_organise_order(self, runfolder):
+        """
+        Create a pending OrganiseOrder and commit it to the database
+        :param runfolder: the name of the runfolder to organise
+        :return: the created OrganiseOrder
+        """
+        order = OrganiseOrder(runfolder=runfolder, status=OrganiseStatus.pending)
+        with self.session_scope() as session:
+            session.add(order)
+        return order
@@ -1,6 +1,7 @@
 
 import logging
 import os
+import weakref
 
 from delivery.services.file_system_service import FileSystemService
 from delivery.services.metadata_service import MetadataService
@@ -75,6 +76,8 @@ class UnorganisedRunfolderProjectRepository(object):
         self.filesystem_service = filesystem_service
         self.sample_repository = sample_repository
         self.metadata_service = metadata_service
+        # the lanes of the samples in a project, by sample id, see `is_sample_in_project`
+        self._sample_lanes_by_project = weakref.WeakKeyDictionary()
 
     def dump_checksums(self, project):
         """
@@ -117,10 +120,7 @@ class UnorganisedRunfolderProjectRepository(object):
         :raises: ProjectsDirNotfoundException if the Unaligned directory could not be found in the runfolder
         """
         def dir_contains_fastq_files(d):
-            return any(
-                map(
-                    lambda f: f.endswith("fastq.gz"),
-                    self.filesystem_service.list_files_recursively(d)))
+            return inventory.contains_file_with_suffix(d, "fastq.gz")
 
         def project_from_dir(d):
             project = RunfolderProject(
@@ -129,17 +129,23 @@ class UnorganisedRunfolderProjectRepository(object):
                 runfolder_path=runfolder.path,
                 runfolder_name=runfolder.name
             )
-            project.project_files = self.get_report_files(project, checksums=runfolder.checksums)
-            project.samples = self.sample_repository.get_samples(project, runfolder)
+            project.project_files = self.get_report_files(
+                project, checksums=runfolder.checksums, inventory=inventory)
+            project.samples = self.sample_repository.get_samples(project, runfolder, inventory=inventory)
             return project
 
         try:
             projects_base_dir = os.path.join(runfolder.path, self.PROJECTS_DIR)
 
+            # traverse the projects directory once, the projects, their samples and reports are then found in the
+            # inventory, rather than by traversing the directory of each project several times. Project directories
+            # may be symbolic links, but the links within them are not followed, as with os.walk of each project.
+            inventory = self.filesystem_service.scan_tree(projects_base_dir, follow_root_links=True)
+
             # only include directories that have fastq.gz files beneath them
             project_directories = filter(
                 dir_contains_fastq_files,
-                self.filesystem_service.find_project_directories(projects_base_dir)
+                inventory.directories()
             )
 
             return list(map(project_from_dir, project_directories)) or None
@@ -147,7 +153,17 @@ class UnorganisedRunfolderProjectRepository(object):
         except FileNotFoundError:
             raise ProjectsDirNotfoundException("Did not find Unaligned folder for: {}".format(runfolder.name))
 
-    def get_report_files(self, project, checksums=None):
+    def _exists(self, path, inventory):
+        if inventory is not None and inventory.covers(path):
+            return inventory.exists(path)
+        return self.filesystem_service.exists(path)
+
+    def _list_files_recursively(self, path, inventory):
+        if inventory is not None and inventory.covers(path):
+            return inventory.files(path)
+        return self.filesystem_service.list_files_recursively(path)
+
+    def get_report_files(self, project, checksums=None, inventory=None):
         """
         Gets the paths to files associated with the supplied project's report. This can be either a MultiQC report or,
         if no such report was found, a Sisyphus report. If a pre-calculated checksum cannot be found for a file, it will
@@ -156,26 +172,34 @@ class UnorganisedRunfolderProjectRepository(object):
         :param project: a RunfolderProject instance
         :param checksums: a dict with pre-calculated checksums for files. paths are keys and the corresponding
         checksum is the value
+        :param inventory: a FileInventory of the runfolder's PROJECTS_DIR directory, if given, it is used instead of
+        the file system for paths beneath the directory
         :return: a list of RunfolderFile objects
         :raises ProjectReportNotFoundException: if no MultiQC or Sisyphus report was found for the project
         """
-        def _file_object_from_path(file_path):
-            relative_file_path = self.filesystem_service.relpath(
-                file_path,
-                self.filesystem_service.dirname(project.runfolder_path))
-            checksum = checksums[relative_file_path] \
-                if relative_file_path in checksums else self.metadata_service.hash_file(file_path)
-            return RunfolderFile(file_path, file_checksum=checksum)
+        def _file_objects_from_paths(file_paths):
+            runfolder_parent = self.filesystem_service.dirname(project.runfolder_path)
+            file_checksums = {}
+            for file_path in file_paths:
+                relative_file_path = self.filesystem_service.relpath(file_path, runfolder_parent)
+                file_checksums[file_path] = checksums.get(relative_file_path)
+
+            # calculate any missing checksums in one go
+            file_checksums.update(
+                self.metadata_service.hash_files(
+                    [file_path for file_path, checksum in file_checksums.items() if checksum is None]))
+
+            return [RunfolderFile(file_path, file_checksum=file_checksums[file_path]) for file_path in file_paths]
 
         checksums = checksums or {}
-        if self.filesystem_service.exists(self.multiqc_report_path(project)):
-            return list(map(_file_object_from_path, self.multiqc_report_files(project)))
+        if self._exists(self.multiqc_report_path(project), inventory):
+            return _file_objects_from_paths(self.multiqc_report_files(project))
         for sisyphus_report_path in self.sisyphus_report_path(project):
-            if self.filesystem_service.exists(sisyphus_report_path):
-                return list(map(
-                    _file_object_from_path,
+            if self._exists(sisyphus_report_path, inventory):
+                return _file_objects_from_paths(
                     self.sisyphus_report_files(
-                        self.filesystem_service.dirname(sisyphus_report_path))))
+                        self.filesystem_service.dirname(sisyphus_report_path),
+                        inventory=inventory))
         raise ProjectReportNotFoundException("No project report found for {}".format(project.name))
 
     @staticmethod
@@ -185,17 +209,18 @@ class UnorganisedRunfolderProjectRepository(object):
                os.path.join(
                    project.path, "report.html")
 
-    def sisyphus_report_files(self, report_dir):
+    def sisyphus_report_files(self, report_dir, inventory=None):
         report_files = [
             os.path.join(report_dir, "report.html"),
             os.path.join(report_dir, "report.xml"),
             os.path.join(report_dir, "report.xsl")
         ]
         report_files.extend(list(
-            self.filesystem_service.list_files_recursively(
+            self._list_files_recursively(
                 os.path.join(
                     report_dir,
-                    "Plots"))))
+                    "Plots"),
+                inventory)))
         return report_files
 
     @staticmethod
@@ -221,13 +246,31 @@ class UnorganisedRunfolderProjectRepository(object):
         :param sample_lane: the lane the sample to search for was sequenced on
         :return: True if a matching sample could be found, False otherwise
         """
-        sample_obj = self.get_sample(project, sample_id)
-        sample_lanes = self.sample_repository.sample_lanes(sample_obj) if sample_obj else []
+        sample_lanes = self._sample_lanes(project).get(sample_id, frozenset())
         return all([
             sample_project == project.name,
-            sample_obj,
             sample_lane in sample_lanes])
 
+    def _sample_lanes(self, project):
+        """
+        Get the lanes of each sample in the project. This is looked up for each row of a samplesheet, so the result
+        is memoised for as long as the project instance is alive, so the samples of a project must not be changed once
+        it has been looked up. Since projects are only equal if they have the same samples, another instance of the
+        project, e.g. organised again on other lanes, is not given the lanes of the first one.
+
+        :param project: a Project instance
+        :return: a dict with sample ids as keys and the set of lanes of each sample as values
+        """
+        try:
+            return self._sample_lanes_by_project[project]
+        except KeyError:
+            pass
+        project_sample_lanes = {}
+        for sample in project.samples:
+            project_sample_lanes.setdefault(sample.sample_id, frozenset(self.sample_repository.sample_lanes(sample)))
+        self._sample_lanes_by_project[project] = project_sample_lanes
+        return project_sample_lanes
+
     @staticmethod
     def get_sample(project, sample_id):
         for sample in project.samples:
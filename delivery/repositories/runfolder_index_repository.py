@@ -0,0 +1,115 @@
+
+from sqlalchemy.orm.exc import NoResultFound
+
+from delivery.models.db_models import RunfolderIndexEntry, RunfolderIndexProject
+from delivery.repositories.database_repository import DatabaseBasedRepository
+
+
+class DatabaseBasedRunfolderIndexRepository(DatabaseBasedRepository):
+    """
+    A repository of indexed runfolders and their projects backed by a database. It is used by the
+    `IndexedRunfolderRepository` to keep track of what runfolders are available without having to walk the
+    runfolder directory on each request. Changes to the index are collected until `commit` is called, and are then
+    written in a single unit of work.
+    """
+
+    def __init__(self, session_factory):
+        """
+        Instantiate a new DatabaseBasedRunfolderIndexRepository
+        :param session_factory: a factory method that can create a new sqlalchemy Session object.
+        """
+        super(DatabaseBasedRunfolderIndexRepository, self).__init__(session_factory)
+        # functions applying the changes which have not been committed yet to a session, in order
+        self._pending_changes = []
+
+    def get_runfolder_entries(self):
+        """
+        Get all indexed runfolders
+        :return: all RunfolderIndexEntry objects as a list, ordered by name
+        """
+        with self.session_scope() as session:
+            return session.query(RunfolderIndexEntry).order_by(RunfolderIndexEntry.name).all()
+
+    def get_runfolder_entry(self, name):
+        """
+        Get the indexed runfolder with the given name
+        :param name: of the runfolder
+        :return: the matching RunfolderIndexEntry, or None if the runfolder has not been indexed
+        """
+        with self.session_scope() as session:
+            try:
+                return session.query(RunfolderIndexEntry).filter(RunfolderIndexEntry.name == name).one()
+            except NoResultFound:
+                return None
+
+    def get_projects(self, runfolder_name=None, project_name=None):
+        """
+        Get indexed projects, optionally limited to a specific runfolder and/or project name
+        :param runfolder_name: if specified, only return projects in this runfolder
+        :param project_name: if specified, only return projects with this name
+        :return: the matching RunfolderIndexProject objects as a list, ordered by runfolder and project name
+        """
+        with self.session_scope() as session:
+            query = session.query(RunfolderIndexProject)
+            if runfolder_name is not None:
+                query = query.filter(RunfolderIndexProject.runfolder_name == runfolder_name)
+            if project_name is not None:
+                query = query.filter(RunfolderIndexProject.name == project_name)
+            return query.order_by(RunfolderIndexProject.runfolder_name, RunfolderIndexProject.name).all()
+
+    def add_runfolder_entry(self, name, path):
+        """
+        Add a runfolder to the index. The changes will not be committed until `commit` is called.
+        :param name: of the runfolder
+        :param path: to the runfolder
+        :return: the created RunfolderIndexEntry
+        """
+        entry = RunfolderIndexEntry(name=name, path=path, projects_mtime=None)
+        self._pending_changes.append(lambda session: session.add(entry))
+        return entry
+
+    def remove_runfolder_entry(self, entry):
+        """
+        Remove a runfolder and its projects from the index. The changes will not be committed until `commit`
+        is called.
+        :param entry: the RunfolderIndexEntry to remove
+        :return: None
+        """
+        def _remove(session):
+            session.query(RunfolderIndexProject).\
+                filter(RunfolderIndexProject.runfolder_name == entry.name).\
+                delete(synchronize_session=False)
+            session.query(RunfolderIndexEntry).\
+                filter(RunfolderIndexEntry.name == entry.name).\
+                delete(synchronize_session=False)
+
+        self._pending_changes.append(_remove)
+
+    def set_projects(self, entry, projects, projects_mtime):
+        """
+        Replace the indexed projects of a runfolder. The changes will not be committed until `commit` is called.
+        :param entry: the RunfolderIndexEntry to update
+        :param projects: a list of (name, path) tuples representing the projects in the runfolder
+        :param projects_mtime: the modification time of the project directory when it was listed
+        :return: None
+        """
+        def _set_projects(session):
+            session.query(RunfolderIndexProject).\
+                filter(RunfolderIndexProject.runfolder_name == entry.name).\
+                delete(synchronize_session=False)
+            session.add_all([RunfolderIndexProject(runfolder_name=entry.name, name=name, path=path)
+                             for name, path in projects])
+            session.add(entry)
+
+        entry.projects_mtime = projects_mtime
+        self._pending_changes.append(_set_projects)
+
+    def commit(self):
+        """
+        Write the changes made to the index since the last commit to the database
+        :return: None
+        """
+        pending_changes, self._pending_changes = self._pending_changes, []
+        with self.session_scope() as session:
+            for apply_change in pending_changes:
+                apply_change(session)
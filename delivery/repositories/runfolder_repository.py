@@ -1,8 +1,9 @@
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 import logging
 import os
 import re
+import time
 
 from delivery.exceptions import ChecksumFileNotFoundException
 from delivery.models.runfolder import Runfolder, RunfolderFile
@@ -21,6 +22,9 @@ class FileSystemBasedRunfolderRepository(object):
     CHECKSUM_FILE_PATH = os.path.join("MD5", "checksums.md5")
     SAMPLESHEET_PATH = "SampleSheet.csv"
 
+    # Directories in the base path matching this expression are considered to be runfolders
+    RUNFOLDER_EXPRESSION = r"^\d+_"
+
     def __init__(self, base_path, file_system_service=FileSystemService(), metadata_service=MetadataService()):
         """
         Instantiate a new FileSystemBasedRunfolderRepository
@@ -61,20 +65,35 @@ class FileSystemBasedRunfolderRepository(object):
             pass
 
     def _add_checksums_for_runfolder(self, runfolder, ignore_errors=False):
-        try:
-            checksums = self.metadata_service.parse_checksum_file(self.checksum_file(runfolder))
-            runfolder.checksums = checksums
-        except ChecksumFileNotFoundException as e:
-            if not ignore_errors:
-                raise
+        """
+        Will set up the runfolder to load its checksums when they are first accessed, since parsing the checksum
+        file can be expensive and many operations do not need the checksums.
+        :param runfolder: to add checksums to
+        :param ignore_errors: if False, check up front that the checksum file exists
+        :return: None
+        :raises ChecksumFileNotFoundException: if the checksum file does not exist and ignore_errors is False
+        """
+        checksum_file = self.checksum_file(runfolder)
+        if not ignore_errors and not self.file_system_service.exists(checksum_file):
+            raise ChecksumFileNotFoundException("Checksum file '{}' could not be found".format(checksum_file))
 
-    def _get_runfolder_directories(self):
-        # TODO Filter based on expression for runfolders...
-        runfolder_expression = r"^\d+_"
+        def _load_checksums():
+            try:
+                return self.metadata_service.parse_checksum_file(checksum_file)
+            except ChecksumFileNotFoundException:
+                if not ignore_errors:
+                    raise
+                return None
+
+        runfolder.set_checksums_loader(_load_checksums)
+
+    def _is_runfolder_name(self, name):
+        return re.match(self.RUNFOLDER_EXPRESSION, name) is not None
 
+    def _get_runfolder_directories(self):
         directories = self.file_system_service.find_runfolder_directories(self._base_path)
         for directory in directories:
-            if re.match(runfolder_expression, os.path.basename(directory)):
+            if self._is_runfolder_name(os.path.basename(directory)):
                 yield directory
 
     def _get_runfolder_object(self, directory, ignore_errors=False):
@@ -98,19 +117,19 @@ class FileSystemBasedRunfolderRepository(object):
 
     def get_runfolder(self, runfolder):
         """
-        Get a Runfolder object matching the specified name
+        Get a Runfolder object matching the specified name. Since a runfolder name maps directly to a directory in the
+        base path, this only needs to check that single directory rather than listing the whole base path. Names
+        which are not valid runfolder names, or which point outside of the base path, will not match.
         :param runfolder: to look for
         :return: the matching runfolder, or None if no match
-        :raises: a AssertionError if more than one runfolder was found
-                matching the given name.
         """
-        directories = self._get_runfolder_directories()
-        matching_name = list([r for r in directories if os.path.basename(r) == runfolder])
+        if not runfolder or \
+                os.path.basename(runfolder) != runfolder or \
+                not self._is_runfolder_name(runfolder):
+            return None
 
-        if len(matching_name) > 1:
-            raise AssertionError("Found more than 1 runfolder matching: {}".format(runfolder))
-        if len(matching_name) > 0 and matching_name[0]:
-            return self._get_runfolder_object(matching_name[0])
+        if self.file_system_service.isdir(os.path.join(self._base_path, runfolder)):
+            return self._get_runfolder_object(runfolder)
         else:
             return None
 
@@ -139,6 +158,178 @@ class FileSystemBasedRunfolderRepository(object):
         return self.metadata_service.extract_samplesheet_data(self.samplesheet_file(runfolder))
 
 
+class IndexedRunfolderRepository(FileSystemBasedRunfolderRepository):
+    """
+    A subclass of `FileSystemBasedRunfolderRepository` which keeps an index of the available runfolders and their
+    projects in a database, so that listing runfolders and projects does not require walking the file system. The
+    index is refreshed incrementally, at most once every `refresh_interval` seconds, and the modification times of the
+    runfolder directory and of the project directories are used to decide what needs to be listed again.
+    """
+
+    PROJECTS_DIR = "Projects"
+
+    # Stored as the projects modification time for runfolders without a project directory
+    NO_PROJECTS_DIR = -1.0
+
+    # Modification times more recent than this number of seconds are not trusted, since changes made within the
+    # time stamp resolution of the file system would otherwise go unnoticed
+    MTIME_SETTLE_TIME = 2
+
+    def __init__(
+            self,
+            base_path,
+            runfolder_index_repo,
+            refresh_interval=60,
+            file_system_service=FileSystemService(),
+            metadata_service=MetadataService()):
+        """
+        Instantiate a new `IndexedRunfolderRepository` object.
+
+        :param base_path: the directory where runfolders are stored
+        :param runfolder_index_repo: an instance of DatabaseBasedRunfolderIndexRepository
+        :param refresh_interval: the minimum number of seconds between refreshes of the index
+        :param file_system_service: a service which can access the file system
+        :param metadata_service: a service which can parse metadata files
+        """
+        super(IndexedRunfolderRepository, self).__init__(
+            base_path,
+            file_system_service=file_system_service,
+            metadata_service=metadata_service)
+        self.runfolder_index_repo = runfolder_index_repo
+        self.refresh_interval = refresh_interval
+        self._base_path_mtime = None
+        self._last_refresh = None
+
+    def _is_settled(self, mtime, now):
+        return now - mtime > self.MTIME_SETTLE_TIME
+
+    def _refresh_runfolder_entry(self, entry, now):
+        projects_base_dir = os.path.join(entry.path, self.PROJECTS_DIR)
+        try:
+            projects_mtime = self.file_system_service.getmtime(projects_base_dir)
+        except FileNotFoundError:
+            projects_mtime = self.NO_PROJECTS_DIR
+
+        if entry.projects_mtime is not None and entry.projects_mtime == projects_mtime:
+            return
+
+        project_directories = []
+        if projects_mtime != self.NO_PROJECTS_DIR:
+            try:
+                project_directories = list(self.file_system_service.find_project_directories(projects_base_dir))
+            except FileNotFoundError:
+                projects_mtime = self.NO_PROJECTS_DIR
+
+        log.debug("Indexing projects for runfolder: {}".format(entry.name))
+        projects = [(os.path.basename(d), os.path.join(projects_base_dir, d)) for d in project_directories]
+        if projects_mtime != self.NO_PROJECTS_DIR and not self._is_settled(projects_mtime, now):
+            # make sure that the projects are listed again on the next refresh
+            projects_mtime = None
+        self.runfolder_index_repo.set_projects(entry, projects, projects_mtime)
+
+    def refresh_index(self, force=False):
+        """
+        Bring the runfolder index up to date with the file system. The runfolder directory is only listed if its
+        modification time has changed since it was last listed, and the projects of a runfolder are only listed if the
+        modification time of its project directory has changed.
+        :param force: if True, refresh the index even if `refresh_interval` has not passed since the last refresh
+        :return: None
+        """
+        now = time.time()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return
+
+        entries = {entry.name: entry for entry in self.runfolder_index_repo.get_runfolder_entries()}
+
+        base_path_mtime = self.file_system_service.getmtime(self._base_path)
+        if base_path_mtime != self._base_path_mtime:
+            log.debug("Indexing runfolders in: {}".format(self._base_path))
+            on_disk = {
+                os.path.basename(directory): os.path.abspath(os.path.join(self._base_path, directory))
+                for directory in self._get_runfolder_directories()}
+            for name in set(entries) - set(on_disk):
+                self.runfolder_index_repo.remove_runfolder_entry(entries.pop(name))
+            for name in set(on_disk) - set(entries):
+                entries[name] = self.runfolder_index_repo.add_runfolder_entry(name, on_disk[name])
+            self._base_path_mtime = base_path_mtime if self._is_settled(base_path_mtime, now) else None
+
+        for entry in entries.values():
+            self._refresh_runfolder_entry(entry, now)
+
+        self.runfolder_index_repo.commit()
+        self._last_refresh = now
+
+    def _runfolder_from_index(self, entry, indexed_projects, ignore_errors=True):
+        runfolder = Runfolder(name=entry.name, path=entry.path, projects=None)
+        self._add_checksums_for_runfolder(runfolder, ignore_errors=ignore_errors)
+        if indexed_projects:
+            runfolder.projects = [
+                RunfolderProject(
+                    name=project.name,
+                    path=project.path,
+                    runfolder_path=runfolder.path,
+                    runfolder_name=runfolder.name)
+                for project in indexed_projects]
+        return runfolder
+
+    def get_runfolders(self):
+        """
+        Get all runfolders from the index
+        :return: a generator of known runfolders
+        """
+        self.refresh_index()
+        projects_by_runfolder = defaultdict(list)
+        for project in self.runfolder_index_repo.get_projects():
+            projects_by_runfolder[project.runfolder_name].append(project)
+        for entry in self.runfolder_index_repo.get_runfolder_entries():
+            yield self._runfolder_from_index(entry, projects_by_runfolder[entry.name])
+
+    def get_runfolder(self, runfolder):
+        """
+        Get a Runfolder object matching the specified name. Runfolders which have not yet been picked up by the index
+        are looked for on the file system.
+        :param runfolder: to look for
+        :return: the matching runfolder, or None if no match
+        """
+        self.refresh_index()
+        entry = self.runfolder_index_repo.get_runfolder_entry(runfolder)
+        if not entry:
+            return super(IndexedRunfolderRepository, self).get_runfolder(runfolder)
+        if not self.file_system_service.isdir(entry.path):
+            return None
+
+        # the projects of a specific runfolder are always brought up to date, since e.g. a runfolder may just have
+        # been organised
+        self._refresh_runfolder_entry(entry, time.time())
+        self.runfolder_index_repo.commit()
+
+        return self._runfolder_from_index(
+            entry,
+            self.runfolder_index_repo.get_projects(runfolder_name=entry.name),
+            ignore_errors=False)
+
+    def _projects_from_index(self, indexed_projects):
+        runfolder_paths = {entry.name: entry.path for entry in self.runfolder_index_repo.get_runfolder_entries()}
+        for project in indexed_projects:
+            yield RunfolderProject(
+                name=project.name,
+                path=project.path,
+                runfolder_path=runfolder_paths[project.runfolder_name],
+                runfolder_name=project.runfolder_name)
+
+    def get_projects(self):
+        """
+        Pick up all projects from the index
+        :return: a generator of project instances
+        """
+        self.refresh_index()
+        return self._projects_from_index(self.runfolder_index_repo.get_projects())
+
+    def get_project(self, project_name):
+        self.refresh_index()
+        return self._projects_from_index(self.runfolder_index_repo.get_projects(project_name=project_name))
+
+
 class FileSystemBasedUnorganisedRunfolderRepository(FileSystemBasedRunfolderRepository):
     """
     A subclass of `FileSystemBasedRunfolderRepository` providing functionality for a unorganised runfolder
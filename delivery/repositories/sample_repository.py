@@ -19,43 +19,47 @@ class RunfolderProjectBasedSampleRepository(object):
     """
 
     filename_regexp = r'^(.+)_(S\d+)_L00(\d+)_([IR])(\d)_\d+\.fastq\.gz$'
+    filename_pattern = re.compile(filename_regexp)
 
     def __init__(self, file_system_service=FileSystemService()):
         self.file_system_service = file_system_service
 
-    def get_samples(self, project, runfolder):
+    def get_samples(self, project, runfolder, inventory=None):
         """
         Parse the supplied project directory and create Sample instances representing the samples in the project.
 
         :param project: a Project instance
         :param runfolder: a Runfolder instance
+        :param inventory: a FileInventory covering the project directory, if given, the files of the project are
+        listed from it instead of from the file system
         :return: a list of Sample instances
         """
-        return self._get_samples(project, runfolder)
+        return self._get_samples(project, runfolder, inventory)
 
-    def _get_samples(self, project, runfolder):
+    def _get_samples(self, project, runfolder, inventory=None):
 
-        def _is_fastq_file(f):
-            return re.match(self.filename_regexp, f) is not None
+        project_prefix = os.path.join(project.path, "")
 
         def _name_from_sample_file(s):
-            subdir = self.file_system_service.relpath(os.path.dirname(s.file_path), project.path)
+            sample_dir = os.path.dirname(s.file_path)
+            if sample_dir == project.path:
+                subdir = None
+            elif sample_dir.startswith(project_prefix):
+                subdir = sample_dir[len(project_prefix):]
+            else:
+                subdir = self.file_system_service.relpath(sample_dir, project.path)
             return s.sample_name, subdir if subdir != "." else None
 
         def _sample_from_name(name_id, sample_files=None):
             return Sample(name_id[0], project.name, sample_id=name_id[1], sample_files=sample_files)
 
-        def _sample_file_from_path(p):
-            return self.sample_file_from_sample_path(p, runfolder)
+        if inventory is not None:
+            project_files = inventory.files(project.path)
+        else:
+            project_files = self.file_system_service.list_files_recursively(project.path)
 
-        project_fastq_files = filter(
-            _is_fastq_file,
-            self.file_system_service.list_files_recursively(project.path))
-
-        # create SampleFile objects from the paths
-        project_sample_files = list(map(
-            _sample_file_from_path,
-            project_fastq_files))
+        # create SampleFile objects from the paths of the fastq files
+        project_sample_files = self.sample_files_from_sample_paths(project_files, runfolder)
 
         # get the sample names and corresponding sample id from the SampleFile objects and gather a list of
         # the SampleFile objects belonging to each sample name and sample id tuple
@@ -96,7 +100,7 @@ class RunfolderProjectBasedSampleRepository(object):
         :return: a SampleFile instance
         """
         file_name = os.path.basename(sample_path)
-        m = re.match(self.filename_regexp, file_name)
+        m = self.filename_pattern.match(file_name)
         if not m or len(m.groups()) != 5:
             raise FileNameParsingException("Could not parse information from file name '{}'".format(file_name))
         sample_name = str(m.group(1))
@@ -119,6 +123,49 @@ class RunfolderProjectBasedSampleRepository(object):
             is_index=is_index,
             checksum=checksum)
 
+    def sample_files_from_sample_paths(self, sample_paths, runfolder):
+        """
+        Create SampleFile instances from the supplied paths, like `sample_file_from_sample_path` does for a single
+        path, skipping any paths which are not sample sequence files. The file name of each path is only matched once,
+        and the path relative to the runfolder's parent directory, used to look up the pre-calculated checksum, is
+        sliced off the path rather than computed with relpath, which makes a difference for projects with many files.
+
+        :param sample_paths: an iterable of paths to files, typically all files in a project
+        :param runfolder: a Runfolder instance
+        :return: a list of SampleFile instances, in the same order as the paths
+        """
+        match = self.filename_pattern.match
+        runfolder_parent = os.path.dirname(runfolder.path)
+        runfolder_parent_prefix = os.path.join(runfolder_parent, "")
+        checksums = runfolder.checksums or {}
+        # the files of a sample share the same sample name and index strings, rather than each having copies of them
+        shared_strings = {}
+
+        sample_files = []
+        for sample_path in sample_paths:
+            m = match(sample_path.rpartition(os.sep)[2])
+            if m is None:
+                continue
+
+            if sample_path.startswith(runfolder_parent_prefix):
+                relative_path = sample_path[len(runfolder_parent_prefix):]
+            else:
+                relative_path = self.file_system_service.relpath(sample_path, runfolder_parent)
+            checksum = checksums.get(relative_path)
+            if checksum is None:
+                log.info("no pre-calculated checksum could be found for '{}'".format(relative_path))
+
+            sample_name, sample_index, lane_no, read_type, read_no = m.groups()
+            sample_files.append(SampleFile(
+                sample_path,
+                sample_name=shared_strings.setdefault(sample_name, sample_name),
+                sample_index=shared_strings.setdefault(sample_index, sample_index),
+                lane_no=int(lane_no),
+                read_no=int(read_no),
+                is_index=(read_type == "I"),
+                checksum=checksum))
+        return sample_files
+
     @staticmethod
     def sample_lanes(sample):
         return list(set([
@@ -4,13 +4,14 @@ import logging
 
 from sqlalchemy.orm.exc import NoResultFound
 
-from delivery.models.db_models import StagingOrder
+from delivery.models.db_models import StagingOrder, StagingStatus
+from delivery.repositories.database_repository import DatabaseBasedRepository
 from delivery.services.file_system_service import FileSystemService
 
 log = logging.getLogger(__name__)
 
 
-class DatabaseBasedStagingRepository(object):
+class DatabaseBasedStagingRepository(DatabaseBasedRepository):
     """
     A repository of staging orders backed by a database. It is able to create and commit new staging orders
     to the database, and fetch them based on different factors.
@@ -24,7 +25,7 @@ class DatabaseBasedStagingRepository(object):
                                     stdlib methods for accessing the file system, but this allows for easier mocking
                                     in tests.
         """
-        self.session = session_factory()
+        super(DatabaseBasedStagingRepository, self).__init__(session_factory)
         self.file_system_service = file_system_service
 
     def get_staging_order_by_source(self, source):
@@ -33,30 +34,69 @@ class DatabaseBasedStagingRepository(object):
         :param source: to search for
         :return: All staging orders of that source as a list
         """
-        return self.session.query(StagingOrder).filter(StagingOrder.source == source).all()
+        with self.session_scope() as session:
+            return session.query(StagingOrder).filter(StagingOrder.source == source).all()
 
-    def get_staging_order_by_id(self, identifier, custom_session=None):
+    def get_staging_order_by_id(self, identifier):
         """
         Get a staging order by id
-        NOTE
-        The custom_session used here is used because in the `StagingService` it is necessary to
-        make this query from a separate thread, something which sqlalchemy does not allow. Therefore
-        I've made it possible to provide a separate session here (in that case a new session instantiate in the
-        thread), while hacky it appears to work. /JD 20161108
         :param identifier: the stating order id to search for
-        :param custom_session: provide an other session object if that is neccessary for your use case.
         :return: the matching StagingOrder or None, if there was no matching stating order.
         """
-        if custom_session:
-            session = custom_session
-        else:
-            session = self.session
-        try:
-            return session.query(StagingOrder).filter(StagingOrder.id == identifier).one()
-        except NoResultFound:
-            return None
-
-    def create_staging_order(self, source, status, staging_target_dir, project_name):
+        with self.session_scope() as session:
+            try:
+                return session.query(StagingOrder).filter(StagingOrder.id == identifier).one()
+            except NoResultFound:
+                return None
+
+    def get_staging_orders_by_status(self, status):
+        """
+        Get all staging orders with a specific status
+        :param status: the StagingStatus to search for
+        :return: all staging orders with that status as a list, ordered by id
+        """
+        with self.session_scope() as session:
+            return session.query(StagingOrder).\
+                filter(StagingOrder.status == status).\
+                order_by(StagingOrder.id).\
+                all()
+
+    def get_pending_staging_orders(self):
+        """
+        Get the staging orders which are waiting to be staged, in the order they should be started
+        :return: all pending staging orders as a list, by descending priority and then by id
+        """
+        with self.session_scope() as session:
+            return session.query(StagingOrder).\
+                filter(StagingOrder.status == StagingStatus.pending).\
+                order_by(StagingOrder.priority.desc(), StagingOrder.id).\
+                all()
+
+    def get_staging_orders_by_filter(self, status=None, project_name=None, created_after=None, created_before=None,
+                                     offset=0, limit=None):
+        """
+        Get a page of the staging orders matching all of the given filters, with a single query
+        :param status: if given, only orders with this StagingStatus are returned
+        :param project_name: if given, only orders staging this project are returned
+        :param created_after: if given, only orders created at or after this datetime (in UTC) are returned
+        :param created_before: if given, only orders created before this datetime (in UTC) are returned
+        :param offset: the number of matching orders to skip
+        :param limit: the maximum number of orders to return, or None for no limit
+        :return: the matching staging orders as a list, ordered by id
+        """
+        with self.session_scope() as session:
+            query = session.query(StagingOrder)
+            if status is not None:
+                query = query.filter(StagingOrder.status == status)
+            if project_name is not None:
+                query = query.filter(StagingOrder.project_name == project_name)
+            if created_after is not None:
+                query = query.filter(StagingOrder.created_at >= created_after)
+            if created_before is not None:
+                query = query.filter(StagingOrder.created_at < created_before)
+            return query.order_by(StagingOrder.id).offset(offset).limit(limit).all()
+
+    def create_staging_order(self, source, status, staging_target_dir, project_name, priority=0):
         """
         Create a StatingOrder and commit it to the database
         :param source: the directory or file to stage
@@ -64,27 +104,29 @@ class DatabaseBasedStagingRepository(object):
         :param staging_target_dir: the directory to which the StagingOrder should transfer the source
         :param project_name: name of the project to stage (this will be used to determine the name of the
         staging target)
+        :param priority: orders with a higher priority are staged before orders with a lower priority
         :return:
         """
 
-        order = StagingOrder(source=source, status=status)
-        self.session.add(order)
+        order = StagingOrder(source=source, status=status, project_name=project_name, priority=priority)
 
-        self.session.commit()
+        with self.session_scope() as session:
+            session.add(order)
+            # the id of the order is needed for the staging target
+            session.flush()
 
-        if self.file_system_service.isfile(order.source):
-            log.debug("Order source is a file")
-        elif self.file_system_service.isdir(order.source):
-            log.debug("Order source is a dir")
-        else:
-            raise NotImplementedError("Could not parse a valid type from: {}, valid types"
-                                      " are directory and file.".format(order.source))
+            if self.file_system_service.isfile(order.source):
+                log.debug("Order source is a file")
+            elif self.file_system_service.isdir(order.source):
+                log.debug("Order source is a dir")
+            else:
+                raise NotImplementedError("Could not parse a valid type from: {}, valid types"
+                                          " are directory and file.".format(order.source))
 
-        staging_target = os.path.join(staging_target_dir, str(order.id), project_name)
+            staging_target = os.path.join(staging_target_dir, str(order.id), project_name)
 
-        log.debug("Set the staging target to: {}".format(staging_target))
+            log.debug("Set the staging target to: {}".format(staging_target))
 
-        order.staging_target = staging_target
-        self.session.commit()
+            order.staging_target = staging_target
 
         return order
@@ -42,21 +42,24 @@ class DeliveryService(object):
         else:
             self.delivery_sources_repo.add_source(source)
 
-    def _validate_and_stage_source(self, source, force_delivery, path, project_name):
+    def _validate_and_stage_source(self, source, force_delivery, path, project_name, priority=0):
         self._validate_source_and_add_to_repo(source, force_delivery, path)
         # Start staging
-        stage_order = self.staging_service.create_new_stage_order(path=source.path, project_name=project_name)
+        stage_order = self.staging_service.create_new_stage_order(path=source.path,
+                                                                  project_name=project_name,
+                                                                  priority=priority)
         self.staging_service.stage_order(stage_order)
         return stage_order
 
-    def _start_staging_projects(self, projects, force_delivery):
+    def _start_staging_projects(self, projects, force_delivery, priority=0):
         projects_and_stage_order_ids = {}
         for project in projects:
             source = self.delivery_sources_repo.create_source(project_name=project.name,
                                                               source_name="{}/{}".format(project.runfolder_name,
                                                                                          project.name),
                                                               path=project.path)
-            stage_order = self._validate_and_stage_source(source, force_delivery, project.path, project.name)
+            stage_order = self._validate_and_stage_source(source, force_delivery, project.path, project.name,
+                                                          priority=priority)
             projects_and_stage_order_ids[project.name] = stage_order.id
 
         return projects_and_stage_order_ids
@@ -89,10 +92,10 @@ class DeliveryService(object):
 
         return self.file_system_service.abspath(project_dir)
 
-    def deliver_single_runfolder(self, runfolder_name, only_these_projects, force_delivery):
+    def deliver_single_runfolder(self, runfolder_name, only_these_projects, force_delivery, priority=0):
         runfolder = self.runfolder_service.find_runfolder(runfolder_name)
         projects = list(self.runfolder_service.find_projects_on_runfolder(runfolder, only_these_projects))
-        return self._start_staging_projects(projects, force_delivery)
+        return self._start_staging_projects(projects, force_delivery, priority=priority)
 
     def _get_projects_to_deliver(self, projects, mode, batch_nbr):
         # First create sources for all the projects, depending on mode
@@ -129,7 +132,7 @@ class DeliveryService(object):
                     raise NotImplementedError("This is not a valid state, delivery mode needs to be CLEAN/"
                                               "BATCH/FORCE.")
 
-    def deliver_all_runfolders_for_project(self, project_name, mode):
+    def deliver_all_runfolders_for_project(self, project_name, mode, priority=0):
         """
         This method will attempt to deliver all runfolders for the specified project.
 
@@ -149,6 +152,7 @@ class DeliveryService(object):
 
         :param project_name: of project to deliver
         :param mode: A DeliveryMode
+        :param priority: of the staging order, orders with a higher priority are staged first
         :return: a tupple with a dict with {<project name>: <staging order id>}, and the projects
         """
         projects = list(self.runfolder_service.find_runfolders_for_project(project_name))
@@ -180,11 +184,13 @@ class DeliveryService(object):
 
         self.delivery_sources_repo.add_source(source)
 
-        stage_order = self.staging_service.create_new_stage_order(path=source.path, project_name=project_name)
+        stage_order = self.staging_service.create_new_stage_order(path=source.path,
+                                                                  project_name=project_name,
+                                                                  priority=priority)
         self.staging_service.stage_order(stage_order)
         return {source.project_name: stage_order.id}, projects_to_deliver
 
-    def deliver_arbitrary_directory_project(self, project_name, dir_name=None, force_delivery=False):
+    def deliver_arbitrary_directory_project(self, project_name, dir_name=None, force_delivery=False, priority=0):
 
         if not dir_name:
             dir_name = project_name
@@ -197,13 +203,23 @@ class DeliveryService(object):
                                                           source_name=os.path.basename(project.path),
                                                           path=project.path)
 
-        stage_order = self._validate_and_stage_source(source, force_delivery, project.path, project_name)
+        stage_order = self._validate_and_stage_source(source, force_delivery, project.path, project_name,
+                                                      priority=priority)
         return {source.project_name: stage_order.id}
 
     def check_staging_status(self, staging_id):
         stage_order = self.staging_service.get_stage_order_by_id(staging_id)
         return stage_order
 
+    def check_staging_statuses(self, status=None, project_name=None, created_after=None, created_before=None,
+                               offset=0, limit=None):
+        return self.staging_service.get_stage_orders(status=status,
+                                                     project_name=project_name,
+                                                     created_after=created_after,
+                                                     created_before=created_before,
+                                                     offset=offset,
+                                                     limit=limit)
+
     def kill_process_of_stage_order(self, staging_id):
         was_killed = self.staging_service.kill_process_of_stage_order(staging_id)
         return was_killed
@@ -1,6 +1,12 @@
 
 
+import os
+import re
+import weakref
+from collections import deque
+
 from tornado.process import Subprocess
+from tornado.iostream import StreamClosedError
 from tornado import gen
 
 from subprocess import PIPE
@@ -13,33 +19,151 @@ class ExternalProgramService(object):
     A service for running external programs
     """
 
+    # The number of bytes to read from the output streams of a streamed execution at a time
+    STREAM_READ_SIZE = 64 * 1024
+
+    # The number of lines at the end of stdout and stderr of a streamed execution which are kept for its
+    # ExecutionResult
+    OUTPUT_TAIL_LINES = 1000
+
+    # The length at which output without a line terminator is passed on as a line of its own, so that a program
+    # which never ends its lines cannot fill up the memory
+    MAX_LINE_LENGTH = 1024 * 1024
+
+    LINE_SEPARATOR = re.compile(b"(\r\n|\r|\n)")
+
+    # The streamed executions whose output streams have not been closed yet, see `close_unfinished_executions`
+    _unfinished_executions = weakref.WeakSet()
+
     @staticmethod
-    def run(cmd):
+    def run(cmd, stream_output=False, process_group=None):
         """
         Run a process and do not wait for it to finish
         :param cmd: the command to run as a list, i.e. ['ls','-l', '/']
+        :param stream_output: if True, stdout and stderr are consumed as streams while the process is running, see
+                              `wait_for_execution`. Otherwise they are read when the process has finished, which
+                              only is suitable for programs which write little output.
+        :param process_group: if specified, the process is put in a process group, so that it can be signalled
+                              together with the other processes in the group with `os.killpg`. If 0, a new process
+                              group is created with the process as its leader, i.e. with the pid of the process as
+                              its id, otherwise the process joins the existing group with this id.
         :return: A instance of Execution
         """
+        output = Subprocess.STREAM if stream_output else PIPE
+        kwargs = {}
+        if process_group is not None:
+            kwargs['preexec_fn'] = lambda: os.setpgid(0, process_group)
         p = Subprocess(cmd,
-                       stdout=PIPE,
-                       stderr=PIPE,
-                       stdin=PIPE)
-        return Execution(pid=p.pid, process_obj=p)
+                       stdout=output,
+                       stderr=output,
+                       stdin=PIPE,
+                       **kwargs)
+        execution = Execution(pid=p.pid, process_obj=p, stream_output=stream_output)
+        if stream_output:
+            ExternalProgramService._unfinished_executions.add(execution)
+        return execution
 
     @staticmethod
     @gen.coroutine
-    def wait_for_execution(execution):
+    def wait_for_execution(execution, stdout_line_callback=None, stderr_line_callback=None, tail_lines=None):
         """
-        Wait for an execution to finish
+        Wait for an execution to finish.
+
+        If the execution was started with `stream_output`, stdout and stderr are read line by line as the process
+        writes them, so that the process never blocks on a full pipe. Each line is passed to the line callbacks,
+        and only the last lines of the output are kept in memory for the ExecutionResult.
+
         :param execution: instance of Execution
+        :param stdout_line_callback: if specified, it is called with each line written to stdout, without the line
+                                     terminator. Lines may be terminated by carriage returns as well as newlines.
+        :param stderr_line_callback: as `stdout_line_callback`, but for stderr
+        :param tail_lines: the number of lines of stdout and stderr to keep, defaults to OUTPUT_TAIL_LINES
         :return: an ExecutionResult for the execution
         """
-        status_code = yield execution.process_obj.wait_for_exit(raise_error=False)
-        out = execution.process_obj.stdout.read().decode('UTF-8')
-        err = execution.process_obj.stderr.read().decode('UTF-8')
+        if execution.stream_output:
+            tail_lines = tail_lines or ExternalProgramService.OUTPUT_TAIL_LINES
+            stdout_tail = deque(maxlen=tail_lines)
+            stderr_tail = deque(maxlen=tail_lines)
+            try:
+                yield [ExternalProgramService._read_lines(execution.process_obj.stdout, stdout_line_callback,
+                                                          stdout_tail),
+                       ExternalProgramService._read_lines(execution.process_obj.stderr, stderr_line_callback,
+                                                          stderr_tail)]
+                status_code = yield execution.process_obj.wait_for_exit(raise_error=False)
+            finally:
+                ExternalProgramService._close_streams(execution)
+            out = "".join(stdout_tail)
+            err = "".join(stderr_tail)
+        else:
+            if stdout_line_callback or stderr_line_callback:
+                raise ValueError("Line callbacks can only be used with executions started with stream_output")
+            status_code = yield execution.process_obj.wait_for_exit(raise_error=False)
+            out = execution.process_obj.stdout.read().decode('UTF-8')
+            err = execution.process_obj.stderr.read().decode('UTF-8')
 
         return ExecutionResult(out, err, status_code)
 
+    @staticmethod
+    def close_unfinished_executions():
+        """
+        Close the output streams of the streamed executions which are still running, e.g. before the IOLoop they are
+        read on is closed, see `_close_streams`. The processes get a broken pipe if they write any more output.
+        :return: None
+        """
+        for execution in list(ExternalProgramService._unfinished_executions):
+            ExternalProgramService._close_streams(execution)
+
+    @staticmethod
+    def _close_streams(execution):
+        """
+        Close the output streams of a streamed execution, which is done as soon as the execution has finished, or
+        waiting for it has failed. The fds of the streams must only be closed by the streams themselves: closing the
+        IOLoop with all_fds closes the fds of the streams which are being read behind their back, and the streams
+        then close the fds a second time when they are closed or garbage collected, by which time the fd numbers
+        may belong to e.g. a database connection.
+        """
+        ExternalProgramService._unfinished_executions.discard(execution)
+        execution.process_obj.stdout.close()
+        execution.process_obj.stderr.close()
+
+    @staticmethod
+    @gen.coroutine
+    def _read_lines(stream, line_callback, tail):
+        """
+        Read a stream until it is closed, passing each line to the callback and keeping the last lines, including
+        their line terminators, in the tail.
+        """
+
+        def _handle_line(line, terminator):
+            line = line.decode('UTF-8', 'replace')
+            tail.append(line + terminator.decode('UTF-8'))
+            if line_callback:
+                line_callback(line)
+
+        remainder = b""
+        while True:
+            try:
+                chunk = yield stream.read_bytes(ExternalProgramService.STREAM_READ_SIZE, partial=True)
+            except StreamClosedError:
+                break
+            # the pieces alternate between lines and line terminators, with a possibly incomplete line last
+            pieces = ExternalProgramService.LINE_SEPARATOR.split(remainder + chunk)
+            remainder = pieces.pop()
+            while len(remainder) > ExternalProgramService.MAX_LINE_LENGTH:
+                _handle_line(remainder[:ExternalProgramService.MAX_LINE_LENGTH], b"")
+                remainder = remainder[ExternalProgramService.MAX_LINE_LENGTH:]
+            # a carriage return at the end of the chunk may be the first half of a "\r\n" which is split between
+            # two reads, so the last line is kept until the next chunk shows how it ends
+            if not remainder and pieces and pieces[-1] == b"\r":
+                pieces.pop()
+                remainder = pieces.pop() + b"\r"
+            for line, terminator in zip(pieces[::2], pieces[1::2]):
+                _handle_line(line, terminator)
+        if remainder.endswith(b"\r"):
+            _handle_line(remainder[:-1], b"\r")
+        elif remainder:
+            _handle_line(remainder, b"")
+
     @staticmethod
     def run_and_wait(cmd):
         """
@@ -47,6 +171,5 @@ class ExternalProgramService(object):
         :param cmd: the command to run as a list, i.e. ['ls','-l', '/']
         :return: an ExecutionResult for the execution
         """
-        execution = ExternalProgramService.run(cmd)
+        execution = ExternalProgramService.run(cmd, stream_output=True)
         return ExternalProgramService.wait_for_execution(execution)
-
@@ -2,6 +2,8 @@
 import os
 import logging
 
+from delivery.models.file_inventory import FileInventory
+
 log = logging.getLogger(__name__)
 
 
@@ -45,6 +47,40 @@ class FileSystemService(object):
         for root, dirs, files in os.walk(base_path):
             yield from map(lambda f: os.path.join(root, f), files)
 
+    @staticmethod
+    def scan_tree(base_path, follow_root_links=False):
+        """
+        Traverse a directory tree once, using os.scandir, and make an in-memory inventory of it. Like os.walk, symbolic
+        links to directories are not followed, and directories which cannot be read are skipped.
+        :param base_path: the directory to traverse
+        :param follow_root_links: if True, symbolic links to directories directly beneath base_path are followed, the
+                                  way os.walk follows a symbolic link given as the directory to walk, e.g. so that a
+                                  project directory which is linked into a runfolder is traversed. Links further down
+                                  are still not followed.
+        :return: a FileInventory of the files and directories beneath base_path
+        :raises FileNotFoundError: if base_path does not exist
+        """
+        root = os.path.normpath(base_path)
+        children = {}
+        dirs = [root]
+        while dirs:
+            dir_path = dirs.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except OSError:
+                if dir_path == root:
+                    raise
+                continue
+            children[dir_path] = entries
+            for entry in entries:
+                try:
+                    if entry.is_dir() and (not entry.is_symlink() or (follow_root_links and dir_path == root)):
+                        dirs.append(entry.path)
+                except OSError:
+                    pass
+        return FileInventory(root, children)
+
     @staticmethod
     def isdir(path):
         """
@@ -124,3 +160,21 @@ class FileSystemService(object):
     @staticmethod
     def relpath(path, start):
         return os.path.relpath(path, start)
+
+    @staticmethod
+    def getmtime(path):
+        """
+        Shadows os.path.getmtime
+        :param path: to get the modification time for
+        :return: the modification time of the path as seconds since the epoch
+        """
+        return os.path.getmtime(path)
+
+    @staticmethod
+    def stat(path):
+        """
+        Shadows os.stat
+        :param path: to get the status of
+        :return: an os.stat_result for the path
+        """
+        return os.stat(path)
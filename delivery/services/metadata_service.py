@@ -1,8 +1,13 @@
 import csv
 import hashlib
 import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from delivery.exceptions import ChecksumFileNotFoundException, SamplesheetNotFoundException
+from delivery.models.checksums import CompactChecksumStore
 
 log = logging.getLogger(__name__)
 
@@ -12,6 +17,12 @@ class MetadataService(object):
     Metadata service, used for reading and writing metadata files associated with the service.
     """
 
+    # The number of bytes read at a time when hashing files
+    HASH_BUFFER_SIZE = 1024 * 1024
+
+    # The default number of files hashed concurrently by `hash_files`
+    HASH_WORKERS = 4
+
     @staticmethod
     def extract_samplesheet_data(samplesheet_file):
 
@@ -28,15 +39,22 @@ class MetadataService(object):
 
     @staticmethod
     def parse_checksum_file(checksum_file):
-        file_checksums = {}
+        """
+        Parse a checksum file as written by e.g. md5sum
+        :param checksum_file: path to the checksum file
+        :return: a CompactChecksumStore mapping the file paths in the checksum file to their checksums
+        :raises ChecksumFileNotFoundException: if the checksum file could not be opened
+        """
+        def _checksum_entries(fh):
+            for entry in fh:
+                checksum, file_path = entry.strip().split(maxsplit=1)
+                yield file_path, checksum
+
         try:
             with open(checksum_file) as chksumh:
-                for entry in chksumh:
-                    checksum, file_path = entry.strip().split(maxsplit=1)
-                    file_checksums[file_path] = checksum
+                return CompactChecksumStore(_checksum_entries(chksumh))
         except IOError as e:
             raise ChecksumFileNotFoundException("Checksum file '{}' could not be opened: {}".format(checksum_file, e))
-        return file_checksums
 
     @staticmethod
     def write_checksum_file(checksum_file, checksums):
@@ -65,9 +83,132 @@ class MetadataService(object):
         return hasher_obj.hexdigest()
 
     @staticmethod
-    def hash_file(input_file):
+    def hash_file(input_file, buffer_size=None):
+        """
+        Calculate the MD5 checksum of a file. The file is read in large fixed-size chunks into a reusable buffer.
+        :param input_file: path to the file to hash
+        :param buffer_size: the number of bytes to read at a time, defaults to HASH_BUFFER_SIZE
+        :return: the checksum as a hexadecimal string
+        """
         hasher_obj = MetadataService.get_hash_object()
-        with open(input_file, 'rb') as fh:
-            for line in fh:
-                hasher_obj.update(line)
+        buffer = bytearray(buffer_size or MetadataService.HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(input_file, 'rb', buffering=0) as fh:
+            while True:
+                bytes_read = fh.readinto(buffer)
+                if not bytes_read:
+                    break
+                hasher_obj.update(view[:bytes_read])
         return hasher_obj.hexdigest()
+
+    @staticmethod
+    def hash_files(input_files, max_workers=None):
+        """
+        Calculate the MD5 checksums of several files concurrently. Both reading files and hashing large chunks of
+        data release the GIL, so the files are hashed in a pool of threads.
+        :param input_files: paths to the files to hash
+        :param max_workers: the maximum number of files to hash at the same time, defaults to HASH_WORKERS
+        :return: a dict with the paths as keys and the checksums as values
+        """
+        input_files = list(input_files)
+        if len(input_files) < 2:
+            return {input_file: MetadataService.hash_file(input_file) for input_file in input_files}
+        nbr_of_workers = min(len(input_files), max_workers or MetadataService.HASH_WORKERS)
+        with ThreadPoolExecutor(max_workers=nbr_of_workers) as executor:
+            return dict(zip(input_files, executor.map(MetadataService.hash_file, input_files)))
+
+
+class ChecksumFileCache(object):
+    """
+    An in-memory cache of parsed checksum files. Each checksum file is cached together with its size and
+    modification time at the time of parsing, so a checksum file which has changed on disk will be parsed again.
+    The memory used is bounded by limiting the total number of checksums held in the cache, and the least recently
+    used checksum files are evicted first when the limit is reached.
+    """
+
+    def __init__(self, max_checksums=500000):
+        """
+        Instantiate a new ChecksumFileCache
+        :param max_checksums: the maximum total number of checksums to keep in the cache
+        """
+        self.max_checksums = max_checksums
+        self.hits = 0
+        self.misses = 0
+        self._checksum_files = OrderedDict()
+        self._nbr_of_checksums = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_version(checksum_file):
+        stat = os.stat(checksum_file)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _evict(self, checksum_file):
+        _, checksums = self._checksum_files.pop(checksum_file)
+        self._nbr_of_checksums -= len(checksums)
+
+    def get(self, checksum_file, parser):
+        """
+        Get the parsed checksums for a checksum file, parsing it if it is not cached or has changed since it was
+        cached. Note that the returned checksums are shared between callers and must not be modified.
+        :param checksum_file: path to the checksum file
+        :param parser: a callable which takes the path to a checksum file and returns the parsed checksums
+        :return: the parsed checksums
+        """
+        try:
+            file_version = self._file_version(checksum_file)
+        except OSError:
+            # let the parser report the problem with the checksum file
+            return parser(checksum_file)
+
+        with self._lock:
+            cached = self._checksum_files.get(checksum_file)
+            if cached and cached[0] == file_version:
+                self._checksum_files.move_to_end(checksum_file)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        checksums = parser(checksum_file)
+
+        with self._lock:
+            if checksum_file in self._checksum_files:
+                self._evict(checksum_file)
+            if len(checksums) <= self.max_checksums:
+                while self._checksum_files and self._nbr_of_checksums + len(checksums) > self.max_checksums:
+                    evicted_file = next(iter(self._checksum_files))
+                    log.debug("Evicting checksums for {} from the cache".format(evicted_file))
+                    self._evict(evicted_file)
+                self._checksum_files[checksum_file] = (file_version, checksums)
+                self._nbr_of_checksums += len(checksums)
+
+        return checksums
+
+    def statistics(self):
+        """
+        :return: a dict with the number of cache hits and misses, and the number of checksum files and checksums
+        currently in the cache
+        """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "checksum_files": len(self._checksum_files),
+                    "checksums": self._nbr_of_checksums}
+
+
+class CachingMetadataService(MetadataService):
+    """
+    A MetadataService which keeps parsed checksum files in a ChecksumFileCache, so that the checksum file of a
+    runfolder does not have to be parsed again each time the runfolder is accessed.
+    """
+
+    def __init__(self, checksum_file_cache=None):
+        """
+        Instantiate a new CachingMetadataService
+        :param checksum_file_cache: a ChecksumFileCache instance, a new cache with default settings is used if
+        not specified
+        """
+        self.checksum_file_cache = checksum_file_cache or ChecksumFileCache()
+
+    def parse_checksum_file(self, checksum_file):
+        return self.checksum_file_cache.get(checksum_file, MetadataService.parse_checksum_file)
@@ -1,7 +1,10 @@
 import os.path
 import logging
 import re
+import datetime
 from tornado import gen
+from tornado.ioloop import PeriodicCallback
+from tornado.locks import Semaphore
 
 from delivery.exceptions import InvalidStatusException, CannotParseMoverOutputException
 from delivery.models.db_models import StagingStatus, DeliveryStatus
@@ -11,14 +14,26 @@ log = logging.getLogger(__name__)
 
 class MoverDeliveryService(object):
 
-    def __init__(self, external_program_service, staging_service, delivery_repo, session_factory, path_to_mover):
+    def __init__(self, external_program_service, staging_service, delivery_repo, path_to_mover,
+                 max_concurrent_status_polls=10):
+        """
+        Instantiate a new MoverDeliveryService
+        :param external_program_service: a instance of ExternalProgramService
+        :param staging_service: a instance of StagingService
+        :param delivery_repo: a instance of DatabaseBasedDeliveriesRepository
+        :param path_to_mover: the directory where the mover programs are installed
+        :param max_concurrent_status_polls: the maximum number of moverinfo processes the status poller runs at the
+                                            same time, see `poll_delivery_statuses`
+        """
         self.external_program_service = external_program_service
         self.mover_external_program_service = self.external_program_service
         self.moverinfo_external_program_service = self.external_program_service
         self.staging_service = staging_service
         self.delivery_repo = delivery_repo
-        self.session_factory = session_factory
         self.path_to_mover = path_to_mover
+        self.max_concurrent_status_polls = max_concurrent_status_polls
+        self._status_poller = None
+        self._polling = False
 
     @staticmethod
     def _parse_mover_id_from_mover_output(mover_output):
@@ -32,13 +47,8 @@ class MoverDeliveryService(object):
 
     @staticmethod
     @gen.coroutine
-    def _run_mover(delivery_order_id, delivery_order_repo, external_program_service, session_factory, path_to_mover):
-        session = session_factory()
-
-        # This is a somewhat hacky work-around to the problem that objects created in one
-        # thread, and thus associated with another session cannot be accessed by another
-        # thread, there fore it is re-materialized in here...
-        delivery_order = delivery_order_repo.get_delivery_order_by_id(delivery_order_id, session)
+    def _run_mover(delivery_order_id, delivery_order_repo, external_program_service, path_to_mover):
+        delivery_order = delivery_order_repo.get_delivery_order_by_id(delivery_order_id)
         try:
 
             cmd = [os.path.join(path_to_mover, 'to_outbox'),
@@ -50,10 +60,10 @@ class MoverDeliveryService(object):
 
             log.debug("Running mover with cmd: {}".format(" ".join(cmd)))
 
-            execution = external_program_service.run(cmd)
+            execution = external_program_service.run(cmd, stream_output=True)
             delivery_order.delivery_status = DeliveryStatus.mover_processing_delivery
             delivery_order.mover_pid = execution.pid
-            session.commit()
+            delivery_order_repo.save(delivery_order)
 
             execution_result = yield external_program_service.wait_for_execution(execution)
 
@@ -73,8 +83,8 @@ class MoverDeliveryService(object):
             log.info("Failed in starting delivery: {} because this exception was logged: {}".
                      format(delivery_order, e))
         finally:
-            # Always commit the state change to the database
-            session.commit()
+            # Always save the state change to the database
+            delivery_order_repo.save(delivery_order)
 
     @gen.coroutine
     def deliver_by_staging_id(self, staging_id, delivery_project, md5sum_file, skip_mover=False):
@@ -93,13 +103,11 @@ class MoverDeliveryService(object):
         args_for_run_mover = {'delivery_order_id': delivery_order.id,
                               'delivery_order_repo': self.delivery_repo,
                               'external_program_service': self.mover_external_program_service,
-                              'session_factory': self.session_factory,
                               'path_to_mover': self.path_to_mover}
 
         if skip_mover:
-            session = self.session_factory()
             delivery_order.delivery_status = DeliveryStatus.delivery_skipped
-            session.commit()
+            self.delivery_repo.save(delivery_order)
         else:
             yield MoverDeliveryService._run_mover(**args_for_run_mover)
 
@@ -131,12 +139,11 @@ class MoverDeliveryService(object):
         return mover_status
 
     @gen.coroutine
-    def update_delivery_status(self, delivery_order_id):
-        delivery_order = self.get_delivery_order_by_id(delivery_order_id)
-
+    def _refresh_delivery_status(self, delivery_order):
         if delivery_order.mover_delivery_id and delivery_order.delivery_status == DeliveryStatus.delivery_in_progress:
             mover_info_result = yield self._run_mover_info(delivery_order.mover_delivery_id)
-            session = self.session_factory()
+            delivery_order.mover_status = mover_info_result
+            delivery_order.mover_status_updated_at = datetime.datetime.utcnow()
 
             if mover_info_result == 'Delivered':
                 log.info("Got successful status from Mover for delivery order: {}".format(delivery_order.id))
@@ -144,12 +151,92 @@ class MoverDeliveryService(object):
             else:
                 log.info("Got \"in progress\" status from Mover. Status was: {}".format(mover_info_result))
 
-            session.commit()
+    @gen.coroutine
+    def update_delivery_status(self, delivery_order_id):
+        delivery_order = self.get_delivery_order_by_id(delivery_order_id)
+
+        yield self._refresh_delivery_status(delivery_order)
+        self.delivery_repo.save(delivery_order)
 
         return delivery_order
 
+    @gen.coroutine
+    def poll_delivery_statuses(self):
+        """
+        Ask Mover for the status of all deliveries in progress, running at most `max_concurrent_status_polls`
+        moverinfo processes at a time, and store the statuses in the database. If the previous poll has not
+        finished yet, this does nothing.
+        :return: None
+        """
+        if self._polling:
+            log.debug("The previous poll of the delivery statuses has not finished yet, will not start another one")
+            return
+
+        self._polling = True
+        try:
+            delivery_orders = self.delivery_repo.get_delivery_orders_by_status(DeliveryStatus.delivery_in_progress)
+            log.debug("Polling Mover for the status of {} deliveries".format(len(delivery_orders)))
+            semaphore = Semaphore(self.max_concurrent_status_polls)
+
+            @gen.coroutine
+            def _refresh(delivery_order):
+                with (yield semaphore.acquire()):
+                    try:
+                        yield self._refresh_delivery_status(delivery_order)
+                    except Exception as e:
+                        log.warning("Failed to get the status of delivery order: {} from Mover: {}".format(
+                            delivery_order.id, e))
+
+            yield [_refresh(delivery_order) for delivery_order in delivery_orders]
+
+            # save all statuses at once, so that the database is only locked briefly
+            self.delivery_repo.save(*delivery_orders)
+        finally:
+            self._polling = False
+
+    def start_status_poller(self, poll_interval):
+        """
+        Start polling Mover for the status of the deliveries in progress in the background. While the poller is
+        running, `get_delivery_order_with_status` returns the status from the last poll instead of asking Mover.
+        :param poll_interval: the number of seconds between the polls
+        :return: None
+        """
+        self._status_poller = PeriodicCallback(self.poll_delivery_statuses, poll_interval * 1000)
+        self._status_poller.start()
+
+    @gen.coroutine
+    def get_delivery_order_with_status(self, delivery_order_id):
+        """
+        Get a delivery order with a current status. If the status poller is running, the order is returned with the
+        status from the last poll at once, otherwise Mover is asked for the status of a delivery in progress.
+        :param delivery_order_id: the id of the delivery order
+        :return: the delivery order
+        """
+        if self._status_poller:
+            return self.get_delivery_order_by_id(delivery_order_id)
+        delivery_order = yield self.update_delivery_status(delivery_order_id)
+        return delivery_order
+
     def get_delivery_order_by_id(self, delivery_order_id):
         return self.delivery_repo.get_delivery_order_by_id(delivery_order_id)
 
+    def get_delivery_orders(self, delivery_order_ids=None, delivery_project=None, delivery_status=None,
+                            offset=0, limit=None):
+        """
+        Get a page of the delivery orders matching all of the given filters. Mover is not asked for their status, so
+        the orders have the status from the last poll, if the status poller is running.
+        :param delivery_order_ids: if given, only orders with one of these ids are returned
+        :param delivery_project: if given, only orders to this project are returned
+        :param delivery_status: if given, only orders with this DeliveryStatus are returned
+        :param offset: the number of matching orders to skip
+        :param limit: the maximum number of orders to return, or None for no limit
+        :return: the matching delivery orders as a list, ordered by id
+        """
+        return self.delivery_repo.get_delivery_orders_by_filter(delivery_order_ids=delivery_order_ids,
+                                                                delivery_project=delivery_project,
+                                                                delivery_status=delivery_status,
+                                                                offset=offset,
+                                                                limit=limit)
+
     def get_status_of_delivery_order(self, delivery_order_id):
         return self.get_delivery_order_by_id(delivery_order_id).delivery_status
@@ -3,8 +3,11 @@ import logging
 import os
 import time
 
+from tornado import gen
+
 from delivery.exceptions import ProjectAlreadyOrganisedException
 
+from delivery.models.db_models import OrganiseStatus
 from delivery.models.project import RunfolderProject
 from delivery.models.runfolder import Runfolder, RunfolderFile
 from delivery.models.sample import Sample, SampleFile
@@ -18,17 +21,77 @@ class OrganiseService(object):
     Starting in this context means organising a runfolder in preparation for a delivery. Each project on the runfolder
     will be organised into its own separate directory. Sequence and report files will be symlinked from their original
     location.
-    This service handles that in a synchronous way.
+    This service handles that either in a synchronous way, or in the background by executing an organise order
+    whose status can be monitored by querying the underlying database.
     """
 
-    def __init__(self, runfolder_service, file_system_service=FileSystemService()):
+    def __init__(self, runfolder_service, file_system_service=FileSystemService(), organise_repo=None, executor=None):
         """
         Instantiate a new OrganiseService
         :param runfolder_service: an instance of a RunfolderService
         :param file_system_service: an instance of FileSystemService
+        :param organise_repo: an instance of DatabaseBasedOrganiseRepository, needed for organising in the background
+        :param executor: a concurrent.futures.Executor in which runfolders are organised in the background
         """
         self.runfolder_service = runfolder_service
         self.file_system_service = file_system_service
+        self.organise_repo = organise_repo
+        self.executor = executor
+
+    def create_organise_order(self, runfolder_id, lanes, projects, force):
+        """
+        Create an organise order for a runfolder and start organising it in the background. The arguments are the
+        same as for `organise_runfolder`. The runfolder and the projects to organise are looked up before the order
+        is created, so that an order is not created for something which does not exist.
+
+        :raises RunfolderNotFoundException: if the runfolder does not exist
+        :raises ProjectNotFoundException: if any of the projects is not on the runfolder
+        :return: the created OrganiseOrder, whose status will be updated as the organisation progresses
+        """
+        runfolder = self.runfolder_service.find_runfolder(runfolder_id)
+        list(self.runfolder_service.find_projects_on_runfolder(runfolder, only_these_projects=projects))
+
+        organise_order = self.organise_repo.create_organise_order(runfolder_id)
+        self.execute_organise_order(organise_order, lanes, projects, force)
+        return organise_order
+
+    @gen.coroutine
+    def execute_organise_order(self, organise_order, lanes, projects, force):
+        """
+        Organise the runfolder of an organise order in the executor, so that the IOLoop is not blocked while the
+        runfolder is walked and the symlinks are created. The organise order is only updated from the IOLoop, once
+        the organisation has finished.
+
+        :param organise_order: the OrganiseOrder to execute
+        :param lanes: if not None, only samples on any of the specified lanes will be organised
+        :param projects: if not None, only projects in this list will be organised
+        :param force: if True, a previously organised project will be renamed with a unique suffix
+        :return: None, only reports back through side-effects
+        """
+        organise_order.status = OrganiseStatus.organising_in_progress
+        self.organise_repo.save(organise_order)
+        try:
+            organised_runfolder = yield self.executor.submit(
+                self.organise_runfolder, organise_order.runfolder, lanes, projects, force)
+            organise_order.organised_path = organised_runfolder.path
+            organise_order.projects = ",".join(project.name for project in organised_runfolder.projects)
+            organise_order.status = OrganiseStatus.organising_successful
+            log.info("Successfully organised: {}".format(organise_order))
+        except Exception as e:
+            organise_order.message = str(e)
+            organise_order.status = OrganiseStatus.organising_failed
+            log.error("Failed in organising: {} because this exception was logged: {}".format(organise_order, e))
+        finally:
+            # Always save the state change to the database
+            self.organise_repo.save(organise_order)
+
+    def get_organise_order_by_id(self, organise_order_id):
+        """
+        Get organise order by id
+        :param organise_order_id: id of OrganiseOrder to get
+        :return: the OrganiseOrder instance, or None if not found
+        """
+        return self.organise_repo.get_organise_order_by_id(organise_order_id)
 
     def organise_runfolder(self, runfolder_id, lanes, projects, force):
         """
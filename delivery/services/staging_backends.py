@@ -0,0 +1,563 @@
+
+import logging
+import os
+import re
+import signal
+import time
+import heapq
+import errno
+import fcntl
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado import gen
+
+from delivery.exceptions import StagingFailedException
+from delivery.services.metadata_service import MetadataService
+
+log = logging.getLogger(__name__)
+
+
+class StagingBackend(object):
+    """
+    A way of copying the source of a staging order to its staging target. The `StagingService` takes care of
+    queueing the orders and keeping track of their status, and leaves the copying to one of these backends.
+    """
+
+    # The minimum number of seconds between writes of the progress of a staging to the database
+    PROGRESS_UPDATE_INTERVAL = 5
+
+    @gen.coroutine
+    def stage(self, staging_order, staging_repo, checksums=None):
+        """
+        Copy the source of the staging order to its staging target, which already exists
+        :param staging_order: the StagingOrder to stage
+        :param staging_repo: the DatabaseBasedStagingRepository of the staging order, which can be used to save the
+                             progress of the staging
+        :param checksums: if specified, a dict to which backends which read the files while copying them add the
+                          MD5 checksums of the staged files, with the paths of the staged files as keys
+        :return: the size of the staged files in bytes
+        :raises StagingFailedException: if the staging did not succeed
+        """
+        raise NotImplementedError("Subclasses should implement this!")
+
+    @staticmethod
+    def _progress_updater(staging_order, staging_repo):
+        """
+        Create a callback which updates the progress of the staging order, given a tuple with the number of bytes
+        transferred, the transfer rate in bytes per second and the estimated number of seconds remaining (or None
+        if it is not known). When several workers transfer parts of the same order, the callback is given which of
+        them made the progress, and the progress of the order is the sum of their transfers, finishing when the
+        slowest of them does. To avoid writing to the database too often, the progress is only saved every
+        PROGRESS_UPDATE_INTERVAL seconds.
+        """
+        last_save = None
+        progress_by_worker = {}
+
+        def _update_progress(progress, worker=0):
+            nonlocal last_save
+            progress_by_worker[worker] = progress
+            staging_order.bytes_transferred = sum(p[0] for p in progress_by_worker.values())
+            staging_order.transfer_rate = sum(p[1] for p in progress_by_worker.values())
+            etas = [p[2] for p in progress_by_worker.values()]
+            staging_order.eta = None if None in etas else max(etas)
+            now = time.monotonic()
+            if last_save is None or now - last_save >= StagingBackend.PROGRESS_UPDATE_INTERVAL:
+                staging_repo.save(staging_order)
+                last_save = now
+
+        return _update_progress
+
+
+class RsyncStagingBackend(StagingBackend):
+    """
+    Stages by running rsync. This is the default backend, which works for any source which rsync can read, and only
+    transfers what is missing from the staging target if an order is restarted. The progress of the staging is read
+    from the output of --info=progress2, so rsync 3.1.0 or higher is required.
+    """
+
+    RSYNC_CMD = ['rsync', '--stats', '-r', '--copy-links', '--times', '--info=progress2']
+
+    # Matches the progress lines written by rsync with --info=progress2, e.g:
+    #     207,707,566  43%   98.76MB/s    0:00:02 (xfr#1, to-chk=0/1)
+    RSYNC_PROGRESS_PATTERN = re.compile(
+        r'^\s*([\d,]+)\s+\d+%\s+([\d.]+)([kKMGTP]?B)/s\s+(?:(\d+):(\d{2}):(\d{2})|\S+)')
+
+    # rsync writes the rates in powers of 1024 unless it is run with --si, which it is not here, so e.g. "kB/s" means
+    # 1024 bytes per second
+    RSYNC_RATE_UNITS = {'B': 1, 'kB': 1024, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4,
+                        'PB': 1024 ** 5}
+
+    def __init__(self, external_program_service, rsync_workers=1, executor=None):
+        """
+        Instantiate a new RsyncStagingBackend
+        :param external_program_service: a instance of ExternalProgramService
+        :param rsync_workers: the number of rsync processes to split the copying of a directory between. If more
+                              than one, the contents of the directory are partitioned by size, see
+                              `_partition_source`, and the staging fails if any of the rsync processes fails.
+        :param executor: a concurrent.futures.Executor in which the source is partitioned between the rsync
+                         processes, by default a ThreadPoolExecutor with a single thread. Only used if
+                         `rsync_workers` is more than one.
+        """
+        self.external_program_service = external_program_service
+        self.rsync_workers = rsync_workers
+        if executor is None and rsync_workers > 1:
+            executor = ThreadPoolExecutor(max_workers=1)
+        self.executor = executor
+
+    @gen.coroutine
+    def stage(self, staging_order, staging_repo, checksums=None):
+        partitions = []
+        if self.rsync_workers > 1 and os.path.isdir(staging_order.source):
+            # the sizes of all files in the source are needed, which is too slow to find out on the IOLoop
+            partitions = yield self.executor.submit(RsyncStagingBackend._partition_source,
+                                                    staging_order.source,
+                                                    self.rsync_workers)
+
+        if len(partitions) > 1:
+            # the "/./" marks where the paths which are recreated under the staging target start
+            cmds = [self.RSYNC_CMD + ['--relative'] +
+                    [os.path.join(staging_order.source, ".", path) for path in partition] +
+                    [staging_order.staging_target]
+                    for partition in partitions]
+        else:
+            staging_source_with_trailing_slash = staging_order.source + "/"
+            cmds = [self.RSYNC_CMD + [staging_source_with_trailing_slash, staging_order.staging_target]]
+
+        # the rsync processes are put in a process group of their own, led by the first of them, so that they can
+        # all be terminated with the pid of the order
+        executions = []
+        for cmd in cmds:
+            log.debug("Running rsync with command: {}".format(" ".join(cmd)))
+            process_group = executions[0].pid if executions else 0
+            executions.append(self.external_program_service.run(cmd, stream_output=True, process_group=process_group))
+
+        staging_order.pid = executions[0].pid
+        staging_repo.save(staging_order)
+
+        update_progress = self._progress_updater(staging_order, staging_repo)
+        finished_executions = []
+
+        def _update_progress_from_line(line, worker):
+            progress = RsyncStagingBackend.parse_rsync_progress(line)
+            if progress:
+                update_progress(progress, worker=worker)
+
+        @gen.coroutine
+        def _wait_for_worker(worker, execution):
+            result = yield self.external_program_service.wait_for_execution(
+                execution,
+                stdout_line_callback=lambda line: _update_progress_from_line(line, worker))
+            finished_executions.append(execution)
+            if result.status_code != 0 and len(finished_executions) < len(executions):
+                # there is no point in continuing with the other parts of the order if one part failed
+                RsyncStagingBackend._terminate(executions[0].pid)
+            return result
+
+        execution_results = yield [_wait_for_worker(worker, execution)
+                                   for worker, execution in enumerate(executions)]
+        log.debug("Execution results: {}".format(execution_results))
+
+        failed_results = [result for result in execution_results if result.status_code != 0]
+        if failed_results:
+            raise StagingFailedException("rsync returned exit code: {}".format(failed_results[0].status_code))
+
+        # Parse the file size from the output of rsync stats:
+        # Total file size: 207,707,566 bytes
+        size_of_transfer = 0
+        for execution_result in execution_results:
+            match = re.search('Total file size: ([\d,]+) bytes',
+                              execution_result.stdout,
+                              re.MULTILINE)
+            size_of_transfer += int(match.group(1).replace(",", ""))
+        return size_of_transfer
+
+    @staticmethod
+    def _terminate(process_group):
+        try:
+            os.killpg(process_group, signal.SIGTERM)
+        except OSError as e:
+            log.warning("Failed to terminate process group: {}: {}".format(process_group, e))
+
+    @staticmethod
+    def _partition_source(source, nbr_of_partitions):
+        """
+        Split the contents of a directory into at most `nbr_of_partitions` lists of paths, relative to the
+        directory, such that the total size of the files in each list is roughly the same. The entries directly
+        under the directory, e.g. the sample directories of a project, are distributed between the partitions. If
+        there are fewer entries than partitions, the directories are replaced by their contents until there are
+        enough entries, or nothing more to split.
+        :param source: the directory to partition
+        :param nbr_of_partitions: the maximum number of partitions
+        :return: a list of lists of relative paths, without any empty partitions
+        """
+
+        def _size(path):
+            path = os.path.join(source, path)
+            if not os.path.isdir(path):
+                return os.path.getsize(path)
+            return sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(path, followlinks=True)
+                       for name in names)
+
+        entries = sorted(os.listdir(source))
+        while len(entries) < nbr_of_partitions:
+            split_entries = []
+            for entry in entries:
+                entry_path = os.path.join(source, entry)
+                children = sorted(os.listdir(entry_path)) if os.path.isdir(entry_path) else None
+                # files and empty directories are kept as they are
+                if children:
+                    split_entries.extend(os.path.join(entry, child) for child in children)
+                else:
+                    split_entries.append(entry)
+            if split_entries == entries:
+                break
+            entries = split_entries
+
+        # place the largest entries first, each in the partition which is currently the smallest
+        partitions = [(0, i, []) for i in range(nbr_of_partitions)]
+        for size, entry in sorted(((_size(entry), entry) for entry in entries), reverse=True):
+            partition_size, i, paths = heapq.heappop(partitions)
+            paths.append(entry)
+            heapq.heappush(partitions, (partition_size + size, i, paths))
+
+        return [sorted(paths) for _, _, paths in sorted(partitions, key=lambda partition: partition[1]) if paths]
+
+    @staticmethod
+    def parse_rsync_progress(line):
+        """
+        Parse a progress line written by rsync with --info=progress2
+        :param line: a line of output from rsync
+        :return: a tuple with the number of bytes transferred, the transfer rate in bytes per second and the
+                 estimated number of seconds remaining (or None if rsync has not estimated it), or None if the line
+                 is not a progress line
+        """
+        match = RsyncStagingBackend.RSYNC_PROGRESS_PATTERN.match(line)
+        if not match:
+            return None
+        bytes_transferred, rate, rate_unit, hours, minutes, seconds = match.groups()
+        transfer_rate = float(rate) * RsyncStagingBackend.RSYNC_RATE_UNITS[rate_unit]
+        eta = int(hours) * 3600 + int(minutes) * 60 + int(seconds) if hours is not None else None
+        return int(bytes_transferred.replace(",", "")), transfer_rate, eta
+
+
+class NativeCopyStagingBackend(StagingBackend):
+    """
+    Stages by copying the files in a thread pool, using copy_file_range (or sendfile, where copy_file_range is not
+    supported) so that the data never has to pass through Python. Many files are copied in parallel, which makes
+    this faster than rsync for trees of many small files, e.g. the plot directories of MultiQC reports, where the
+    per-file overhead of rsync dominates. Like rsync, it follows symlinks, keeps the times of the files, and skips
+    files which already have the same size and modification time in the staging target. If checksums are requested,
+    the files are instead read into Python and hashed as they are copied, so that each file is only read once.
+    """
+
+    # The maximum number of bytes to copy with each call to copy_file_range or sendfile
+    COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, executor):
+        """
+        Instantiate a new NativeCopyStagingBackend
+        :param executor: a concurrent.futures.Executor in which the files are listed and copied
+        """
+        self.executor = executor
+
+    @gen.coroutine
+    def stage(self, staging_order, staging_repo, checksums=None):
+        files_to_copy = yield self.executor.submit(NativeCopyStagingBackend._list_files,
+                                                   staging_order.source,
+                                                   staging_order.staging_target)
+        total_size = sum(size for _, _, size in files_to_copy)
+
+        update_progress = self._progress_updater(staging_order, staging_repo)
+        start_time = time.monotonic()
+        bytes_copied = 0
+
+        futures = [self.executor.submit(NativeCopyStagingBackend._copy_file, source_file, target_file, checksums)
+                   for source_file, target_file, _ in files_to_copy]
+        try:
+            for future in futures:
+                bytes_copied += yield future
+                elapsed = time.monotonic() - start_time
+                transfer_rate = bytes_copied / elapsed if elapsed > 0 else 0.0
+                eta = int((total_size - bytes_copied) / transfer_rate) if transfer_rate > 0 else None
+                update_progress((bytes_copied, transfer_rate, eta))
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+        return total_size
+
+    @staticmethod
+    def _list_files(source, target):
+        """
+        List the files to copy from the source, and create the directories to copy them to under the target
+        :return: a list of tuples with the source file, the file to copy it to and its size
+        """
+        if not os.path.isdir(source):
+            return [(source, os.path.join(target, os.path.basename(source)), os.stat(source).st_size)]
+
+        files_to_copy = []
+        for root, _, files in os.walk(source, followlinks=True):
+            target_root = os.path.join(target, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+            for file_name in files:
+                source_file = os.path.join(root, file_name)
+                files_to_copy.append((source_file,
+                                      os.path.join(target_root, file_name),
+                                      os.stat(source_file).st_size))
+        return files_to_copy
+
+    @staticmethod
+    def _copy_file(source_file, target_file, checksums=None):
+        """
+        Copy a file in the kernel, keeping its permissions and times
+        :param checksums: if specified, the file is hashed while it is copied instead, and its MD5 checksum is
+                          added to this dict with the target file as key
+        :return: the size of the file in bytes
+        """
+        source_stat = os.stat(source_file)
+        try:
+            target_stat = os.stat(target_file)
+            if target_stat.st_size == source_stat.st_size and \
+                    int(target_stat.st_mtime) == int(source_stat.st_mtime):
+                return source_stat.st_size
+        except FileNotFoundError:
+            pass
+
+        if checksums is not None:
+            checksums[target_file] = NativeCopyStagingBackend._copy_and_hash_file(source_file, target_file)
+            shutil.copystat(source_file, target_file)
+            return source_stat.st_size
+
+        with open(source_file, "rb") as source_fh, open(target_file, "wb") as target_fh:
+            source_fd = source_fh.fileno()
+            target_fd = target_fh.fileno()
+            offset = 0
+            use_copy_file_range = hasattr(os, "copy_file_range")
+            while offset < source_stat.st_size:
+                count = min(NativeCopyStagingBackend.COPY_CHUNK_SIZE, source_stat.st_size - offset)
+                if use_copy_file_range:
+                    try:
+                        copied = os.copy_file_range(source_fd, target_fd, count, offset, offset)
+                    except OSError as e:
+                        # e.g. older kernels do not support copying between file systems
+                        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                            raise
+                        use_copy_file_range = False
+                        continue
+                else:
+                    os.lseek(target_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(target_fd, source_fd, offset, count)
+                # the file was truncated while it was copied
+                if copied == 0:
+                    break
+                offset += copied
+
+        shutil.copystat(source_file, target_file)
+        return source_stat.st_size
+
+
+    @staticmethod
+    def _copy_and_hash_file(source_file, target_file):
+        """
+        Copy a file through a reusable buffer, hashing each chunk as it is copied
+        :return: the MD5 checksum of the file as a hexadecimal string
+        """
+        hasher_obj = MetadataService.get_hash_object()
+        buffer = bytearray(MetadataService.HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(source_file, "rb", buffering=0) as source_fh, open(target_file, "wb") as target_fh:
+            while True:
+                bytes_read = source_fh.readinto(buffer)
+                if not bytes_read:
+                    break
+                hasher_obj.update(view[:bytes_read])
+                target_fh.write(view[:bytes_read])
+        return hasher_obj.hexdigest()
+
+
+class LinkStagingBackend(StagingBackend):
+    """
+    Stages directories on the same file system as the staging target without copying any data, by cloning or hard
+    linking their files, see `_link_dir`. This makes staging almost instant and uses no extra space. Sources on
+    other file systems, and sources which cannot be linked, are staged by a fallback backend instead.
+    """
+
+    # The ioctl which makes a file share the data blocks of another file on file systems with copy-on-write support,
+    # e.g. btrfs and xfs, only exposed by the fcntl module from Python 3.12
+    FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
+    def __init__(self, executor, fallback_backend):
+        """
+        Instantiate a new LinkStagingBackend
+        :param executor: a concurrent.futures.Executor in which the staging trees are created
+        :param fallback_backend: the StagingBackend to use for sources which cannot be linked
+        """
+        self.executor = executor
+        self.fallback_backend = fallback_backend
+
+    @gen.coroutine
+    def stage(self, staging_order, staging_repo, checksums=None):
+        if LinkStagingBackend._is_same_device(staging_order.source, staging_order.staging_target):
+            try:
+                size_of_transfer = yield self.executor.submit(LinkStagingBackend._link_dir,
+                                                              staging_order.source,
+                                                              staging_order.staging_target)
+                staging_order.bytes_transferred = size_of_transfer
+                log.info("Staged: {} by linking".format(staging_order))
+                return size_of_transfer
+            except OSError as e:
+                # rsync skips the files which have already been linked, since their size and times match
+                log.warning("Could not stage: {} by linking, will use the fallback instead: {}".format(
+                    staging_order, e))
+
+        size_of_transfer = yield self.fallback_backend.stage(staging_order, staging_repo, checksums=checksums)
+        return size_of_transfer
+
+    @staticmethod
+    def _is_same_device(source, staging_target):
+        try:
+            return os.path.isdir(source) and os.stat(source).st_dev == os.stat(staging_target).st_dev
+        except OSError:
+            return False
+
+    @staticmethod
+    def _link_dir(source, target):
+        """
+        Recreate a directory tree under the target without copying any data. Each file is cloned with the FICLONE
+        ioctl if the file system supports it, so that the staged file shares the data blocks of the source but can
+        be changed independently of it, and otherwise it is hard linked to the source. Whether the files can be
+        cloned is decided by the first file cloned from each file system, and the rest of the files from a file
+        system which does not support it are hard linked without trying. Like `rsync --copy-links`,
+        symlinks are followed, so this requires that the files they point to are on the same file system as well.
+        Files which are already linked to their source, e.g. by an earlier attempt, are left as they are.
+        :param source: the directory to stage
+        :param target: the directory to recreate the contents of the source in
+        :return: the total size of the staged files in bytes
+        :raises OSError: if any file could not be linked, e.g. because it is on another file system
+        """
+        total_size = 0
+        # if files can be cloned, by the device of the file system of the source files
+        can_clone = {}
+
+        for root, _, files in os.walk(source, followlinks=True):
+            target_root = os.path.join(target, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+
+            for file_name in files:
+                source_file = os.path.realpath(os.path.join(root, file_name))
+                target_file = os.path.join(target_root, file_name)
+                source_stat = os.stat(source_file)
+                total_size += source_stat.st_size
+
+                if os.path.lexists(target_file):
+                    if os.path.samefile(source_file, target_file):
+                        continue
+                    os.remove(target_file)
+
+                if can_clone.get(source_stat.st_dev, True):
+                    can_clone[source_stat.st_dev] = LinkStagingBackend._clone_file(source_file, target_file)
+                    if can_clone[source_stat.st_dev]:
+                        continue
+                os.link(source_file, target_file)
+
+        return total_size
+
+    @staticmethod
+    def _clone_file(source_file, target_file):
+        """
+        Clone a file with the FICLONE ioctl, keeping its permissions and times.
+        :return: True if the file was cloned, False if the file system does not support cloning
+        """
+        try:
+            with open(source_file, "rb") as source_fh, open(target_file, "wb") as target_fh:
+                fcntl.ioctl(target_fh.fileno(), LinkStagingBackend.FICLONE, source_fh.fileno())
+        except OSError as e:
+            if os.path.exists(target_file):
+                os.remove(target_file)
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV):
+                return False
+            raise
+        shutil.copystat(source_file, target_file)
+        return True
+
+
+class ChecksumVerifyingStagingBackend(StagingBackend):
+    """
+    Verifies the files staged by another backend against the checksum files which are staged along with them,
+    i.e. the `<runfolder>/checksums.md5` of organised projects, which lists the files relative to the project
+    directory, i.e. the parent of the directory the checksum file is in, and the `MD5/checksums.md5` of runfolders,
+    which lists the files relative to the parent of the runfolder directory, i.e. prefixed with the name of the
+    runfolder. Files which were hashed by the backend while copying them are not read again, while the rest of the
+    listed files are hashed in the staging target. If any file is missing or does not match its checksum, the
+    mismatches are recorded on the staging order and the staging fails. Files which are not listed in any checksum
+    file are not verified.
+    """
+
+    CHECKSUM_FILE_NAME = "checksums.md5"
+    # the directory of the checksum file of a runfolder
+    RUNFOLDER_CHECKSUM_DIR = "MD5"
+
+    def __init__(self, backend, executor, metadata_service=MetadataService):
+        """
+        Instantiate a new ChecksumVerifyingStagingBackend
+        :param backend: the StagingBackend which stages the files
+        :param executor: a concurrent.futures.Executor in which the staged files are verified
+        :param metadata_service: a MetadataService used to parse checksum files and hash files
+        """
+        self.backend = backend
+        self.executor = executor
+        self.metadata_service = metadata_service
+
+    @gen.coroutine
+    def stage(self, staging_order, staging_repo, checksums=None):
+        checksums = {} if checksums is None else checksums
+        size_of_transfer = yield self.backend.stage(staging_order, staging_repo, checksums=checksums)
+
+        mismatches = yield self.executor.submit(self._verify, staging_order.staging_target, checksums)
+        staging_order.checksum_mismatches = "\n".join(mismatches) if mismatches else None
+        if mismatches:
+            raise StagingFailedException("{} staged files did not match their checksums, e.g: {}".format(
+                len(mismatches), mismatches[0]))
+
+        return size_of_transfer
+
+    def _expected_checksums(self, staging_target):
+        expected_checksums = {}
+        for root, _, files in os.walk(staging_target):
+            if self.CHECKSUM_FILE_NAME in files:
+                if os.path.basename(root) == self.RUNFOLDER_CHECKSUM_DIR:
+                    base_dir = os.path.dirname(os.path.dirname(root))
+                else:
+                    base_dir = os.path.dirname(root)
+                checksum_file = os.path.join(root, self.CHECKSUM_FILE_NAME)
+                for file_path, checksum in self.metadata_service.parse_checksum_file(checksum_file).items():
+                    expected_checksums[os.path.normpath(os.path.join(base_dir, file_path))] = checksum
+        return expected_checksums
+
+    def _verify(self, staging_target, checksums):
+        """
+        Compare the staged files with the checksum files in the staging target
+        :param staging_target: the directory the files were staged to
+        :param checksums: the checksums computed by the backend, with the paths of the staged files as keys
+        :return: a sorted list of the staged files which are missing or do not match their checksums
+        """
+        expected_checksums = self._expected_checksums(staging_target)
+
+        missing_files = set(file_path for file_path in expected_checksums if not os.path.isfile(file_path))
+        files_to_hash = [file_path for file_path in expected_checksums
+                         if file_path not in checksums and file_path not in missing_files]
+        log.debug("Verifying {} staged files, of which {} have to be hashed".format(
+            len(expected_checksums), len(files_to_hash)))
+
+        actual_checksums = dict(checksums)
+        actual_checksums.update(self.metadata_service.hash_files(files_to_hash))
+
+        mismatches = ["{}: missing".format(file_path) for file_path in sorted(missing_files)]
+        mismatches.extend(sorted(
+            "{}: expected {} but was {}".format(file_path, expected, actual_checksums[file_path])
+            for file_path, expected in expected_checksums.items()
+            if file_path not in missing_files and actual_checksums[file_path] != expected))
+        return mismatches
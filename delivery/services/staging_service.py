@@ -2,15 +2,16 @@
 import logging
 import os
 import signal
-import re
 
 from tornado import gen
+from tornado.ioloop import IOLoop
 
 from delivery.models.db_models import StagingStatus
 from delivery.exceptions import RunfolderNotFoundException, InvalidStatusException,\
-    ProjectNotFoundException, TooManyProjectsFound
+    ProjectNotFoundException, TooManyProjectsFound, StagingFailedException
 
 from delivery.services.file_system_service import FileSystemService
+from delivery.services.staging_backends import RsyncStagingBackend
 
 log = logging.getLogger(__name__)
 
@@ -18,23 +19,10 @@ log = logging.getLogger(__name__)
 class StagingService(object):
     """
     Starting in this context means copying a directory or file to a separate directory before delivering it.
-    This service handles that in a asynchronous way. Copying operations (right nwo powered by rsync) can be
+    This service handles that in a asynchronous way. Copying operations (powered by a StagingBackend, rsync by default) can be
     started, and their status monitored by querying the underlying database for their status.
     """
 
-    # TODO On initiation of a Staging service, restart any ongoing stagings
-    # since they should all have been killed.
-    # And if we do so we need to make sure that the Staging service
-    # acts as a singleton, look at:
-    # http://python-3-patterns-idioms-test.readthedocs.io/en/latest/Singleton.html
-    #
-    # Alternative suggestion from Steinar on how to solve the problem, which is probably better:
-    # "Do you mean to ensure that only one thread tries doing that at a time? An idea could
-    #  be to take a database lock to ensure this, i.e. fetch all objects in the unfinished
-    #  state, restart them, change the status and then commit, locking the sqlite database
-    #  briefly while doing so (I think row level locking is limited in sqlite.)"
-    #  / JD 20161111
-
     def __init__(self,
                  staging_dir,
                  external_program_service,
@@ -42,8 +30,10 @@ class StagingService(object):
                  runfolder_repo,
                  project_dir_repo,
                  project_links_directory,
-                 session_factory,
-                 file_system_service = FileSystemService):
+                 file_system_service = FileSystemService,
+                 max_concurrent_stagings=None,
+                 max_concurrent_stagings_per_device=None,
+                 staging_backend=None):
         """
         Instantiate a new StagingService
         :param staging_dir: the directory to which files/dirs should be staged
@@ -53,7 +43,10 @@ class StagingService(object):
         :param project_dir_repo: a instance of GeneralProjectRepository
         :param project_links_directory: a path to a directory where links will be created temporarily
                                         before they are rsynced into staging (for batched deliveries etc)
-        :param session_factory: a factory method which can produce new sqlalchemy Session instances
+        :param max_concurrent_stagings: the maximum number of stagings to run at the same time, or None for no limit
+        :param max_concurrent_stagings_per_device: the maximum number of stagings to run at the same time from
+                                                   sources on the same file system, or None for no limit
+        :param staging_backend: the StagingBackend which copies the files, by default a RsyncStagingBackend
         """
         self.staging_dir = staging_dir
         self.external_program_service = external_program_service
@@ -61,109 +54,187 @@ class StagingService(object):
         self.runfolder_repo = runfolder_repo
         self.project_dir_repo = project_dir_repo
         self.project_links_directory = project_links_directory
-        self.session_factory = session_factory
         self.file_system_service = file_system_service
+        self.max_concurrent_stagings = max_concurrent_stagings
+        self.max_concurrent_stagings_per_device = max_concurrent_stagings_per_device
+        self.staging_backend = staging_backend or RsyncStagingBackend(external_program_service)
+        self.io_loop_factory = IOLoop.current
+
+        # The ids of the staging orders which are currently running, mapped to the device of their source
+        self._running_stagings = {}
 
     @staticmethod
     @gen.coroutine
-    def _copy_dir(staging_order_id, external_program_service, session_factory, staging_repo):
+    def _copy_dir(staging_order_id, staging_backend, staging_repo):
         """
-        Copies the file or directory indicated by the staging order by calling the external_program_service.
+        Copies the file or directory indicated by the staging order with the staging backend.
         It will attempt the copying and update the database with the status of the StagingOrder depending on the
         outcome.
         :param staging_order_id: The id of the staging order to execute
-        :param external_program_service: A instance of ExternalProgramService
-        :param session_factory: A factory method which can produce a new sql alchemy Session instance
+        :param staging_backend: A instance of StagingBackend
         :param staging_repo: A instance of DatabaseBasedStagingRepository
         :return: None, only reports back through side-effects
         """
 
-        session = session_factory()
-
-        # This is a somewhat hacky work-around to the problem that objects created in one
-        # thread, and thus associated with another session cannot be accessed by another
-        # thread, there fore it is re-materialized in here...
-        staging_order = staging_repo.get_staging_order_by_id(staging_order_id, session)
+        staging_order = staging_repo.get_staging_order_by_id(staging_order_id)
         try:
-            staging_source_with_trailing_slash = staging_order.source + "/"
-            cmd = ['rsync', '--stats', '-r', '--copy-links', '--times',
-                   staging_source_with_trailing_slash, staging_order.staging_target]
-            log.debug("Running rsync with command: {}".format(" ".join(cmd)))
-
-            execution = external_program_service.run(cmd)
-
-            staging_order.pid = execution.pid
-            session.commit()
-
-            execution_result = yield external_program_service.wait_for_execution(execution)
-            log.debug("Execution result: {}".format(execution_result))
-            if execution_result.status_code == 0:
-
-                # Parse the file size from the output of rsync stats:
-                # Total file size: 207,707,566 bytes
-                match = re.search('Total file size: ([\d,]+) bytes',
-                                  execution_result.stdout,
-                                  re.MULTILINE)
-                size_of_transfer = match.group(1)
-                size_of_transfer = int(size_of_transfer.replace(",", ""))
-                staging_order.size = size_of_transfer
-
-                staging_order.status = StagingStatus.staging_successful
-                log.info("Successfully staged: {} to: {}".format(staging_order, staging_order.get_staging_path()))
-            else:
-                staging_order.status = StagingStatus.staging_failed
-                log.info("Failed in staging: {} because rsync returned exit code: {}".
-                         format(staging_order, execution_result.status_code))
+            size_of_transfer = yield staging_backend.stage(staging_order, staging_repo)
+            staging_order.size = size_of_transfer
+            staging_order.status = StagingStatus.staging_successful
+            log.info("Successfully staged: {} to: {}".format(staging_order, staging_order.get_staging_path()))
 
+        except StagingFailedException as e:
+            staging_order.status = StagingStatus.staging_failed
+            log.info("Failed in staging: {} because {}".format(staging_order, e))
         # TODO Better exception handling here...
         except Exception as e:
             staging_order.status = StagingStatus.staging_failed
             log.info("Failed in staging: {} because this exception was logged: {}".
                      format(staging_order, e))
         finally:
-            # Always commit the state change to the database
-            session.commit()
+            # Always save the state change to the database
+            staging_repo.save(staging_order)
 
     @gen.coroutine
     def stage_order(self, stage_order):
         """
-        Validate a staging order and hand of the actual stating to a separate thread.
+        Validate a staging order and queue it for staging. The pending staging orders in the database make up the
+        queue, and the order will be started as soon as the limits on the number of concurrent stagings allow it.
         :param stage_order: to stage
         :return: None
         """
+        if stage_order.status != StagingStatus.pending:
+            raise InvalidStatusException("Cannot start staging a delivery order with status: {}".
+                                         format(stage_order.status))
 
-        session = self.session_factory()
+        self.dispatch_pending_orders()
 
-        try:
+    def dispatch_pending_orders(self):
+        """
+        Start pending staging orders, by priority and then in the order they were created, for as long as there are
+        free slots. Orders with a source on a file system which already has the maximum number of stagings running
+        are passed over, so that they do not hold up orders from other file systems.
+        :return: None
+        """
+        for stage_order in self.staging_repo.get_pending_staging_orders():
+
+            if self.max_concurrent_stagings and len(self._running_stagings) >= self.max_concurrent_stagings:
+                break
+
+            device = self._source_device(stage_order)
+            if self.max_concurrent_stagings_per_device and \
+                    list(self._running_stagings.values()).count(device) >= self.max_concurrent_stagings_per_device:
+                continue
 
+            # the order may have been started, and even finished, while dispatching a previous order, so its
+            # status is read again
+            stage_order = self.staging_repo.get_staging_order_by_id(stage_order.id)
             if stage_order.status != StagingStatus.pending:
-                raise InvalidStatusException("Cannot start staging a delivery order with status: {}".
-                                             format(stage_order.status))
+                continue
 
-            stage_order.status = StagingStatus.staging_in_progress
-            session.commit()
+            self._start_staging(stage_order, device)
+
+    def restart_unfinished_orders(self):
+        """
+        Put staging orders which were in progress when the service was stopped back in the queue, and start
+        dispatching the queue. Since rsync only transfers what is missing from the staging target, a restarted order
+        picks up where it was interrupted. Any rsync of an unfinished order which is still running is terminated
+        first, since its outcome can no longer be monitored. This should only be called once, when the service
+        starts up.
+        :return: None
+        """
+        unfinished_orders = self.staging_repo.get_staging_orders_by_status(StagingStatus.staging_in_progress)
+        for stage_order in unfinished_orders:
+            if self._is_staging_process_running(stage_order):
+                log.info("Terminating process with pid: {} of unfinished staging order: {}".format(
+                    stage_order.pid, stage_order.id))
+                try:
+                    os.killpg(stage_order.pid, signal.SIGTERM)
+                except OSError as e:
+                    log.warning("Failed to terminate process with pid: {} of staging order: {}: {}".format(
+                        stage_order.pid, stage_order.id, e))
+
+            log.info("Re-queueing unfinished staging order: {}".format(stage_order))
+            stage_order.status = StagingStatus.pending
+            stage_order.pid = None
+
+        # save all changes at once, so that the database is only locked briefly
+        self.staging_repo.save(*unfinished_orders)
+
+        self.dispatch_pending_orders()
+
+    @staticmethod
+    def _is_staging_process_running(stage_order):
+        """
+        Check if the process recorded for a staging order is still running. The pid may have been reused by an
+        unrelated process, e.g. if the machine has been restarted, so the process only counts if its command line
+        includes the staging target of the order.
+        """
+        if not stage_order.pid:
+            return False
+        try:
+            os.kill(stage_order.pid, 0)
+        except OSError:
+            return False
+
+        command_line = StagingService._process_command_line(stage_order.pid)
+        if command_line is None:
+            log.warning("Could not verify that process with pid: {} belongs to staging order: {}, "
+                        "will not terminate it".format(stage_order.pid, stage_order.id))
+            return False
+        return stage_order.staging_target in command_line
 
-            args_for_copy_dir = {"staging_order_id": stage_order.id,
-                                 "external_program_service": self.external_program_service,
-                                 "staging_repo": self.staging_repo,
-                                 "session_factory": self.session_factory}
+    @staticmethod
+    def _process_command_line(pid):
+        try:
+            with open("/proc/{}/cmdline".format(pid), "rb") as fh:
+                return fh.read().decode("utf-8", "replace").split("\0")
+        except OSError:
+            return None
+
+    def _source_device(self, stage_order):
+        try:
+            return self.file_system_service.stat(stage_order.source).st_dev
+        except OSError:
+            return None
+
+    def _start_staging(self, stage_order, device):
+        try:
+            stage_order.status = StagingStatus.staging_in_progress
+            self.staging_repo.save(stage_order)
 
             if not self.file_system_service.exists(stage_order.staging_target):
                 self.file_system_service.makedirs(stage_order.staging_target)
 
-            yield StagingService._copy_dir(**args_for_copy_dir)
-
         # TODO Better error handling
         except Exception as e:
             stage_order.status = StagingStatus.staging_failed
-            session.commit()
-            raise e
+            self.staging_repo.save(stage_order)
+            log.error("Failed to start staging: {} because this exception was logged: {}".format(stage_order, e))
+            return
 
-    def create_new_stage_order(self, path, project_name):
+        self._running_stagings[stage_order.id] = device
+        self.io_loop_factory().spawn_callback(self._run_staging, stage_order_id=stage_order.id)
+
+    @gen.coroutine
+    def _run_staging(self, stage_order_id):
+        try:
+            args_for_copy_dir = {"staging_order_id": stage_order_id,
+                                 "staging_backend": self.staging_backend,
+                                 "staging_repo": self.staging_repo}
+
+            yield StagingService._copy_dir(**args_for_copy_dir)
+        finally:
+            # free up the slot and start any orders waiting for it
+            del self._running_stagings[stage_order_id]
+            self.dispatch_pending_orders()
+
+    def create_new_stage_order(self, path, project_name, priority=0):
         staging_order = self.staging_repo.create_staging_order(source=path,
                                                                status=StagingStatus.pending,
                                                                staging_target_dir=self.staging_dir,
-                                                               project_name=project_name)
+                                                               project_name=project_name,
+                                                               priority=priority)
         return staging_order
 
     def get_stage_order_by_id(self, stage_order_id):
@@ -175,6 +246,25 @@ class StagingService(object):
         stage_order = self.staging_repo.get_staging_order_by_id(stage_order_id)
         return stage_order
 
+    def get_stage_orders(self, status=None, project_name=None, created_after=None, created_before=None,
+                         offset=0, limit=None):
+        """
+        Get a page of the stage orders matching all of the given filters
+        :param status: if given, only orders with this StagingStatus are returned
+        :param project_name: if given, only orders staging this project are returned
+        :param created_after: if given, only orders created at or after this datetime (in UTC) are returned
+        :param created_before: if given, only orders created before this datetime (in UTC) are returned
+        :param offset: the number of matching orders to skip
+        :param limit: the maximum number of orders to return, or None for no limit
+        :return: the matching StageOrder instances as a list, ordered by id
+        """
+        return self.staging_repo.get_staging_orders_by_filter(status=status,
+                                                              project_name=project_name,
+                                                              created_after=created_after,
+                                                              created_before=created_before,
+                                                              offset=offset,
+                                                              limit=limit)
+
     def get_status_of_stage_order(self, stage_order_id):
         """
         Get the status of a stage order
@@ -189,13 +279,14 @@ class StagingService(object):
 
     def kill_process_of_staging_order(self, stage_order_id):
         """
-        Attempt to kill the process of the stage order.
-        Will only kill stage orders which have a 'staging_in_progress' status.
+        Attempt to kill the process of the stage order. The pid of a staging order is that of the leader of the
+        process group of its rsync processes, so the whole group is killed.
+        Will only kill stage orders which have a 'staging_in_progress' status, and which are staged by rsync. The
+        native and link backends copy the files in threads, so there is no process to kill.
         :param stage_order_id:
         :return: True if the process was killed successfully, otherwise False
         """
-        session = self.session_factory()
-        stage_order = self.staging_repo.get_staging_order_by_id(stage_order_id, session)
+        stage_order = self.staging_repo.get_staging_order_by_id(stage_order_id)
 
         if not stage_order:
             return False
@@ -205,7 +296,12 @@ class StagingService(object):
                 raise InvalidStatusException(
                     "Can only kill processes where the staging order is 'staging_in_progress'")
 
-            os.kill(stage_order.pid, signal.SIGTERM)
+            if not stage_order.pid:
+                log.warning("Tried to kill process for staging order: {}, but it has no process, since it is not "
+                            "staged by rsync. Cancelling it is not supported.".format(stage_order.id))
+                return False
+
+            os.killpg(stage_order.pid, signal.SIGTERM)
 
         except OSError:
             log.error("Failed to kill process with pid: {} associated with staging order: {} ".
@@ -219,5 +315,5 @@ class StagingService(object):
             log.debug("Successfully killed process with pid: {} associated with staging order: {} ".
                       format(stage_order.id, stage_order.pid))
             stage_order.status = StagingStatus.staging_failed
-            session.commit()
+            self.staging_repo.save(stage_order)
             return True
@@ -12,6 +12,7 @@ from arteria.web.app import AppService
 
 from delivery.app import routes as app_routes, compose_application
 from delivery.models.db_models import StagingStatus, DeliveryStatus
+from delivery.services.external_program_service import ExternalProgramService
 from delivery.services.metadata_service import MetadataService
 
 from tests.test_utils import assert_eventually_equals, unorganised_runfolder, samplesheet_file_from_runfolder, \
@@ -42,6 +43,16 @@ class TestIntegration(AsyncHTTPTestCase):
         status_response = self.wait()
         return json.loads(status_response.body)["size"]
 
+    def _wait_for_stagings(self, staging_status_links):
+        # Let the stagings finish before the test ends, rather than leaving their rsync processes behind when the
+        # IOLoop is closed
+        for link in staging_status_links:
+            assert_eventually_equals(self,
+                                     timeout=5,
+                                     delay=1,
+                                     f=partial(self._get_delivery_status, link),
+                                     expected=StagingStatus.staging_successful.name)
+
     def _create_projects_dir_with_random_data(self, base_dir, proj_name='ABC_123'):
         tmp_proj_dir = os.path.join(base_dir, 'Projects', proj_name)
         os.makedirs(tmp_proj_dir)
@@ -101,6 +112,11 @@ class TestIntegration(AsyncHTTPTestCase):
 
         return Application(app_routes(**composed_application))
 
+    def tearDown(self):
+        # the output of any external program which is still running has to be closed before the IOLoop is
+        ExternalProgramService.close_unfinished_executions()
+        super(TestIntegration, self).tearDown()
+
     def test_can_return_flowcells(self):
         response = self.fetch(self.API_BASE + "/runfolders")
 
@@ -187,6 +203,55 @@ class TestIntegration(AsyncHTTPTestCase):
                             os.path.relpath(organised_file_path, organised_path))
                         _verify_checksum(relative_file_path, sample_file.checksum)
 
+    def test_can_organise_project_in_background(self):
+        runfolder = unorganised_runfolder()
+        with tempfile.TemporaryDirectory(dir='./tests/resources/runfolders/',
+                                         prefix="{}_".format(runfolder.name)) as runfolder_path:
+            runfolder = unorganised_runfolder(
+                name=os.path.basename(runfolder_path),
+                root_path=os.path.dirname(runfolder_path))
+            self._create_runfolder_structure_on_disk(runfolder)
+
+            url = "/".join([self.API_BASE, "organise", "runfolder", runfolder.name])
+            response = self.fetch(url, method='POST', body=json.dumps({"async": True}))
+            self.assertEqual(response.code, 202)
+
+            status_link = json.loads(response.body)["organise_order_link"]
+            assert_eventually_equals(self,
+                                     timeout=5,
+                                     delay=0.5,
+                                     f=partial(self._get_delivery_status, status_link),
+                                     expected="organising_successful")
+
+            response = self.fetch(status_link)
+            response_json = json.loads(response.body)
+            self.assertEqual(runfolder.path, response_json["runfolder"])
+            self.assertListEqual(
+                sorted([project.name for project in runfolder.projects]),
+                sorted(response_json["projects"]))
+            for project in runfolder.projects:
+                self.assertTrue(
+                    os.path.exists(os.path.join(runfolder.path, "Projects", project.name, runfolder.name)))
+
+    def test_cannot_organise_unknown_runfolder_in_background(self):
+        url = "/".join([self.API_BASE, "organise", "runfolder", "160930_ST-E00216_0000_BH37CWALXX"])
+        response = self.fetch(url, method='POST', body=json.dumps({"async": True}))
+        self.assertEqual(response.code, 404)
+
+        runfolder = unorganised_runfolder()
+        with tempfile.TemporaryDirectory(dir='./tests/resources/runfolders/',
+                                         prefix="{}_".format(runfolder.name)) as runfolder_path:
+            runfolder = unorganised_runfolder(
+                name=os.path.basename(runfolder_path),
+                root_path=os.path.dirname(runfolder_path))
+            self._create_runfolder_structure_on_disk(runfolder)
+
+            url = "/".join([self.API_BASE, "organise", "runfolder", runfolder.name])
+            response = self.fetch(url, method='POST',
+                                  body=json.dumps({"async": True, "projects": ["no_such_project"]}))
+            self.assertEqual(response.code, 404)
+            self.assertIn("no_such_project", response.reason)
+
     def test_can_stage_and_delivery_runfolder(self):
         # Note that this is a test which skips mover (since to_outbox is not expected to be installed on the system
         # where this runs)
@@ -251,6 +316,7 @@ class TestIntegration(AsyncHTTPTestCase):
             url = "/".join([self.API_BASE, "stage", "runfolder", dir_name])
             response = self.fetch(url, method='POST', body='')
             self.assertEqual(response.code, 202)
+            staging_status_links = list(json.loads(response.body)["staging_order_links"].values())
 
             response = self.fetch(url, method='POST', body='')
             print(response.reason)
@@ -259,6 +325,9 @@ class TestIntegration(AsyncHTTPTestCase):
             # Unless you force the delivery
             response = self.fetch(url, method='POST', body=json.dumps({"force_delivery": True}))
             self.assertEqual(response.code, 202)
+            staging_status_links.extend(json.loads(response.body)["staging_order_links"].values())
+
+            self._wait_for_stagings(staging_status_links)
 
     def test_can_stage_and_delivery_project_dir(self):
         # Note that this is a test which skips mover (since to_outbox is not expected to be installed on the system
@@ -311,6 +380,7 @@ class TestIntegration(AsyncHTTPTestCase):
             url = "/".join([self.API_BASE, "stage", "project", dir_name])
             response = self.fetch(url, method='POST', body='')
             self.assertEqual(response.code, 202)
+            staging_status_links = list(json.loads(response.body)["staging_order_links"].values())
 
             # The second time should not
             response = self.fetch(url, method='POST', body='')
@@ -319,6 +389,9 @@ class TestIntegration(AsyncHTTPTestCase):
             # Unless you force the delivery
             response = self.fetch(url, method='POST', body=json.dumps({"force_delivery": True}))
             self.assertEqual(response.code, 202)
+            staging_status_links.extend(json.loads(response.body)["staging_order_links"].values())
+
+            self._wait_for_stagings(staging_status_links)
 
     def test_can_stage_and_deliver_clean_flowcells(self):
         with tempfile.TemporaryDirectory(dir='./tests/resources/runfolders/',
@@ -1,12 +1,14 @@
 
 import json
 from mock import MagicMock
+from urllib.parse import urlparse, parse_qs
 
 
 from tornado.testing import *
 from tornado.web import Application
 
 from delivery.app import routes
+from delivery.models.db_models import DeliveryOrder, DeliveryStatus
 
 from tests.test_utils import DummyConfig, FAKE_RUNFOLDERS
 
@@ -29,3 +31,70 @@ class TestDeliveryHandlers(AsyncHTTPTestCase):
     def test_post_delivery_runfolder(self):
         # TODO Write tests
         pass
+
+
+class TestDeliveryStatusesHandler(AsyncHTTPTestCase):
+
+    API_BASE = "/api/1.0"
+
+    def get_app(self):
+        self.mock_mover_delivery_service = MagicMock()
+        self.delivery_orders = [DeliveryOrder(id=i,
+                                              delivery_project='ABC_123',
+                                              delivery_status=DeliveryStatus.delivery_in_progress,
+                                              mover_delivery_id="ABC_123-ngi2016001-{}".format(i),
+                                              mover_status="Pending") for i in range(1, 4)]
+        self.mock_mover_delivery_service.get_delivery_orders.return_value = self.delivery_orders
+
+        return Application(
+            routes(
+                config=DummyConfig(),
+                mover_delivery_service=self.mock_mover_delivery_service))
+
+    def test_get_delivery_statuses(self):
+        response = self.fetch(self.API_BASE + "/deliver/status?ids=1,2&ids=3&status=delivery_in_progress")
+
+        self.assertEqual(response.code, 200)
+        response_json = json.loads(response.body)
+        self.assertEqual([order["id"] for order in response_json["delivery_orders"]], [1, 2, 3])
+        self.assertEqual(response_json["delivery_orders"][0],
+                         {"id": 1,
+                          "status": "delivery_in_progress",
+                          "mover_delivery_id": "ABC_123-ngi2016001-1",
+                          "mover_status": "Pending",
+                          "mover_status_updated_at": None})
+        self.assertIsNone(response_json["next"])
+
+        # one more order than the limit is asked for, to find out if there is a next page
+        self.mock_mover_delivery_service.get_delivery_orders.assert_called_once_with(
+            delivery_order_ids=[1, 2, 3],
+            delivery_project=None,
+            delivery_status=DeliveryStatus.delivery_in_progress,
+            offset=0,
+            limit=101)
+
+    def test_get_delivery_statuses_with_next_page(self):
+        response = self.fetch(self.API_BASE + "/deliver/status?project=ABC_123&offset=4&limit=2")
+
+        self.assertEqual(response.code, 200)
+        response_json = json.loads(response.body)
+        self.assertEqual([order["id"] for order in response_json["delivery_orders"]], [1, 2])
+
+        next_page = urlparse(response_json["next"])
+        self.assertEqual(next_page.path, self.API_BASE + "/deliver/status")
+        self.assertEqual(parse_qs(next_page.query), {"project": ["ABC_123"], "offset": ["6"], "limit": ["2"]})
+
+        self.mock_mover_delivery_service.get_delivery_orders.assert_called_once_with(
+            delivery_order_ids=None,
+            delivery_project="ABC_123",
+            delivery_status=None,
+            offset=4,
+            limit=3)
+
+    def test_get_delivery_statuses_with_invalid_arguments(self):
+        for query in ["status=no_such_status", "ids=1,a", "limit=0", "limit=1001", "offset=-1", "offset=a",
+                      "ids=" + ",".join(str(i) for i in range(1001))]:
+            response = self.fetch(self.API_BASE + "/deliver/status?" + query)
+            self.assertEqual(response.code, 400, msg=query)
+
+        self.mock_mover_delivery_service.get_delivery_orders.assert_not_called()
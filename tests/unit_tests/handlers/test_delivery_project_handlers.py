@@ -45,7 +45,7 @@ class TestProjectHandlers(AsyncHTTPTestCase):
         expected_result = []
         for runfolder in FAKE_RUNFOLDERS:
             for project in runfolder.projects:
-                expected_result.append(project.__dict__)
+                expected_result.append(project.to_dict())
 
         self.assertEqual(response.code, 200)
         result = json.loads(response.body)
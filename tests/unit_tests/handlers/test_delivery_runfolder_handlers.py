@@ -28,12 +28,16 @@ class TestRunfolderHandlers(AsyncHTTPTestCase):
 
         response = self.fetch(self.API_BASE + "/runfolders")
 
-        expected_result = list([runfolder.__dict__ for runfolder in FAKE_RUNFOLDERS])
-        expected_json = json.dumps({"runfolders": expected_result}, default=lambda x: x.__dict__)
+        expected_result = list([runfolder.to_dict() for runfolder in FAKE_RUNFOLDERS])
+        expected_json = json.dumps({"runfolders": expected_result}, default=lambda x: x.to_dict())
 
         self.assertEqual(response.code, 200)
         self.assertDictEqual(json.loads(response.body), json.loads(expected_json))
 
+        # checksums should not be loaded or returned when listing runfolders
+        for runfolder in json.loads(response.body)["runfolders"]:
+            self.assertNotIn("checksums", runfolder)
+
     def test_get_runfolders_empty(self):
 
         self.mock_runfolder_repo.get_runfolders.return_value = []
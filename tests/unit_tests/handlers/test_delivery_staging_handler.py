@@ -1,9 +1,13 @@
+import datetime
+import json
 from mock import MagicMock
+from urllib.parse import urlparse, parse_qs
 
 from tornado.testing import *
 from tornado.web import Application
 
 from delivery.app import routes
+from delivery.models.db_models import StagingOrder, StagingStatus
 
 from tests.test_utils import DummyConfig, FAKE_RUNFOLDERS
 
@@ -45,3 +49,109 @@ class TestStagingHandlers(AsyncHTTPTestCase):
     # - kill the process of a staging attempt
     def test_cancel_staging_process(self):
         pass
+
+
+class TestStagingStatusesHandler(AsyncHTTPTestCase):
+
+    API_BASE = "/api/1.0"
+
+    def get_app(self):
+        self.mock_delivery_service = MagicMock()
+        self.stage_orders = [StagingOrder(id=i,
+                                          source='/foo/ABC_123',
+                                          project_name='ABC_123',
+                                          created_at=datetime.datetime(2017, 1, 19, 0, 23, 31),
+                                          status=StagingStatus.staging_in_progress,
+                                          bytes_transferred=1024 * i) for i in range(1, 4)]
+        self.mock_delivery_service.check_staging_statuses.return_value = self.stage_orders
+
+        return Application(
+            routes(
+                config=DummyConfig(),
+                delivery_service=self.mock_delivery_service))
+
+    def test_get_staging_statuses(self):
+        response = self.fetch(self.API_BASE + "/stage?status=staging_in_progress&project=ABC_123"
+                                              "&created_after=2017-01-19&created_before=2017-01-20T12:00:00")
+
+        self.assertEqual(response.code, 200)
+        response_json = json.loads(response.body)
+        self.assertEqual([order["id"] for order in response_json["staging_orders"]], [1, 2, 3])
+        self.assertEqual(response_json["staging_orders"][0],
+                         {"id": 1,
+                          "project_name": "ABC_123",
+                          "created_at": "2017-01-19T00:23:31",
+                          "status": "staging_in_progress",
+                          "size": None,
+                          "bytes_transferred": 1024,
+                          "transfer_rate": None,
+                          "eta": None,
+                          "checksum_mismatches": []})
+        self.assertIsNone(response_json["next"])
+
+        # one more order than the limit is asked for, to find out if there is a next page
+        self.mock_delivery_service.check_staging_statuses.assert_called_once_with(
+            status=StagingStatus.staging_in_progress,
+            project_name="ABC_123",
+            created_after=datetime.datetime(2017, 1, 19),
+            created_before=datetime.datetime(2017, 1, 20, 12),
+            offset=0,
+            limit=101)
+
+    def test_get_staging_statuses_with_next_page(self):
+        response = self.fetch(self.API_BASE + "/stage?status=staging_in_progress&limit=2")
+
+        self.assertEqual(response.code, 200)
+        response_json = json.loads(response.body)
+        self.assertEqual([order["id"] for order in response_json["staging_orders"]], [1, 2])
+
+        next_page = urlparse(response_json["next"])
+        self.assertEqual(next_page.path, self.API_BASE + "/stage")
+        self.assertEqual(parse_qs(next_page.query),
+                         {"status": ["staging_in_progress"], "offset": ["2"], "limit": ["2"]})
+
+    def test_get_staging_statuses_with_invalid_arguments(self):
+        for query in ["status=no_such_status", "created_after=yesterday", "created_before=2017-13-01",
+                      "limit=0", "offset=-1"]:
+            response = self.fetch(self.API_BASE + "/stage?" + query)
+            self.assertEqual(response.code, 400, msg=query)
+
+        self.mock_delivery_service.check_staging_statuses.assert_not_called()
+
+
+class TestStagingPriority(AsyncHTTPTestCase):
+
+    API_BASE = "/api/1.0"
+
+    def get_app(self):
+        self.mock_delivery_service = MagicMock()
+        self.mock_delivery_service.deliver_all_runfolders_for_project.return_value = ({}, [])
+        self.mock_delivery_service.deliver_single_runfolder.return_value = {}
+        self.mock_delivery_service.deliver_arbitrary_directory_project.return_value = {}
+
+        return Application(
+            routes(
+                config=DummyConfig(),
+                delivery_service=self.mock_delivery_service))
+
+    def _post(self, url, payload):
+        return self.fetch(self.API_BASE + url, method="POST", body=json.dumps(payload))
+
+    def test_stage_with_priority(self):
+        response = self._post("/stage/runfolder/160930_ST-E00216_0111_BH37CWALXX", {"priority": 10})
+        self.assertEqual(response.code, 202)
+        self.mock_delivery_service.deliver_single_runfolder.assert_called_once_with(
+            "160930_ST-E00216_0111_BH37CWALXX", [], False, priority=10)
+
+    def test_stage_with_invalid_priority(self):
+        for priority in ["high", 1.5, None, True, [1]]:
+            for url, payload in [("/stage/project/runfolders/ABC_123", {"delivery_mode": "BATCH"}),
+                                 ("/stage/runfolder/160930_ST-E00216_0111_BH37CWALXX", {}),
+                                 ("/stage/project/ABC_123", {})]:
+                payload["priority"] = priority
+                response = self._post(url, payload)
+                self.assertEqual(response.code, 400, msg="{} {}".format(url, priority))
+
+        self.mock_delivery_service.deliver_all_runfolders_for_project.assert_not_called()
+        self.mock_delivery_service.deliver_single_runfolder.assert_not_called()
+        self.mock_delivery_service.deliver_arbitrary_directory_project.assert_not_called()
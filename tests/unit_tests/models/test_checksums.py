@@ -0,0 +1,55 @@
+import unittest
+
+from delivery.models.checksums import CompactChecksumStore
+
+
+class TestCompactChecksumStore(unittest.TestCase):
+
+    def setUp(self):
+        self.checksums = {
+            "180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/Sample_1/Sample_1_S1_L001_R1_001.fastq.gz":
+                "d41d8cd98f00b204e9800998ecf8427e",
+            "180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/Sample_1/Sample_1_S1_L001_R2_001.fastq.gz":
+                "0cc175b9c0f1b6a831c399e269772661",
+            "180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/Sample_2/Sample_2_S2_L001_R1_001.fastq.gz":
+                "92eb5ffee6ae2fec3ad71c777531578f",
+            "180124_A00181_0019_BH72M5DMXX/SampleSheet.csv": "checksum-for-samplesheet",
+            "/absolute/path/file": "4A8A08F09D37B73795649038408B5F33",
+            "file": "8277e0910d750195b448797616e091ad",
+            "file with spaces ü": "e1671797c52e15f763380b45e841ec32",
+        }
+        self.store = CompactChecksumStore(self.checksums)
+
+    def test_lookup(self):
+        for path, checksum in self.checksums.items():
+            self.assertIn(path, self.store)
+            self.assertEqual(checksum, self.store[path])
+
+    def test_missing_paths(self):
+        for path in ["180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/Sample_1",
+                     "180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/Sample_3/file",
+                     "absolute/path/file",
+                     "zzz",
+                     ""]:
+            self.assertNotIn(path, self.store)
+            with self.assertRaises(KeyError):
+                self.store[path]
+        self.assertNotIn(None, self.store)
+        self.assertIsNone(self.store.get("zzz"))
+
+    def test_mapping_interface(self):
+        self.assertEqual(len(self.checksums), len(self.store))
+        self.assertEqual(self.checksums, dict(self.store.items()))
+        self.assertEqual(self.store, self.checksums)
+        self.assertEqual(sorted(self.checksums.keys()), sorted(self.store))
+
+    def test_last_duplicate_is_kept(self):
+        store = CompactChecksumStore([("a/b", "first"), ("a/c", "other"), ("a/b", "second")])
+        self.assertEqual(2, len(store))
+        self.assertEqual("second", store["a/b"])
+
+    def test_empty(self):
+        store = CompactChecksumStore()
+        self.assertEqual(0, len(store))
+        self.assertNotIn("a", store)
+        self.assertListEqual([], list(store))
@@ -0,0 +1,83 @@
+import os
+import unittest
+
+from delivery.models.file_inventory import FileInventory
+
+
+class FakeDirEntry(object):
+
+    def __init__(self, path, is_dir=False):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._is_dir = is_dir
+
+    def is_dir(self):
+        return self._is_dir
+
+
+class RecordingDict(dict):
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingDict, self).__init__(*args, **kwargs)
+        self.visited = []
+
+    def get(self, key, default=None):
+        self.visited.append(key)
+        return super(RecordingDict, self).get(key, default)
+
+
+class TestFileInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.root = "/foo/180124_A00181_0019_BH72M5DMXX/Unaligned"
+        self.project = os.path.join(self.root, "ABC_123")
+        self.qc_dirs = [os.path.join(self.project, *["QC"] * depth) for depth in range(1, 21)]
+        self.sample_dir = os.path.join(self.project, "Sample_1")
+        self.reports_dir = os.path.join(self.root, "Reports")
+        self.reports_subdir = os.path.join(self.reports_dir, "html")
+
+        children = {
+            self.root: [FakeDirEntry(self.project, is_dir=True), FakeDirEntry(self.reports_dir, is_dir=True)],
+            # the deep QC directory is listed before the sample directory
+            self.project: [FakeDirEntry(self.qc_dirs[0], is_dir=True), FakeDirEntry(self.sample_dir, is_dir=True)],
+            self.sample_dir: [FakeDirEntry(os.path.join(self.sample_dir, "Sample_1_S1_L001_R1_001.fastq.gz"))],
+            self.reports_dir: [FakeDirEntry(os.path.join(self.reports_dir, "index.html")),
+                               FakeDirEntry(self.reports_subdir, is_dir=True)],
+            self.reports_subdir: [FakeDirEntry(os.path.join(self.reports_subdir, "lane.fastq.gz.html")),
+                                  FakeDirEntry(os.path.join(self.reports_subdir, "dir.fastq.gz"), is_dir=True)],
+        }
+        for qc_dir, qc_subdir in zip(self.qc_dirs, self.qc_dirs[1:]):
+            children[qc_dir] = [FakeDirEntry(os.path.join(qc_dir, "plot.png")), FakeDirEntry(qc_subdir, is_dir=True)]
+        children[self.qc_dirs[-1]] = []
+
+        self.children = RecordingDict(children)
+        self.inventory = FileInventory(self.root, self.children)
+
+    def test_contains_file_with_suffix_is_breadth_first(self):
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.project, "fastq.gz"))
+        # the fastq file one level down is found without descending into the QC directory
+        self.assertListEqual([self.project, self.qc_dirs[0], self.sample_dir], self.children.visited)
+
+    def test_contains_file_with_suffix_only_matches_files(self):
+        self.assertFalse(self.inventory.contains_file_with_suffix(self.reports_dir, "fastq.gz"))
+
+    def test_contains_file_with_suffix_is_memoised(self):
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.project, "fastq.gz"))
+        self.assertFalse(self.inventory.contains_file_with_suffix(self.reports_dir, "fastq.gz"))
+        self.children.visited = []
+
+        # the results for the searched directories, and the directories on the way to a found file, are remembered
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.project, "fastq.gz"))
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.sample_dir, "fastq.gz"))
+        self.assertFalse(self.inventory.contains_file_with_suffix(self.reports_dir, "fastq.gz"))
+        self.assertFalse(self.inventory.contains_file_with_suffix(self.reports_subdir, "fastq.gz"))
+        self.assertListEqual([], self.children.visited)
+
+        # a directory which has already been searched is not searched again as part of another one
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.root, "fastq.gz"))
+        self.assertListEqual([self.root], self.children.visited)
+
+    def test_contains_file_with_suffix_per_suffix(self):
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.project, "fastq.gz"))
+        self.assertTrue(self.inventory.contains_file_with_suffix(self.project, ".png"))
+        self.assertFalse(self.inventory.contains_file_with_suffix(self.project, ".html"))
@@ -0,0 +1,44 @@
+import unittest
+
+from delivery.models.project import GeneralProject, RunfolderProject
+from delivery.models.runfolder import Runfolder, RunfolderFile
+from delivery.models.sample import Sample
+
+
+class TestProject(unittest.TestCase):
+
+    def setUp(self):
+        self.runfolder = Runfolder("180124_A00181_0019_BH72M5DMXX", "/foo/180124_A00181_0019_BH72M5DMXX")
+        self.project = self._project()
+        self.runfolder.projects = [self.project]
+
+    def _project(self, samples=None):
+        return RunfolderProject(
+            "ABC_123",
+            "/foo/180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123",
+            self.runfolder.path,
+            self.runfolder.name,
+            samples=samples or [Sample("Sample_1", "ABC_123")],
+            project_files=[RunfolderFile("/foo/180124_A00181_0019_BH72M5DMXX/Unaligned/ABC_123/report.html")])
+
+    def test_models_with_lists_are_hashable(self):
+        same_runfolder = Runfolder(self.runfolder.name, self.runfolder.path, projects=[self._project()])
+        self.assertEqual(self.runfolder, same_runfolder)
+        self.assertEqual(1, len({self.runfolder, same_runfolder}))
+
+        same_project = self._project()
+        self.assertEqual(self.project, same_project)
+        self.assertEqual(1, len({self.project, same_project}))
+
+    def test_projects_with_other_samples_are_not_equal(self):
+        other_project = self._project(samples=[Sample("Sample_2", "ABC_123")])
+        self.assertNotEqual(self.project, other_project)
+        self.assertEqual(hash(self.project), hash(other_project))
+        self.assertEqual(2, len({self.project, other_project}))
+
+    def test_projects_of_different_types_are_not_equal(self):
+        general_project = GeneralProject(self.project.name, self.project.path)
+        self.assertEqual(general_project, GeneralProject(self.project.name, self.project.path))
+        self.assertNotEqual(self.project, general_project)
+        self.assertNotEqual(self.project, Runfolder(self.project.name, self.project.path))
+        self.assertEqual(3, len({self.project, general_project, self.runfolder}))
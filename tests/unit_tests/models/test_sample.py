@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from delivery.models.runfolder import RunfolderFile
+from delivery.models.sample import Sample, SampleFile
+
+
+class TestSample(unittest.TestCase):
+
+    def setUp(self):
+        self.sample_file = SampleFile(
+            "/foo/bar/Unaligned/ABC_123/Sample_1/Sample_1_S1_L001_R1_001.fastq.gz",
+            sample_name="Sample_1",
+            sample_index="S1",
+            lane_no=1,
+            read_no=1,
+            is_index=False,
+            checksum="d41d8cd98f00b204e9800998ecf8427e")
+        self.sample = Sample("Sample_1", "ABC_123", sample_files=[self.sample_file])
+
+    def test_models_have_no_instance_dict(self):
+        for model in (self.sample, self.sample_file, RunfolderFile("/foo/bar/report.html")):
+            self.assertFalse(hasattr(model, "__dict__"))
+            with self.assertRaises(AttributeError):
+                model.unknown_attribute = "foo"
+
+    def test_sample_file_to_dict(self):
+        self.assertDictEqual(
+            {"file_path": "/foo/bar/Unaligned/ABC_123/Sample_1/Sample_1_S1_L001_R1_001.fastq.gz",
+             "file_name": "Sample_1_S1_L001_R1_001.fastq.gz",
+             "checksum": "d41d8cd98f00b204e9800998ecf8427e",
+             "sample_name": "Sample_1",
+             "sample_index": "S1",
+             "lane_no": 1,
+             "read_no": 1,
+             "is_index": False},
+            self.sample_file.to_dict())
+
+    def test_sample_to_dict(self):
+        as_json = json.dumps(self.sample, default=lambda model: model.to_dict())
+        self.assertDictEqual(
+            {"name": "Sample_1",
+             "sample_id": "Sample_1",
+             "project_name": "ABC_123",
+             "sample_files": [self.sample_file.to_dict()]},
+            json.loads(as_json))
+
+    def test_identity(self):
+        same_sample_file = SampleFile(self.sample_file.file_path, checksum=self.sample_file.checksum)
+        same_sample = Sample("Sample_1", "ABC_123", sample_files=[same_sample_file])
+        other_sample = Sample("Sample_1", "DEF_456", sample_files=[same_sample_file])
+
+        self.assertEqual(self.sample_file, same_sample_file)
+        self.assertEqual(self.sample, same_sample)
+        self.assertEqual(1, len({self.sample_file, same_sample_file}))
+        self.assertEqual(2, len({self.sample, same_sample, other_sample}))
+        self.assertDictEqual({self.sample: "cached"}, {same_sample: "cached"})
+
+        # a file with another checksum is not equal, but is the same file on disk, so it has the same key
+        changed_sample_file = SampleFile(self.sample_file.file_path, checksum="another-checksum")
+        self.assertNotEqual(self.sample_file, changed_sample_file)
+        self.assertEqual(self.sample_file.identity_key, changed_sample_file.identity_key)
+        self.assertEqual(self.sample_file.identity_key, RunfolderFile(self.sample_file.file_path).identity_key)
+
+    def test_identity_key_is_kept(self):
+        identity_key = self.sample.identity_key
+        self.assertIs(identity_key, self.sample.identity_key)
+        self.assertEqual(hash(identity_key), hash(self.sample))
@@ -0,0 +1,56 @@
+import unittest
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from delivery.models.db_models import SQLAlchemyBase, OrganiseOrder, OrganiseStatus
+from delivery.repositories.database_repository import DatabaseBasedRepository
+
+
+class TestDatabaseBasedRepository(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite:///:memory:', echo=False)
+        SQLAlchemyBase.metadata.create_all(engine)
+
+        self.session_factory = sessionmaker()
+        self.session_factory.configure(bind=engine)
+
+        self.repo = DatabaseBasedRepository(self.session_factory)
+
+    def _runfolders_in_db(self):
+        return [order.runfolder for order in self.session_factory().query(OrganiseOrder).all()]
+
+    def test_session_scope_commits(self):
+        with self.repo.session_scope() as session:
+            session.add(OrganiseOrder(runfolder='foo', status=OrganiseStatus.pending))
+        self.assertListEqual(['foo'], self._runfolders_in_db())
+
+    def test_session_scope_rolls_back_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.repo.session_scope() as session:
+                session.add(OrganiseOrder(runfolder='foo', status=OrganiseStatus.pending))
+                session.flush()
+                raise ValueError()
+        self.assertListEqual([], self._runfolders_in_db())
+
+    def test_loaded_objects_are_detached(self):
+        with self.repo.session_scope() as session:
+            session.add(OrganiseOrder(runfolder='foo', status=OrganiseStatus.pending))
+        with self.repo.session_scope() as session:
+            order = session.query(OrganiseOrder).one()
+
+        self.assertTrue(inspect(order).detached)
+        self.assertEqual('foo', order.runfolder)
+
+    def test_save(self):
+        with self.repo.session_scope() as session:
+            session.add(OrganiseOrder(runfolder='foo', status=OrganiseStatus.pending))
+        with self.repo.session_scope() as session:
+            order = session.query(OrganiseOrder).one()
+
+        order.runfolder = 'bar'
+        self.repo.save(order)
+
+        self.assertListEqual(['bar'], self._runfolders_in_db())
+        self.assertTrue(inspect(order).detached)
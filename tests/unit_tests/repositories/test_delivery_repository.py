@@ -46,6 +46,38 @@ class TestDeliveryRepository(unittest.TestCase):
         actual = self.delivery_repo.get_delivery_order_by_id(1)
         self.assertEqual(actual.id, self.delivery_order_1.id)
 
+    def test_get_delivery_orders_by_status(self):
+        delivery_order_2 = DeliveryOrder(delivery_source='/foo/source2',
+                                         delivery_project='bar',
+                                         delivery_status=DeliveryStatus.delivery_in_progress,
+                                         staging_order_id=2)
+        self.session.add(delivery_order_2)
+        self.session.commit()
+
+        actual = self.delivery_repo.get_delivery_orders_by_status(DeliveryStatus.delivery_in_progress)
+        self.assertEqual([order.id for order in actual], [delivery_order_2.id])
+        self.assertEqual(self.delivery_repo.get_delivery_orders_by_status(DeliveryStatus.delivery_successful), [])
+
+    def test_get_delivery_orders_by_filter(self):
+        for i in range(2, 6):
+            self.session.add(DeliveryOrder(delivery_source='/foo/source{}'.format(i),
+                                           delivery_project='bar' if i % 2 else 'baz',
+                                           delivery_status=DeliveryStatus.delivery_in_progress,
+                                           staging_order_id=i))
+        self.session.commit()
+
+        def _ids(**kwargs):
+            return [order.id for order in self.delivery_repo.get_delivery_orders_by_filter(**kwargs)]
+
+        self.assertEqual(_ids(), [1, 2, 3, 4, 5])
+        self.assertEqual(_ids(delivery_order_ids=[5, 1, 3]), [1, 3, 5])
+        self.assertEqual(_ids(delivery_project='bar'), [1, 3, 5])
+        self.assertEqual(_ids(delivery_status=DeliveryStatus.delivery_in_progress), [2, 3, 4, 5])
+        self.assertEqual(_ids(delivery_order_ids=[1, 2, 3], delivery_project='bar',
+                              delivery_status=DeliveryStatus.delivery_in_progress), [3])
+        self.assertEqual(_ids(offset=1, limit=2), [2, 3])
+        self.assertEqual(_ids(delivery_order_ids=[]), [])
+
     def test_get_delivery_orders(self):
         actual = self.delivery_repo.get_delivery_orders()
         self.assertEqual(len(actual), 1)
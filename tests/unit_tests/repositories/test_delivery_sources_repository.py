@@ -0,0 +1,54 @@
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from delivery.models.db_models import SQLAlchemyBase, DeliverySource
+from delivery.repositories.delivery_sources_repository import DatabaseBasedDeliverySourcesRepository
+
+
+class TestDeliverySourcesRepository(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite:///:memory:', echo=False)
+        SQLAlchemyBase.metadata.create_all(engine)
+
+        self.session_factory = sessionmaker()
+        self.session_factory.configure(bind=engine)
+
+        session = self.session_factory()
+        session.add(DeliverySource(project_name='ABC_123', source_name='160930_ST-E00216_0111_BH37CWALXX/ABC_123',
+                                   path='/foo/160930_ST-E00216_0111_BH37CWALXX/Projects/ABC_123', batch=1))
+        session.commit()
+        session.close()
+
+        self.delivery_sources_repo = DatabaseBasedDeliverySourcesRepository(self.session_factory)
+
+    def _new_source(self, path):
+        # when a source is delivered again, the delivery service describes it with a new object
+        return self.delivery_sources_repo.create_source(project_name='ABC_123',
+                                                        source_name='160930_ST-E00216_0111_BH37CWALXX/ABC_123',
+                                                        path=path)
+
+    def test_update_path_of_source(self):
+        source = self._new_source('/bar/ABC_123')
+        self.assertTrue(self.delivery_sources_repo.source_exists(source))
+
+        self.delivery_sources_repo.update_path_of_source(source, new_path='/bar/ABC_123')
+
+        self.assertEqual(source.path, '/bar/ABC_123')
+        stored_source = self.delivery_sources_repo.get_source('ABC_123', '160930_ST-E00216_0111_BH37CWALXX/ABC_123')
+        self.assertEqual(stored_source.path, '/bar/ABC_123')
+        self.assertEqual(stored_source.batch, 1)
+
+    def test_setting_the_path_of_a_new_source_does_not_update_the_stored_source(self):
+        # this is how the path used to be updated, which did not store anything, since the new object is not in
+        # the session
+        session = self.session_factory()
+        source = self._new_source('/foo/160930_ST-E00216_0111_BH37CWALXX/Projects/ABC_123')
+        source.path = '/bar/ABC_123'
+        session.commit()
+        session.close()
+
+        stored_source = self.delivery_sources_repo.get_source('ABC_123', '160930_ST-E00216_0111_BH37CWALXX/ABC_123')
+        self.assertEqual(stored_source.path, '/foo/160930_ST-E00216_0111_BH37CWALXX/Projects/ABC_123')
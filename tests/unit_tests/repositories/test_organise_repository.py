@@ -0,0 +1,45 @@
+
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from delivery.models.db_models import SQLAlchemyBase, OrganiseOrder, OrganiseStatus
+from delivery.repositories.organise_repository import DatabaseBasedOrganiseRepository
+
+
+class TestOrganiseRepository(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite:///:memory:', echo=False)
+        SQLAlchemyBase.metadata.create_all(engine)
+
+        session_factory = sessionmaker()
+        session_factory.configure(bind=engine)
+
+        self.session = session_factory()
+
+        self.organise_order_1 = OrganiseOrder(runfolder='foo', status=OrganiseStatus.pending)
+        self.session.add(self.organise_order_1)
+        self.session.commit()
+
+        self.organise_repo = DatabaseBasedOrganiseRepository(session_factory)
+
+    def test_get_organise_order_by_id(self):
+        actual = self.organise_repo.get_organise_order_by_id(self.organise_order_1.id)
+        self.assertEqual(self.organise_order_1.id, actual.id)
+        self.assertEqual('foo', actual.runfolder)
+
+    def test_get_organise_order_by_id_not_found(self):
+        self.assertIsNone(self.organise_repo.get_organise_order_by_id(123))
+
+    def test_create_organise_order(self):
+        order = self.organise_repo.create_organise_order(runfolder='bar')
+
+        self.assertIsInstance(order, OrganiseOrder)
+        self.assertEqual(order.id, 2)
+        self.assertEqual(order.status, OrganiseStatus.pending)
+        self.assertIsNone(order.organised_path)
+
+        order_from_session = self.session.query(OrganiseOrder).filter(OrganiseOrder.id == order.id).one()
+        self.assertEqual(order_from_session.runfolder, 'bar')
@@ -1,12 +1,17 @@
 
+import os
+import shutil
+import tempfile
 import unittest
+import mock
 from mock import MagicMock
 
 from delivery.models.project import GeneralProject, RunfolderProject
-from delivery.repositories.project_repository import GeneralProjectRepository
+from delivery.repositories.project_repository import GeneralProjectRepository, UnorganisedRunfolderProjectRepository
+from delivery.repositories.sample_repository import RunfolderProjectBasedSampleRepository
 from delivery.services.file_system_service import FileSystemService
 
-from tests.test_utils import FAKE_RUNFOLDERS
+from tests.test_utils import FAKE_RUNFOLDERS, unorganised_runfolder
 
 
 class TestGeneralProjectRepository(unittest.TestCase):
@@ -26,3 +31,139 @@ class TestGeneralProjectRepository(unittest.TestCase):
 
         actual = repo.get_projects()
         self.assertEqual(list(actual), expected)
+
+
+class TestUnorganisedRunfolderProjectRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.filesystem_service = MagicMock(spec=FileSystemService)
+        self.filesystem_service.exists.return_value = True
+        self.filesystem_service.dirname.side_effect = lambda p: p.rsplit("/", 1)[0]
+        self.filesystem_service.relpath.side_effect = lambda p, start: p[len(start) + 1:]
+        self.metadata_service = MagicMock()
+        self.metadata_service.hash_files.side_effect = \
+            lambda paths: {path: "calculated-checksum-for-{}".format(path) for path in paths}
+        self.repo = UnorganisedRunfolderProjectRepository(
+            sample_repository=MagicMock(),
+            filesystem_service=self.filesystem_service,
+            metadata_service=self.metadata_service)
+        self.project = RunfolderProject(
+            name="ABC_123",
+            path="/foo/180124_A00181/Unaligned/ABC_123",
+            runfolder_path="/foo/180124_A00181",
+            runfolder_name="180124_A00181")
+
+    def test_get_report_files_calculates_missing_checksums(self):
+        report_html, report_zip = self.repo.multiqc_report_files(self.project)
+        checksums = {
+            "180124_A00181/Unaligned/ABC_123/ABC_123_multiqc_report.html": "checksum-for-report"}
+
+        report_files = self.repo.get_report_files(self.project, checksums=checksums)
+
+        self.assertListEqual([report_html, report_zip], [report_file.file_path for report_file in report_files])
+        self.assertListEqual(
+            ["checksum-for-report", "calculated-checksum-for-{}".format(report_zip)],
+            [report_file.checksum for report_file in report_files])
+        # all missing checksums are calculated in a single batch
+        self.metadata_service.hash_files.assert_called_once_with([report_zip])
+
+
+class TestUnorganisedRunfolderProjectRepositoryOnDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.runfolder = unorganised_runfolder(root_path=self.rootdir)
+        for project in self.runfolder.projects:
+            for sample in project.samples:
+                for sample_file in sample.sample_files:
+                    self._touch_file(sample_file.file_path)
+            for report_file in project.project_files:
+                self._touch_file(report_file.file_path)
+        # a directory without any fastq files is not a project
+        self._touch_file(os.path.join(self.runfolder.path, "Unaligned", "Reports", "index.html"))
+
+        self.filesystem_service = MagicMock(wraps=FileSystemService())
+        self.repo = UnorganisedRunfolderProjectRepository(
+            sample_repository=RunfolderProjectBasedSampleRepository(file_system_service=self.filesystem_service),
+            filesystem_service=self.filesystem_service,
+            metadata_service=MagicMock())
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    @staticmethod
+    def _touch_file(file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        open(file_path, "w").close()
+
+    @staticmethod
+    def _sample_files(samples):
+        return sorted(
+            (sample.name, sample.sample_id, sample_file.file_path)
+            for sample in samples for sample_file in sample.sample_files)
+
+    def test_get_projects(self):
+        projects = self.repo.get_projects(self.runfolder)
+
+        expected_projects = sorted(self.runfolder.projects, key=lambda p: p.name)
+        actual_projects = sorted(projects, key=lambda p: p.name)
+        self.assertListEqual(
+            [(project.name, project.path) for project in expected_projects],
+            [(project.name, project.path) for project in actual_projects])
+        for expected, actual in zip(expected_projects, actual_projects):
+            self.assertListEqual(self._sample_files(expected.samples), self._sample_files(actual.samples))
+            self.assertListEqual(
+                sorted(report_file.file_path for report_file in expected.project_files),
+                sorted(report_file.file_path for report_file in actual.project_files))
+
+    def test_get_projects_with_linked_project_dir(self):
+        project = self.runfolder.projects[0]
+        linked_project_path = os.path.join(self.rootdir, "elsewhere", project.name)
+        shutil.move(project.path, linked_project_path)
+        os.symlink(linked_project_path, project.path)
+
+        projects = {project.name: project for project in self.repo.get_projects(self.runfolder)}
+
+        self.assertSetEqual(set(p.name for p in self.runfolder.projects), set(projects))
+        self.assertEqual(project.path, projects[project.name].path)
+        self.assertListEqual(self._sample_files(project.samples), self._sample_files(projects[project.name].samples))
+
+    def test_get_projects_traverses_projects_dir_once(self):
+        projects_dir = os.path.join(self.runfolder.path, "Unaligned")
+
+        for project in self.repo.get_projects(self.runfolder):
+            list(project.samples)
+
+        self.filesystem_service.scan_tree.assert_called_once_with(projects_dir, follow_root_links=True)
+        # only reports outside of the projects directory are looked up on the file system
+        for args, _ in self.filesystem_service.list_files_recursively.call_args_list + \
+                self.filesystem_service.exists.call_args_list:
+            self.assertFalse(args[0].startswith(projects_dir))
+
+    def test_is_sample_in_project(self):
+        self.runfolder.projects = self.repo.get_projects(self.runfolder)
+        project = self.runfolder.projects[0]
+        samples = list(project.samples)
+        project.samples = samples
+        sample_lanes = {sample.sample_id: set(sample_file.lane_no for sample_file in sample.sample_files)
+                        for sample in samples}
+
+        with mock.patch.object(
+                self.repo.sample_repository, "sample_lanes", wraps=self.repo.sample_repository.sample_lanes) as lanes:
+            for sample in samples:
+                for lane in range(1, 10):
+                    self.assertEqual(
+                        lane in sample_lanes[sample.sample_id],
+                        self.repo.is_sample_in_project(project, project.name, sample.sample_id, lane))
+                self.assertFalse(
+                    self.repo.is_sample_in_project(project, "another_project", sample.sample_id, 1))
+            self.assertFalse(self.repo.is_sample_in_project(project, project.name, "unknown_sample", 1))
+
+            # the lanes of the samples are only looked up once for the project
+            self.assertEqual(len(samples), lanes.call_count)
+
+        # another instance of the project, with other samples, is not given the lanes of the first one
+        other_project = RunfolderProject(
+            project.name, project.path, project.runfolder_path, project.runfolder_name, samples=samples[:1])
+        self.assertFalse(self.repo.is_sample_in_project(
+            other_project, project.name, samples[-1].sample_id, next(iter(sample_lanes[samples[-1].sample_id]))))
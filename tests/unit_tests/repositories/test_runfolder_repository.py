@@ -1,8 +1,18 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from delivery.exceptions import ChecksumFileNotFoundException
+from delivery.models.db_models import SQLAlchemyBase
 from delivery.models.runfolder import Runfolder
 from delivery.models.project import RunfolderProject
-from delivery.repositories.runfolder_repository import FileSystemBasedRunfolderRepository
+from delivery.repositories.runfolder_repository import FileSystemBasedRunfolderRepository, \
+    IndexedRunfolderRepository
+from delivery.repositories.runfolder_index_repository import DatabaseBasedRunfolderIndexRepository
 
 from tests.test_utils import FAKE_RUNFOLDERS, mock_file_system_service, mock_metadata_service, fake_directories, \
     fake_projects
@@ -31,6 +41,29 @@ class TestRunfolderRepository(unittest.TestCase):
                     self.assertListEqual(
                         actual_runfolder.projects, expected_runfolder.projects)
 
+    def test_get_runfolders_does_not_parse_checksums(self):
+        metadata_service = mock_metadata_service(checksums={"foo": "bar"})
+        repo = FileSystemBasedRunfolderRepository(base_path="/foo",
+                                                  file_system_service=self.file_system_service,
+                                                  metadata_service=metadata_service)
+        actual_runfolders = list(repo.get_runfolders())
+        metadata_service.parse_checksum_file.assert_not_called()
+
+        # checksums are parsed on first access only
+        self.assertDictEqual({"foo": "bar"}, actual_runfolders[0].checksums)
+        self.assertDictEqual({"foo": "bar"}, actual_runfolders[0].checksums)
+        metadata_service.parse_checksum_file.assert_called_once_with(
+            os.path.join(actual_runfolders[0].path, "MD5", "checksums.md5"))
+
+    def test_get_runfolder_without_checksum_file(self):
+        file_system_service = mock_file_system_service(fake_directories, fake_projects)
+        file_system_service.exists.return_value = False
+        repo = FileSystemBasedRunfolderRepository(base_path="/foo",
+                                                  file_system_service=file_system_service,
+                                                  metadata_service=self.metadata_service)
+        with self.assertRaises(ChecksumFileNotFoundException):
+            repo.get_runfolder("160930_ST-E00216_0111_BH37CWALXX")
+
     def test_get_runfolders_does_not_return_none_runfolder(self):
         # Adding a directory which does not conform to the runfolder pattern
         with_non_runfolder_dir = fake_directories + ["bar"]
@@ -47,6 +80,30 @@ class TestRunfolderRepository(unittest.TestCase):
         actual_runfolder = self.repo.get_runfolder(runfolder_name)
         self.assertIsInstance(actual_runfolder, Runfolder)
         self.assertEqual(actual_runfolder.name, runfolder_name)
+        self.assertEqual(actual_runfolder.path, "/foo/{}".format(runfolder_name))
+
+    def test_get_runfolder_does_not_list_base_path(self):
+        file_system_service = mock_file_system_service(fake_directories, fake_projects)
+        repo = FileSystemBasedRunfolderRepository(base_path="/foo",
+                                                  file_system_service=file_system_service,
+                                                  metadata_service=self.metadata_service)
+        runfolder_name = "160930_ST-E00216_0111_BH37CWALXX"
+        file_system_service.isdir.return_value = True
+        self.assertEqual(repo.get_runfolder(runfolder_name).name, runfolder_name)
+        file_system_service.isdir.assert_called_once_with("/foo/{}".format(runfolder_name))
+        file_system_service.find_runfolder_directories.assert_not_called()
+
+        file_system_service.isdir.return_value = False
+        self.assertIsNone(repo.get_runfolder(runfolder_name))
+
+    def test_get_runfolder_invalid_name(self):
+        file_system_service = mock_file_system_service(fake_directories, fake_projects)
+        repo = FileSystemBasedRunfolderRepository(base_path="/foo",
+                                                  file_system_service=file_system_service,
+                                                  metadata_service=self.metadata_service)
+        for invalid_name in ["bar", "", "../160930_ST-E00216_0111_BH37CWALXX", "160930_ST-E00216_0111_BH37CWALXX/.."]:
+            self.assertIsNone(repo.get_runfolder(invalid_name))
+        file_system_service.isdir.assert_not_called()
 
     def test_get_projects(self):
         actual_projects = list(self.repo.get_projects())
@@ -67,3 +124,87 @@ class TestRunfolderRepository(unittest.TestCase):
 
         self.assertEqual(len(actual_projects), 2)
         self.assertEqual(actual_projects, expected_projects)
+
+
+class TestIndexedRunfolderRepository(unittest.TestCase):
+
+    def _create_runfolder(self, name, projects):
+        runfolder_path = os.path.join(self.rootdir, name)
+        os.makedirs(os.path.join(runfolder_path, "MD5"))
+        with open(os.path.join(runfolder_path, "MD5", "checksums.md5"), "w") as fh:
+            fh.write("checksum-for-file  {}/file\n".format(name))
+        for project in projects:
+            os.makedirs(os.path.join(runfolder_path, "Projects", project))
+        return runfolder_path
+
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self._create_runfolder(fake_directories[0], fake_projects)
+        self._create_runfolder(fake_directories[1], fake_projects[:1])
+        os.mkdir(os.path.join(self.rootdir, "not_a_runfolder"))
+
+        engine = create_engine('sqlite:///:memory:', echo=False)
+        SQLAlchemyBase.metadata.create_all(engine)
+        session_factory = sessionmaker()
+        session_factory.configure(bind=engine)
+
+        self.repo = IndexedRunfolderRepository(
+            base_path=self.rootdir,
+            runfolder_index_repo=DatabaseBasedRunfolderIndexRepository(session_factory),
+            refresh_interval=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def test_get_runfolders(self):
+        actual_runfolders = list(self.repo.get_runfolders())
+        self.assertListEqual(fake_directories, [runfolder.name for runfolder in actual_runfolders])
+        self.assertListEqual(fake_projects, [project.name for project in actual_runfolders[0].projects])
+        self.assertListEqual(fake_projects[:1], [project.name for project in actual_runfolders[1].projects])
+        self.assertEqual(os.path.join(self.rootdir, fake_directories[1]), actual_runfolders[1].path)
+
+    def test_listing_does_not_walk_file_system_between_refreshes(self):
+        list(self.repo.get_runfolders())
+        self._create_runfolder("161030_ST-E00216_0113_BH37CWALXX", fake_projects)
+        shutil.rmtree(os.path.join(self.rootdir, fake_directories[0]))
+
+        # the index has not been refreshed yet
+        self.assertListEqual(fake_directories, [runfolder.name for runfolder in self.repo.get_runfolders()])
+
+        self.repo.refresh_index(force=True)
+        self.assertListEqual(
+            [fake_directories[1], "161030_ST-E00216_0113_BH37CWALXX"],
+            [runfolder.name for runfolder in self.repo.get_runfolders()])
+
+    def test_refresh_picks_up_new_projects(self):
+        self.repo.refresh_index()
+        os.mkdir(os.path.join(self.rootdir, fake_directories[1], "Projects", "GHI_789"))
+        self.repo.refresh_index(force=True)
+        self.assertListEqual(
+            ["ABC_123", "ABC_123", "DEF_456", "GHI_789"],
+            sorted(project.name for project in self.repo.get_projects()))
+
+    def test_get_runfolder(self):
+        actual_runfolder = self.repo.get_runfolder(fake_directories[0])
+        self.assertIsInstance(actual_runfolder, Runfolder)
+        self.assertEqual(fake_directories[0], actual_runfolder.name)
+        self.assertEqual(
+            {"{}/file".format(fake_directories[0]): "checksum-for-file"},
+            actual_runfolder.checksums)
+        self.assertIsNone(self.repo.get_runfolder("160930_ST-E00216_0999_BH37CWALXX"))
+
+    def test_get_runfolder_not_yet_indexed(self):
+        self.repo.refresh_index()
+        runfolder_name = "161030_ST-E00216_0113_BH37CWALXX"
+        self._create_runfolder(runfolder_name, fake_projects)
+        actual_runfolder = self.repo.get_runfolder(runfolder_name)
+        self.assertEqual(runfolder_name, actual_runfolder.name)
+        self.assertListEqual(fake_projects, sorted(project.name for project in actual_runfolder.projects))
+
+    def test_get_project(self):
+        actual_projects = list(self.repo.get_project("ABC_123"))
+        self.assertListEqual(fake_directories, [project.runfolder_name for project in actual_projects])
+        self.assertListEqual(
+            [os.path.join(self.rootdir, d) for d in fake_directories],
+            [project.runfolder_path for project in actual_projects])
+        self.assertListEqual([], list(self.repo.get_project("GHI_789")))
@@ -87,3 +87,31 @@ class TestSampleRepository(unittest.TestCase):
                                         r == observed_sample_file.read_no,
                                         checksum == observed_sample_file.checksum
                                     ]))
+
+    def test_sample_files_from_sample_paths(self):
+        self.file_system_service.relpath.side_effect = os.path.relpath
+        self.file_system_service.dirname = os.path.dirname
+        not_fastq_files = [
+            os.path.join(self.project.path, "ABC_123_multiqc_report.html"),
+            os.path.join(self.project.path, "not_ok_S1_L002_R1_001.fastq")]
+        outside_runfolder = "/bar/baz/outside_S1_L001_R1_001.fastq.gz"
+        sample_paths = not_fastq_files[:1] + self.fastq_files + not_fastq_files[1:] + [outside_runfolder]
+
+        observed = self.sample_repo.sample_files_from_sample_paths(sample_paths, self.runfolder)
+
+        # the batch parser gives the same results as parsing the files one by one
+        expected = [
+            self.sample_repo.sample_file_from_sample_path(sample_path, self.runfolder)
+            for sample_path in self.fastq_files + [outside_runfolder]]
+        self.assertListEqual(expected, observed)
+        for expected_sample_file, observed_sample_file in zip(expected, observed):
+            self.assertEqual(hash(expected_sample_file), hash(observed_sample_file))
+        self.assertListEqual(
+            [sample_file.checksum for sample in self.project.samples for sample_file in sample.sample_files] + [None],
+            [sample_file.checksum for sample_file in observed])
+
+    def test_sample_files_from_sample_paths_without_checksums(self):
+        self.runfolder.checksums = None
+        observed = self.sample_repo.sample_files_from_sample_paths(self.fastq_files, self.runfolder)
+        self.assertListEqual(self.fastq_files, [sample_file.file_path for sample_file in observed])
+        self.assertTrue(all(sample_file.checksum is None for sample_file in observed))
@@ -1,5 +1,6 @@
 
 
+import datetime
 import unittest
 from mock import create_autospec
 
@@ -52,6 +53,52 @@ class TestStagingRepository(unittest.TestCase):
         actual = self.staging_repo.get_staging_order_by_id(self.staging_order_1.id)
         self.assertEqual(self.staging_order_1.id, actual.id)
 
+    # - get staging orders by status
+    def test_get_staging_orders_by_status(self):
+        self.session.add(StagingOrder(source='bar', status=StagingStatus.staging_in_progress))
+        self.session.commit()
+
+        actual = self.staging_repo.get_staging_orders_by_status(StagingStatus.staging_in_progress)
+        self.assertListEqual(['bar'], [order.source for order in actual])
+        actual = self.staging_repo.get_staging_orders_by_status(StagingStatus.pending)
+        self.assertListEqual(['foo'], [order.source for order in actual])
+
+    # - get pending staging orders, by priority and then in the order they were created
+    def test_get_pending_staging_orders(self):
+        self.session.add_all([
+            StagingOrder(source='bar', status=StagingStatus.pending, priority=0),
+            StagingOrder(source='baz', status=StagingStatus.pending, priority=10),
+            StagingOrder(source='qux', status=StagingStatus.staging_in_progress, priority=20)])
+        self.session.commit()
+
+        actual = self.staging_repo.get_pending_staging_orders()
+        self.assertListEqual(['baz', 'foo', 'bar'], [order.source for order in actual])
+
+    # - get a page of staging orders by status, project and creation time
+    def test_get_staging_orders_by_filter(self):
+        self.session.add_all([
+            StagingOrder(source='bar', status=StagingStatus.staging_in_progress, project_name='ABC_123',
+                         created_at=datetime.datetime(2017, 1, 1)),
+            StagingOrder(source='baz', status=StagingStatus.staging_successful, project_name='ABC_123',
+                         created_at=datetime.datetime(2017, 1, 2)),
+            StagingOrder(source='qux', status=StagingStatus.staging_in_progress, project_name='DEF_456',
+                         created_at=datetime.datetime(2017, 1, 3))])
+        self.session.commit()
+
+        def _sources(**kwargs):
+            return [order.source for order in self.staging_repo.get_staging_orders_by_filter(**kwargs)]
+
+        self.assertListEqual(['foo', 'bar', 'baz', 'qux'], _sources())
+        self.assertListEqual(['bar', 'qux'], _sources(status=StagingStatus.staging_in_progress))
+        self.assertListEqual(['bar', 'baz'], _sources(project_name='ABC_123'))
+        self.assertListEqual(['foo', 'baz', 'qux'], _sources(created_after=datetime.datetime(2017, 1, 2)))
+        self.assertListEqual(['baz', 'qux'], _sources(created_after=datetime.datetime(2017, 1, 2),
+                                                      created_before=datetime.datetime(2017, 1, 4)))
+        self.assertListEqual(['bar'], _sources(created_after=datetime.datetime(2017, 1, 1),
+                                               created_before=datetime.datetime(2017, 1, 2)))
+        self.assertListEqual(['baz'], _sources(project_name='ABC_123', status=StagingStatus.staging_successful))
+        self.assertListEqual(['bar', 'baz'], _sources(offset=1, limit=2))
+
     # - create a new staging_order and persist it to the db
     def test_create_staging_order(self):
         order = self.staging_repo.create_staging_order(source='/foo',
@@ -65,6 +112,8 @@ class TestStagingRepository(unittest.TestCase):
         self.assertEqual(order.pid, None)
         self.assertEqual(order.source, '/foo')
         self.assertEqual(order.staging_target, '/foo/target/2/bar')
+        self.assertEqual(order.project_name, 'bar')
+        self.assertIsInstance(order.created_at, datetime.datetime)
 
         # Check that the object has been committed, i.e. there are no 'dirty' objects in session
         self.assertEqual(len(self.session.dirty), 0)
@@ -0,0 +1,130 @@
+import os
+import signal
+from collections import deque
+
+from tornado.concurrent import Future
+from tornado.iostream import StreamClosedError
+from tornado.testing import AsyncTestCase, gen_test
+
+from delivery.services.external_program_service import ExternalProgramService
+
+
+class FakeStream(object):
+    """
+    Returns the given chunks, one for each read, and is then closed
+    """
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def read_bytes(self, num_bytes, partial=False):
+        future = Future()
+        if self.chunks:
+            future.set_result(self.chunks.pop(0))
+        else:
+            future.set_exception(StreamClosedError())
+        return future
+
+
+class TestExternalProgramService(AsyncTestCase):
+
+    @gen_test
+    def test_run_and_wait(self):
+        execution_result = yield ExternalProgramService.run_and_wait(['printf', 'foo\nbar\n'])
+        self.assertEqual(0, execution_result.status_code)
+        self.assertEqual('foo\nbar\n', execution_result.stdout)
+        self.assertEqual('', execution_result.stderr)
+
+    @gen_test
+    def test_wait_for_execution_without_streaming(self):
+        execution = ExternalProgramService.run(['sh', '-c', 'echo foo; echo bar >&2; exit 3'])
+        execution_result = yield ExternalProgramService.wait_for_execution(execution)
+        self.assertEqual(3, execution_result.status_code)
+        self.assertEqual('foo\n', execution_result.stdout)
+        self.assertEqual('bar\n', execution_result.stderr)
+
+    @gen_test
+    def test_wait_for_execution_with_line_callbacks(self):
+        stdout_lines = []
+        stderr_lines = []
+        execution = ExternalProgramService.run(
+            ['sh', '-c', 'printf "foo\\rbar\\r\\nbaz"; printf "qux\\n" >&2'], stream_output=True)
+        execution_result = yield ExternalProgramService.wait_for_execution(
+            execution,
+            stdout_line_callback=stdout_lines.append,
+            stderr_line_callback=stderr_lines.append)
+
+        self.assertEqual(0, execution_result.status_code)
+        self.assertListEqual(['foo', 'bar', 'baz'], stdout_lines)
+        self.assertListEqual(['qux'], stderr_lines)
+        # the output keeps its line terminators
+        self.assertEqual('foo\rbar\r\nbaz', execution_result.stdout)
+        self.assertEqual('qux\n', execution_result.stderr)
+
+    @gen_test
+    def test_wait_for_execution_keeps_tail_of_output(self):
+        # write more output than fits in a pipe buffer, which the process would block on if it was not consumed
+        execution = ExternalProgramService.run(['seq', '1', '100000'], stream_output=True)
+        execution_result = yield ExternalProgramService.wait_for_execution(execution, tail_lines=3)
+        self.assertEqual(0, execution_result.status_code)
+        self.assertEqual('99998\n99999\n100000\n', execution_result.stdout)
+
+    @gen_test
+    def test_wait_for_execution_closes_streams(self):
+        execution = ExternalProgramService.run(['printf', 'foo\n'], stream_output=True)
+
+        def _fail(line):
+            raise ValueError(line)
+
+        with self.assertRaises(ValueError):
+            yield ExternalProgramService.wait_for_execution(execution, stdout_line_callback=_fail)
+        self.assertTrue(execution.process_obj.stdout.closed())
+        self.assertTrue(execution.process_obj.stderr.closed())
+
+    @gen_test
+    def test_close_unfinished_executions(self):
+        execution = ExternalProgramService.run(['sleep', '10'], stream_output=True)
+        ExternalProgramService.close_unfinished_executions()
+        self.assertTrue(execution.process_obj.stdout.closed())
+        self.assertTrue(execution.process_obj.stderr.closed())
+
+        execution.process_obj.proc.kill()
+        status_code = yield execution.process_obj.wait_for_exit(raise_error=False)
+        self.assertNotEqual(0, status_code)
+
+    @gen_test
+    def test_run_in_process_group(self):
+        leader = ExternalProgramService.run(['sleep', '10'], process_group=0)
+        member = ExternalProgramService.run(['sleep', '10'], process_group=leader.pid)
+        self.assertEqual(leader.pid, os.getpgid(leader.pid))
+        self.assertEqual(leader.pid, os.getpgid(member.pid))
+
+        # the whole group is terminated at once
+        os.killpg(leader.pid, signal.SIGTERM)
+        results = yield [ExternalProgramService.wait_for_execution(execution) for execution in (leader, member)]
+        self.assertListEqual([-signal.SIGTERM, -signal.SIGTERM], [result.status_code for result in results])
+
+    def test_line_callbacks_require_streaming(self):
+        execution = ExternalProgramService.run(['true'])
+        with self.assertRaises(ValueError):
+            self.io_loop.run_sync(
+                lambda: ExternalProgramService.wait_for_execution(execution, stdout_line_callback=print))
+        self.io_loop.run_sync(lambda: ExternalProgramService.wait_for_execution(execution))
+
+    @gen_test
+    def test_read_lines_with_line_terminator_split_between_reads(self):
+        lines = []
+        tail = deque()
+        yield ExternalProgramService._read_lines(FakeStream([b"foo\r", b"\nbar\r", b"baz\r"]), lines.append, tail)
+        self.assertListEqual(['foo', 'bar', 'baz'], lines)
+        self.assertListEqual(['foo\r\n', 'bar\r', 'baz\r'], list(tail))
+
+    @gen_test
+    def test_read_lines_splits_long_lines(self):
+        lines = []
+        tail = deque()
+        max_length = ExternalProgramService.MAX_LINE_LENGTH
+        chunks = [b"a" * (max_length - 1), b"a" * (max_length - 1), b"a\nb"]
+        yield ExternalProgramService._read_lines(FakeStream(chunks), lines.append, tail)
+        self.assertListEqual(["a" * max_length, "a" * (max_length - 1), "b"], lines)
+        self.assertListEqual(["a" * max_length, "a" * (max_length - 1) + "\n", "b"], list(tail))
@@ -1,4 +1,5 @@
 
+import os
 import shutil
 import tempfile
 import unittest
@@ -34,3 +35,52 @@ class TestFileSystemService(unittest.TestCase):
             sorted(self.files),
             sorted(list(FileSystemService().list_files_recursively(self.rootdir)))
         )
+
+    def test_scan_tree(self):
+        inventory = FileSystemService().scan_tree(self.rootdir)
+
+        self.assertListEqual(
+            list(FileSystemService().list_files_recursively(self.rootdir)),
+            list(inventory.files()))
+        self.assertListEqual(sorted(self.files[3:6]), sorted(inventory.files(self.dirs[0])))
+        self.assertListEqual(sorted(self.files[6:]), sorted(inventory.files(self.dirs[1])))
+        self.assertListEqual(sorted(self.dirs[:2]), sorted(inventory.directories()))
+
+        for path in self.files + self.dirs:
+            self.assertTrue(inventory.exists(path))
+        self.assertTrue(inventory.isdir(self.dirs[-1]))
+        self.assertFalse(inventory.isdir(self.files[-1]))
+        self.assertFalse(inventory.exists(os.path.join(self.rootdir, "does-not-exist")))
+
+        self.assertTrue(inventory.covers(self.files[0]))
+        self.assertFalse(inventory.covers(os.path.dirname(self.rootdir)))
+        self.assertFalse(inventory.covers(self.rootdir + "-sibling"))
+
+    def test_scan_tree_file_sizes(self):
+        with open(self.files[0], "wb") as fh:
+            fh.write(b"x" * 1234)
+        inventory = FileSystemService().scan_tree(self.rootdir)
+        self.assertEqual(1234, inventory.size(self.files[0]))
+        self.assertEqual(0, inventory.size(self.files[-1]))
+
+    def test_scan_tree_does_not_follow_symlinks(self):
+        link = os.path.join(self.rootdir, "link-to-dir")
+        os.symlink(self.dirs[0], link)
+        inventory = FileSystemService().scan_tree(self.rootdir)
+        self.assertTrue(inventory.isdir(link))
+        self.assertListEqual([], list(inventory.files(link)))
+        self.assertListEqual(sorted(self.files), sorted(inventory.files()))
+
+    def test_scan_tree_follows_root_links(self):
+        link = os.path.join(self.rootdir, "link-to-dir")
+        os.symlink(self.dirs[1], link)
+        # links further down are not followed
+        os.symlink(self.dirs[0], os.path.join(self.dirs[1], "link-to-dir"))
+        inventory = FileSystemService().scan_tree(self.rootdir, follow_root_links=True)
+        linked_files = [os.path.join(link, os.path.relpath(path, self.dirs[1])) for path in self.files[6:]]
+        self.assertListEqual(sorted(linked_files), sorted(inventory.files(link)))
+        self.assertListEqual(sorted(self.files + linked_files), sorted(inventory.files()))
+
+    def test_scan_tree_missing_dir(self):
+        with self.assertRaises(FileNotFoundError):
+            FileSystemService().scan_tree(os.path.join(self.rootdir, "does-not-exist"))
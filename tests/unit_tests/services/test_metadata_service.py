@@ -1,10 +1,12 @@
 
+import mock
 import os
 import shutil
 import unittest
 import tempfile
 
-from delivery.services.metadata_service import MetadataService
+from delivery.exceptions import ChecksumFileNotFoundException
+from delivery.services.metadata_service import MetadataService, ChecksumFileCache, CachingMetadataService
 
 from tests import test_utils
 
@@ -48,3 +50,89 @@ class TestMetadataService(unittest.TestCase):
         with os.fdopen(fd, 'w') as fh:
             fh.writelines(strings_to_hash)
         self.assertEqual(expected_hash, MetadataService.hash_file(file_to_hash))
+
+    def test_hash_file_in_chunks(self):
+        content = os.urandom(10000)
+        file_to_hash = os.path.join(self.rootdir, "file_to_hash")
+        with open(file_to_hash, 'wb') as fh:
+            fh.write(content)
+        expected_hash = self.metadata_service.get_hash_object()
+        expected_hash.update(content)
+        # a buffer size which does not evenly divide the file size
+        for buffer_size in (1, 333, 4096, 20000):
+            self.assertEqual(expected_hash.hexdigest(), MetadataService.hash_file(file_to_hash, buffer_size))
+
+    def test_hash_files(self):
+        files_to_hash = {}
+        for i in range(5):
+            content = "content-of-file-{}\n".format(i)
+            file_to_hash = os.path.join(self.rootdir, "file_{}".format(i))
+            with open(file_to_hash, 'w') as fh:
+                fh.write(content)
+            files_to_hash[file_to_hash] = self.metadata_service.hash_string(content)
+        self.assertDictEqual(files_to_hash, MetadataService.hash_files(files_to_hash.keys(), max_workers=2))
+        self.assertDictEqual({}, MetadataService.hash_files([]))
+
+
+class TestChecksumFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.rootdir = tempfile.mkdtemp()
+        self.parser = mock.MagicMock(side_effect=MetadataService.parse_checksum_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.rootdir)
+
+    def _checksum_file(self, name, nbr_of_checksums):
+        checksum_file = os.path.join(self.rootdir, name)
+        MetadataService.write_checksum_file(
+            checksum_file,
+            {"{}/file_{}".format(name, i): "checksum-{}".format(i) for i in range(nbr_of_checksums)})
+        return checksum_file
+
+    def test_get_cached(self):
+        cache = ChecksumFileCache()
+        checksum_file = self._checksum_file("a.md5", 3)
+        first = cache.get(checksum_file, self.parser)
+        second = cache.get(checksum_file, self.parser)
+        self.assertIs(first, second)
+        self.assertEqual("checksum-2", first["a.md5/file_2"])
+        self.parser.assert_called_once_with(checksum_file)
+        self.assertEqual(
+            {"hits": 1, "misses": 1, "checksum_files": 1, "checksums": 3},
+            cache.statistics())
+
+    def test_get_changed_file(self):
+        cache = ChecksumFileCache()
+        checksum_file = self._checksum_file("a.md5", 3)
+        cache.get(checksum_file, self.parser)
+        self._checksum_file("a.md5", 4)
+        os.utime(checksum_file, ns=(0, 0))
+        self.assertEqual(4, len(cache.get(checksum_file, self.parser)))
+        self.assertEqual(2, self.parser.call_count)
+        self.assertEqual(4, cache.statistics()["checksums"])
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ChecksumFileCache(max_checksums=5)
+        a, b, c = [self._checksum_file(name, 2) for name in ("a.md5", "b.md5", "c.md5")]
+        cache.get(a, self.parser)
+        cache.get(b, self.parser)
+        cache.get(a, self.parser)
+        cache.get(c, self.parser)
+        self.assertEqual({"hits": 1, "misses": 3, "checksum_files": 2, "checksums": 4}, cache.statistics())
+
+        # b should have been evicted, but not a
+        cache.get(a, self.parser)
+        cache.get(b, self.parser)
+        self.assertEqual(4, self.parser.call_count)
+
+    def test_too_large_file_is_not_cached(self):
+        cache = ChecksumFileCache(max_checksums=2)
+        checksum_file = self._checksum_file("a.md5", 3)
+        self.assertEqual(3, len(cache.get(checksum_file, self.parser)))
+        self.assertEqual(0, cache.statistics()["checksum_files"])
+
+    def test_caching_metadata_service_missing_file(self):
+        metadata_service = CachingMetadataService()
+        with self.assertRaises(ChecksumFileNotFoundException):
+            metadata_service.parse_checksum_file(os.path.join(self.rootdir, "does-not-exist.md5"))
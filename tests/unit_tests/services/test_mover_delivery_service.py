@@ -1,9 +1,10 @@
 
 import random
-from mock import MagicMock, create_autospec
+from mock import MagicMock, create_autospec, patch
 
 from tornado.testing import AsyncTestCase, gen_test
-from tornado.gen import coroutine
+from tornado.gen import coroutine, moment
+from tornado.concurrent import Future
 
 from delivery.services.external_program_service import ExternalProgramService
 from delivery.services.mover_service import MoverDeliveryService
@@ -49,12 +50,10 @@ class TestMoverDeliveryService(AsyncTestCase):
         self.mock_delivery_repo.create_delivery_order.return_value = self.delivery_order
         self.mock_delivery_repo.get_delivery_order_by_id.return_value = self.delivery_order
 
-        self.mock_session_factory = MagicMock()
         self.mock_path_to_mover = "/foo/bar/"
         self.mover_delivery_service = MoverDeliveryService(external_program_service=None,
                                                            staging_service=self.mock_staging_service,
                                                            delivery_repo=self.mock_delivery_repo,
-                                                           session_factory=self.mock_session_factory,
                                                            path_to_mover=self.mock_path_to_mover)
 
         # Inject separate external runner instances for the tests, since they need to return
@@ -79,7 +78,8 @@ class TestMoverDeliveryService(AsyncTestCase):
         def _get_delivery_order():
             return self.delivery_order.delivery_status
         assert_eventually_equals(self, 1, _get_delivery_order, DeliveryStatus.delivery_in_progress)
-        self.mock_mover_runner.run.assert_called_once_with(['/foo/bar/to_outbox', '/foo', 'TestProj'])
+        self.mock_mover_runner.run.assert_called_once_with(['/foo/bar/to_outbox', '/foo', 'TestProj'],
+                                                           stream_output=True)
 
     @gen_test
     def test_update_delivery_status(self):
@@ -91,6 +91,82 @@ class TestMoverDeliveryService(AsyncTestCase):
 
         self.mock_moverinfo_runner.run_and_wait.assert_called_once_with(['/foo/bar/moverinfo', '-i', 'TestCase_31-ngi2016001-1484739218 '])
 
+    @gen_test
+    def test_update_delivery_status_caches_mover_status(self):
+        delivery_order = DeliveryOrder(id=1, mover_delivery_id="TestCase_31-ngi2016001-1484739218",
+                                       delivery_status=DeliveryStatus.delivery_in_progress)
+        self.mock_delivery_repo.get_delivery_order_by_id.return_value = delivery_order
+        yield self.mover_delivery_service.update_delivery_status(delivery_order.id)
+        self.assertEqual(delivery_order.mover_status, "Delivered")
+        self.assertIsNotNone(delivery_order.mover_status_updated_at)
+
+    @gen_test
+    def test_poll_delivery_statuses(self):
+        delivery_orders = [DeliveryOrder(id=i, mover_delivery_id="TestCase_31-ngi2016001-{}".format(i),
+                                         delivery_status=DeliveryStatus.delivery_in_progress) for i in range(1, 6)]
+        self.mock_delivery_repo.get_delivery_orders_by_status.return_value = delivery_orders
+        self.mover_delivery_service.max_concurrent_status_polls = 2
+
+        # keep the moverinfo calls running, so that they can be finished one at a time
+        running_polls = []
+
+        def _run_and_wait(cmd):
+            future = Future()
+            running_polls.append(future)
+            return future
+
+        self.mock_moverinfo_runner.run_and_wait = MagicMock(side_effect=_run_and_wait)
+
+        poll = self.mover_delivery_service.poll_delivery_statuses()
+        yield moment
+        self.assertEqual(len(running_polls), 2)
+
+        # a poll which is started before the previous one has finished does nothing
+        yield self.mover_delivery_service.poll_delivery_statuses()
+        self.assertEqual(len(running_polls), 2)
+
+        for i in range(5):
+            self.assertLessEqual(len([f for f in running_polls if not f.done()]), 2)
+            # the status of the third delivery order can not be parsed, and the rest are delivered
+            stdout = "Invalid" if i == 2 else "Delivered: Jan 19 00:23:31 [1484781811UTC]"
+            running_polls[i].set_result(ExecutionResult(stdout=stdout, stderr="", status_code=0))
+            for _ in range(3):
+                yield moment
+        yield poll
+
+        self.assertEqual(len(running_polls), 5)
+        self.assertListEqual([order.delivery_status for order in delivery_orders],
+                             [DeliveryStatus.delivery_successful, DeliveryStatus.delivery_successful,
+                              DeliveryStatus.delivery_in_progress, DeliveryStatus.delivery_successful,
+                              DeliveryStatus.delivery_successful])
+        self.mock_delivery_repo.get_delivery_orders_by_status.assert_called_once_with(
+            DeliveryStatus.delivery_in_progress)
+        self.mock_delivery_repo.save.assert_called_once_with(*delivery_orders)
+
+    @gen_test
+    def test_get_delivery_order_with_status_from_poller(self):
+        delivery_order = DeliveryOrder(id=1, mover_delivery_id="TestCase_31-ngi2016001-1484739218",
+                                       delivery_status=DeliveryStatus.delivery_in_progress)
+        self.mock_delivery_repo.get_delivery_order_by_id.return_value = delivery_order
+
+        with patch('delivery.services.mover_service.PeriodicCallback') as mock_periodic_callback:
+            self.mover_delivery_service.start_status_poller(60)
+            mock_periodic_callback.assert_called_once_with(self.mover_delivery_service.poll_delivery_statuses, 60000)
+            mock_periodic_callback.return_value.start.assert_called_once_with()
+
+        actual = yield self.mover_delivery_service.get_delivery_order_with_status(1)
+        self.assertEqual(actual.delivery_status, DeliveryStatus.delivery_in_progress)
+        self.mock_moverinfo_runner.run_and_wait.assert_not_called()
+
+    @gen_test
+    def test_get_delivery_order_with_status_without_poller(self):
+        delivery_order = DeliveryOrder(id=1, mover_delivery_id="TestCase_31-ngi2016001-1484739218",
+                                       delivery_status=DeliveryStatus.delivery_in_progress)
+        self.mock_delivery_repo.get_delivery_order_by_id.return_value = delivery_order
+        actual = yield self.mover_delivery_service.get_delivery_order_with_status(1)
+        self.assertEqual(actual.delivery_status, DeliveryStatus.delivery_successful)
+        self.mock_moverinfo_runner.run_and_wait.assert_called_once()
+
     @gen_test
     def test_deliver_by_staging_id_raises_on_non_existent_stage_id(self):
         self.mock_staging_service.get_stage_order_by_id.return_value = None
@@ -1,8 +1,13 @@
 import mock
 import os
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from delivery.exceptions import ProjectAlreadyOrganisedException
+from tornado.testing import AsyncTestCase, gen_test
+
+from delivery.exceptions import ProjectAlreadyOrganisedException, RunfolderNotFoundException
+from delivery.models.db_models import OrganiseOrder, OrganiseStatus
+from delivery.models.runfolder import Runfolder
 from delivery.models.runfolder import RunfolderFile
 from delivery.models.sample import Sample
 from delivery.repositories.project_repository import GeneralProjectRepository
@@ -217,3 +222,66 @@ class TestOrganiseService(unittest.TestCase):
             mock.call(
                 os.path.join("..", "..", "..", "foo", "report-dir", "another-report-file"),
                 os.path.join(organised_project_path, "report-dir", "another-report-file"))])
+
+
+class TestOrganiseServiceInBackground(AsyncTestCase):
+
+    def setUp(self):
+        super(TestOrganiseServiceInBackground, self).setUp()
+        self.runfolder = test_utils.UNORGANISED_RUNFOLDER
+        self.organise_repo = mock.MagicMock()
+        self.organise_order = OrganiseOrder(id=1, runfolder=self.runfolder.name, status=OrganiseStatus.pending)
+        self.organise_repo.create_organise_order.return_value = self.organise_order
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.organise_service = OrganiseService(
+            mock.MagicMock(spec=RunfolderService),
+            file_system_service=mock.MagicMock(spec=FileSystemService),
+            organise_repo=self.organise_repo,
+            executor=self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        super(TestOrganiseServiceInBackground, self).tearDown()
+
+    @gen_test
+    def test_execute_organise_order(self):
+        organised_runfolder = Runfolder(
+            self.runfolder.name, self.runfolder.path, projects=self.runfolder.projects)
+        with mock.patch.object(
+                self.organise_service, "organise_runfolder", return_value=organised_runfolder) as organise_mock:
+            yield self.organise_service.execute_organise_order(self.organise_order, [1], ["ABC_123"], True)
+            organise_mock.assert_called_once_with(self.runfolder.name, [1], ["ABC_123"], True)
+
+        self.assertEqual(OrganiseStatus.organising_successful, self.organise_order.status)
+        self.assertEqual(self.runfolder.path, self.organise_order.organised_path)
+        self.assertEqual(
+            ",".join(project.name for project in self.runfolder.projects),
+            self.organise_order.projects)
+        self.organise_repo.save.assert_called_with(self.organise_order)
+
+    @gen_test
+    def test_execute_organise_order_failed(self):
+        with mock.patch.object(
+                self.organise_service,
+                "organise_runfolder",
+                side_effect=ProjectAlreadyOrganisedException("already organised")):
+            yield self.organise_service.execute_organise_order(self.organise_order, [], [], False)
+
+        self.assertEqual(OrganiseStatus.organising_failed, self.organise_order.status)
+        self.assertEqual("already organised", self.organise_order.message)
+        self.assertIsNone(self.organise_order.organised_path)
+
+    def test_create_organise_order(self):
+        with mock.patch.object(self.organise_service, "execute_organise_order") as execute_mock:
+            order = self.organise_service.create_organise_order(self.runfolder.name, [], ["ABC_123"], False)
+        self.assertIs(self.organise_order, order)
+        self.organise_repo.create_organise_order.assert_called_once_with(self.runfolder.name)
+        execute_mock.assert_called_once_with(self.organise_order, [], ["ABC_123"], False)
+
+    def test_create_organise_order_for_unknown_runfolder(self):
+        self.organise_service.runfolder_service.find_runfolder.side_effect = RunfolderNotFoundException
+        with mock.patch.object(self.organise_service, "execute_organise_order") as execute_mock, \
+                self.assertRaises(RunfolderNotFoundException):
+            self.organise_service.create_organise_order("foo", [], [], False)
+        self.organise_repo.create_organise_order.assert_not_called()
+        execute_mock.assert_not_called()
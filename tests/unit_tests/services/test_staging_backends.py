@@ -0,0 +1,433 @@
+import mock
+import os
+import shutil
+import signal
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado.testing import AsyncTestCase
+from tornado.gen import coroutine
+import tornado.testing
+
+from delivery.exceptions import StagingFailedException
+from delivery.services.staging_backends import StagingBackend, RsyncStagingBackend, NativeCopyStagingBackend, \
+    LinkStagingBackend, ChecksumVerifyingStagingBackend
+from delivery.services.metadata_service import MetadataService
+from delivery.services.external_program_service import ExternalProgramService
+from delivery.models.db_models import StagingOrder, StagingStatus
+from delivery.models.execution import Execution, ExecutionResult
+
+
+class TestStagingBackend(AsyncTestCase):
+
+    # - Throttle writing the progress to the database
+    @mock.patch('delivery.services.staging_backends.time')
+    def test_progress_is_saved_periodically(self, mock_time):
+        staging_order = StagingOrder(id=1, source='/test/this', staging_target='/foo')
+        mock_repo = mock.MagicMock()
+        update_progress = StagingBackend._progress_updater(staging_order, mock_repo)
+
+        for now in (100, 101, 102):
+            mock_time.monotonic.return_value = now
+            update_progress((1234567, 524800.0, 3723))
+        self.assertEqual(1, mock_repo.save.call_count)
+        self.assertEqual(1234567, staging_order.bytes_transferred)
+
+        mock_time.monotonic.return_value = 100 + StagingBackend.PROGRESS_UPDATE_INTERVAL
+        update_progress((1234567, 524800.0, 3723))
+        self.assertEqual(2, mock_repo.save.call_count)
+
+    def test_progress_of_workers_is_aggregated(self):
+        staging_order = StagingOrder(id=1, source='/test/this', staging_target='/foo')
+        update_progress = StagingBackend._progress_updater(staging_order, mock.MagicMock())
+
+        update_progress((100, 10.0, 5), worker=0)
+        update_progress((200, 20.0, None), worker=1)
+        self.assertEqual(staging_order.bytes_transferred, 300)
+        self.assertEqual(staging_order.transfer_rate, 30.0)
+        self.assertIsNone(staging_order.eta)
+
+        update_progress((300, 20.0, 8), worker=1)
+        self.assertEqual(staging_order.bytes_transferred, 400)
+        self.assertEqual(staging_order.eta, 8)
+
+
+class TestRsyncStagingBackend(AsyncTestCase):
+
+    def setUp(self):
+        # a project with three samples of different sizes
+        self.source = tempfile.mkdtemp()
+        for sample, size in [('sample1', 100), ('sample2', 60), ('sample3', 50)]:
+            os.makedirs(os.path.join(self.source, sample))
+            with open(os.path.join(self.source, sample, 'reads.fastq.gz'), 'wb') as f:
+                f.write(b'0' * size)
+
+        self.staging_order = StagingOrder(id=1, source=self.source, staging_target='/staging/1/ABC_123',
+                                          status=StagingStatus.staging_in_progress)
+
+        self.commands = []
+        self.process_groups = []
+        self.status_codes = {}
+        self.mock_external_runner_service = mock.create_autospec(ExternalProgramService)
+
+        def _run(cmd, stream_output=False, process_group=None):
+            self.commands.append(cmd)
+            self.process_groups.append(process_group)
+            execution = Execution(pid=len(self.commands), process_obj=mock.MagicMock())
+            return execution
+
+        @coroutine
+        def _wait(execution, stdout_line_callback=None):
+            stdout_line_callback("         10,000  50%   10.00kB/s    0:00:0{} (xfr#1, to-chk=0/1)".format(execution.pid))
+            return ExecutionResult(stdout="Total file size: 1,{:03d} bytes".format(execution.pid),
+                                   stderr="",
+                                   status_code=self.status_codes.get(execution.pid, 0))
+
+        self.mock_external_runner_service.run.side_effect = _run
+        self.mock_external_runner_service.wait_for_execution = _wait
+        super(TestRsyncStagingBackend, self).setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source)
+        super(TestRsyncStagingBackend, self).tearDown()
+
+    def _backend(self, rsync_workers):
+        return RsyncStagingBackend(self.mock_external_runner_service, rsync_workers=rsync_workers)
+
+    # - Parse the progress reported by rsync
+    def test_parse_rsync_progress(self):
+        self.assertEqual(
+            (1234567, 512.5 * 1024, 3723),
+            RsyncStagingBackend.parse_rsync_progress(
+                "      1,234,567  12%  512.50kB/s    1:02:03 (xfr#1, to-chk=9/10)"))
+        # rsync has not estimated the remaining time yet
+        self.assertEqual(
+            (0, 0.0, None),
+            RsyncStagingBackend.parse_rsync_progress("              0   0%    0.00kB/s    ??:??:??"))
+        for line in ("", "Total file size: 207,707,566 bytes", "sending incremental file list"):
+            self.assertIsNone(RsyncStagingBackend.parse_rsync_progress(line))
+
+    def test_partition_source_balances_size(self):
+        self.assertListEqual(RsyncStagingBackend._partition_source(self.source, 2),
+                             [['sample1'], ['sample2', 'sample3']])
+
+    def test_partition_source_splits_directories_when_too_few_entries(self):
+        self.assertListEqual(RsyncStagingBackend._partition_source(os.path.join(self.source, 'sample1'), 2),
+                             [['reads.fastq.gz']])
+        self.assertListEqual(RsyncStagingBackend._partition_source(self.source, 4),
+                             [['sample1/reads.fastq.gz'], ['sample2/reads.fastq.gz'], ['sample3/reads.fastq.gz']])
+
+    @tornado.testing.gen_test
+    def test_stage_with_one_worker(self):
+        size = yield self._backend(rsync_workers=1).stage(self.staging_order, mock.MagicMock())
+        self.assertEqual(len(self.commands), 1)
+        self.assertListEqual(self.commands[0][-2:], [self.source + "/", '/staging/1/ABC_123'])
+        self.assertListEqual(self.process_groups, [0])
+        self.assertEqual(size, 1001)
+
+    @tornado.testing.gen_test
+    def test_stage_with_parallel_workers(self):
+        size = yield self._backend(rsync_workers=2).stage(self.staging_order, mock.MagicMock())
+
+        self.assertEqual(len(self.commands), 2)
+        self.assertListEqual(self.commands[0][-3:],
+                             ['--relative', os.path.join(self.source, '.', 'sample1'), '/staging/1/ABC_123'])
+        self.assertListEqual(self.commands[1][-4:],
+                             ['--relative',
+                              os.path.join(self.source, '.', 'sample2'),
+                              os.path.join(self.source, '.', 'sample3'),
+                              '/staging/1/ABC_123'])
+
+        # the workers are in a process group led by the first of them, whose pid is that of the order
+        self.assertListEqual(self.process_groups, [0, 1])
+        self.assertEqual(self.staging_order.pid, 1)
+        # the sizes and the progress of the workers are aggregated
+        self.assertEqual(size, 1001 + 1002)
+        self.assertEqual(self.staging_order.bytes_transferred, 20000)
+        self.assertEqual(self.staging_order.transfer_rate, 2 * 10 * 1024)
+        self.assertEqual(self.staging_order.eta, 2)
+
+    @tornado.testing.gen_test
+    def test_stage_with_parallel_workers_fails_if_one_worker_fails(self):
+        self.status_codes[2] = 23
+        with mock.patch('delivery.services.staging_backends.os.killpg') as mock_killpg, \
+                self.assertRaises(StagingFailedException):
+            yield self._backend(rsync_workers=2).stage(self.staging_order, mock.MagicMock())
+        mock_killpg.assert_not_called()
+
+        # the other workers are terminated, if they are still running when one of them fails
+        self.status_codes[2] = 0
+        self.status_codes[3] = 23
+        with mock.patch('delivery.services.staging_backends.os.killpg') as mock_killpg, \
+                self.assertRaises(StagingFailedException):
+            yield self._backend(rsync_workers=2).stage(self.staging_order, mock.MagicMock())
+        mock_killpg.assert_called_once_with(3, signal.SIGTERM)
+
+
+class TestNativeCopyStagingBackend(AsyncTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, 'ABC_123')
+        os.makedirs(os.path.join(self.source, 'sample1'))
+        os.makedirs(os.path.join(self.source, 'plots'))
+        with open(os.path.join(self.source, 'sample1', 'reads.fastq.gz'), 'wb') as f:
+            f.write(os.urandom(3 * 1024))
+        for i in range(20):
+            with open(os.path.join(self.source, 'plots', 'plot{}.png'.format(i)), 'wb') as f:
+                f.write(os.urandom(i))
+        os.symlink(os.path.join(self.source, 'sample1', 'reads.fastq.gz'), os.path.join(self.source, 'link.fastq.gz'))
+
+        self.staging_target = os.path.join(self.tmp_dir, 'staging', '1', 'ABC_123')
+        os.makedirs(self.staging_target)
+        self.staging_order = StagingOrder(id=1, source=self.source, staging_target=self.staging_target,
+                                          status=StagingStatus.staging_in_progress)
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        super(TestNativeCopyStagingBackend, self).setUp()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.tmp_dir)
+        super(TestNativeCopyStagingBackend, self).tearDown()
+
+    def _assert_same_file(self, source_file, target_file):
+        self.assertFalse(os.path.islink(target_file))
+        with open(source_file, 'rb') as source_fh, open(target_file, 'rb') as target_fh:
+            self.assertEqual(source_fh.read(), target_fh.read())
+        self.assertEqual(int(os.stat(source_file).st_mtime), int(os.stat(target_file).st_mtime))
+
+    @tornado.testing.gen_test
+    def test_stage(self):
+        size = yield NativeCopyStagingBackend(self.executor).stage(self.staging_order, mock.MagicMock())
+
+        self.assertEqual(size, 2 * 3 * 1024 + sum(range(20)))
+        self.assertEqual(self.staging_order.bytes_transferred, size)
+        for root, _, files in os.walk(self.source):
+            for file_name in files:
+                relative_path = os.path.relpath(os.path.join(root, file_name), self.source)
+                self._assert_same_file(os.path.join(self.source, relative_path),
+                                       os.path.join(self.staging_target, relative_path))
+
+    def test_copy_file_in_chunks(self):
+        source_file = os.path.join(self.source, 'sample1', 'reads.fastq.gz')
+        target_file = os.path.join(self.tmp_dir, 'reads.fastq.gz')
+        with mock.patch.object(NativeCopyStagingBackend, 'COPY_CHUNK_SIZE', 1000):
+            self.assertEqual(NativeCopyStagingBackend._copy_file(source_file, target_file), 3 * 1024)
+        self._assert_same_file(source_file, target_file)
+
+    def test_copy_file_with_sendfile(self):
+        source_file = os.path.join(self.source, 'sample1', 'reads.fastq.gz')
+        target_file = os.path.join(self.tmp_dir, 'reads.fastq.gz')
+        with mock.patch('delivery.services.staging_backends.os.copy_file_range',
+                        side_effect=OSError(18, 'Invalid cross-device link'), create=True):
+            NativeCopyStagingBackend._copy_file(source_file, target_file)
+        self._assert_same_file(source_file, target_file)
+
+    @tornado.testing.gen_test
+    def test_stage_and_compute_checksums(self):
+        checksums = {}
+        yield NativeCopyStagingBackend(self.executor).stage(self.staging_order, mock.MagicMock(), checksums=checksums)
+
+        self.assertEqual(len(checksums), 22)
+        for target_file, checksum in checksums.items():
+            self.assertEqual(checksum, MetadataService.hash_file(target_file))
+        self._assert_same_file(os.path.join(self.source, 'plots', 'plot19.png'),
+                               os.path.join(self.staging_target, 'plots', 'plot19.png'))
+
+    def test_copy_file_skips_unchanged_files(self):
+        source_file = os.path.join(self.source, 'sample1', 'reads.fastq.gz')
+        target_file = os.path.join(self.tmp_dir, 'reads.fastq.gz')
+        NativeCopyStagingBackend._copy_file(source_file, target_file)
+        with mock.patch('delivery.services.staging_backends.open') as mock_open:
+            NativeCopyStagingBackend._copy_file(source_file, target_file)
+            mock_open.assert_not_called()
+
+
+class TestLinkStagingBackend(AsyncTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, 'ABC_123')
+        os.makedirs(os.path.join(self.source, 'sample1'))
+        with open(os.path.join(self.source, 'sample1', 'reads.fastq.gz'), 'wb') as f:
+            f.write(b'0' * 100)
+        os.symlink(os.path.join(self.source, 'sample1', 'reads.fastq.gz'), os.path.join(self.source, 'link.fastq.gz'))
+        self.staging_target = os.path.join(self.tmp_dir, 'staging', '1', 'ABC_123')
+        os.makedirs(self.staging_target)
+
+        self.staging_order = StagingOrder(id=1, source=self.source, staging_target=self.staging_target,
+                                          status=StagingStatus.staging_in_progress)
+
+        self.mock_fallback_backend = mock.create_autospec(StagingBackend)
+
+        @coroutine
+        def _stage(staging_order, staging_repo, checksums=None):
+            return 200
+
+        self.mock_fallback_backend.stage.side_effect = _stage
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.backend = LinkStagingBackend(self.executor, self.mock_fallback_backend)
+        super(TestLinkStagingBackend, self).setUp()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.tmp_dir)
+        super(TestLinkStagingBackend, self).tearDown()
+
+    def test_link_dir(self):
+        size = LinkStagingBackend._link_dir(self.source, self.staging_target)
+        self.assertEqual(size, 200)
+
+        staged_file = os.path.join(self.staging_target, 'sample1', 'reads.fastq.gz')
+        staged_link = os.path.join(self.staging_target, 'link.fastq.gz')
+        for staged in [staged_file, staged_link]:
+            self.assertFalse(os.path.islink(staged))
+            with open(staged, 'rb') as f:
+                self.assertEqual(f.read(), b'0' * 100)
+
+        # linking again leaves the staged files as they are
+        self.assertEqual(LinkStagingBackend._link_dir(self.source, self.staging_target), 200)
+
+    def test_link_dir_decides_if_files_can_be_cloned_by_file_system(self):
+        other_file = os.path.join(self.source, 'sample2', 'reads.fastq.gz')
+        os.makedirs(os.path.dirname(other_file))
+        with open(other_file, 'wb') as f:
+            f.write(b'0' * 100)
+        stat = os.stat
+
+        def _stat(path, *args, **kwargs):
+            # sample2 is on another file system
+            stat_result = stat(path, *args, **kwargs)
+            if path == other_file:
+                fields = list(stat_result)
+                fields[2] += 1
+                return os.stat_result(fields)
+            return stat_result
+
+        with mock.patch('os.stat', side_effect=_stat), \
+                mock.patch.object(LinkStagingBackend, '_clone_file', return_value=False) as mock_clone_file:
+            self.assertEqual(LinkStagingBackend._link_dir(self.source, self.staging_target), 300)
+
+        # the file system of sample1 does not support cloning, which is only tried once for the two files from it
+        cloned_files = [call[0][0] for call in mock_clone_file.call_args_list]
+        self.assertEqual(len(cloned_files), 2)
+        self.assertIn(other_file, cloned_files)
+        self.assertTrue(os.path.samefile(other_file, os.path.join(self.staging_target, 'sample2', 'reads.fastq.gz')))
+
+    @tornado.testing.gen_test
+    def test_stage_by_linking(self):
+        size = yield self.backend.stage(self.staging_order, mock.MagicMock())
+        self.mock_fallback_backend.stage.assert_not_called()
+        self.assertEqual(size, 200)
+        self.assertTrue(os.path.isfile(os.path.join(self.staging_target, 'sample1', 'reads.fastq.gz')))
+
+    @tornado.testing.gen_test
+    def test_stage_falls_back_if_linking_fails(self):
+        with mock.patch.object(LinkStagingBackend, '_link_dir', side_effect=OSError(18, 'Invalid cross-device link')):
+            size = yield self.backend.stage(self.staging_order, mock.MagicMock())
+        self.mock_fallback_backend.stage.assert_called_once()
+        self.assertEqual(size, 200)
+
+    @tornado.testing.gen_test
+    def test_stage_with_fallback_on_other_device(self):
+        with mock.patch.object(LinkStagingBackend, '_is_same_device', return_value=False):
+            yield self.backend.stage(self.staging_order, mock.MagicMock())
+        self.mock_fallback_backend.stage.assert_called_once()
+        self.assertFalse(os.path.exists(os.path.join(self.staging_target, 'sample1')))
+
+
+class TestChecksumVerifyingStagingBackend(AsyncTestCase):
+
+    def setUp(self):
+        # a staged organised project, with the checksum file listing paths relative to the project directory
+        self.staging_target = tempfile.mkdtemp()
+        self.runfolder_dir = os.path.join(self.staging_target, '160930_ST-E00216_0111_BH37CWALXX')
+        os.makedirs(os.path.join(self.runfolder_dir, 'sample1'))
+        self.sample_files = []
+        checksums = {}
+        for i in range(3):
+            sample_file = os.path.join(self.runfolder_dir, 'sample1', 'reads{}.fastq.gz'.format(i))
+            with open(sample_file, 'wb') as f:
+                f.write(os.urandom(100))
+            self.sample_files.append(sample_file)
+            checksums[os.path.relpath(sample_file, self.staging_target)] = MetadataService.hash_file(sample_file)
+        MetadataService.write_checksum_file(os.path.join(self.runfolder_dir, 'checksums.md5'), checksums)
+
+        self.staging_order = StagingOrder(id=1, source='/foo/ABC_123', staging_target=self.staging_target,
+                                          status=StagingStatus.staging_in_progress)
+
+        self.mock_backend = mock.create_autospec(StagingBackend)
+        self.backend_checksums = {}
+
+        @coroutine
+        def _stage(staging_order, staging_repo, checksums=None):
+            checksums.update(self.backend_checksums)
+            return 300
+
+        self.mock_backend.stage.side_effect = _stage
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        super(TestChecksumVerifyingStagingBackend, self).setUp()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.staging_target)
+        super(TestChecksumVerifyingStagingBackend, self).tearDown()
+
+    @tornado.testing.gen_test
+    def test_stage_and_verify(self):
+        backend = ChecksumVerifyingStagingBackend(self.mock_backend, self.executor)
+        size = yield backend.stage(self.staging_order, mock.MagicMock())
+        self.assertEqual(size, 300)
+        self.assertIsNone(self.staging_order.checksum_mismatches)
+
+    @tornado.testing.gen_test
+    def test_files_hashed_by_the_backend_are_not_read_again(self):
+        for sample_file in self.sample_files:
+            self.backend_checksums[sample_file] = MetadataService.hash_file(sample_file)
+        mock_metadata_service = mock.MagicMock(wraps=MetadataService)
+        backend = ChecksumVerifyingStagingBackend(self.mock_backend, self.executor,
+                                                  metadata_service=mock_metadata_service)
+
+        yield backend.stage(self.staging_order, mock.MagicMock())
+        mock_metadata_service.hash_files.assert_called_once_with([])
+        self.assertIsNone(self.staging_order.checksum_mismatches)
+
+    @tornado.testing.gen_test
+    def test_stage_fails_on_mismatching_and_missing_files(self):
+        with open(self.sample_files[0], 'ab') as f:
+            f.write(b'corrupt')
+        os.remove(self.sample_files[1])
+        backend = ChecksumVerifyingStagingBackend(self.mock_backend, self.executor)
+
+        with self.assertRaises(StagingFailedException):
+            yield backend.stage(self.staging_order, mock.MagicMock())
+
+        mismatches = self.staging_order.checksum_mismatches.split("\n")
+        self.assertEqual(len(mismatches), 2)
+        self.assertEqual(mismatches[0], "{}: missing".format(self.sample_files[1]))
+        self.assertTrue(mismatches[1].startswith("{}: expected".format(self.sample_files[0])))
+
+    @tornado.testing.gen_test
+    def test_stage_and_verify_runfolder(self):
+        # a staged runfolder, with MD5/checksums.md5 listing paths relative to the parent of the runfolder
+        staged_runfolder = os.path.join(self.staging_target, '160930_ST-E00216_0112_BH37CWALXX')
+        sample_file = os.path.join(staged_runfolder, 'Unaligned', 'ABC_123', 'reads.fastq.gz')
+        os.makedirs(os.path.dirname(sample_file))
+        with open(sample_file, 'wb') as f:
+            f.write(os.urandom(100))
+        os.makedirs(os.path.join(staged_runfolder, 'MD5'))
+        MetadataService.write_checksum_file(
+            os.path.join(staged_runfolder, 'MD5', 'checksums.md5'),
+            {'160930_ST-E00216_0112_BH37CWALXX/Unaligned/ABC_123/reads.fastq.gz': MetadataService.hash_file(
+                sample_file)})
+        backend = ChecksumVerifyingStagingBackend(self.mock_backend, self.executor)
+
+        yield backend.stage(self.staging_order, mock.MagicMock())
+        self.assertIsNone(self.staging_order.checksum_mismatches)
+
+        with open(sample_file, 'ab') as f:
+            f.write(b'corrupt')
+        with self.assertRaises(StagingFailedException):
+            yield backend.stage(self.staging_order, mock.MagicMock())
+        self.assertTrue(self.staging_order.checksum_mismatches.startswith("{}: expected".format(sample_file)))
@@ -3,13 +3,17 @@ import signal
 import random
 import os
 import tempfile
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from tornado.testing import AsyncTestCase
-from tornado.gen import coroutine
+from tornado.concurrent import Future
+from tornado.gen import coroutine, moment
 import tornado.testing
 
 from delivery.exceptions import InvalidStatusException, RunfolderNotFoundException, ProjectNotFoundException
 from delivery.services.staging_service import StagingService
+from delivery.services.staging_backends import NativeCopyStagingBackend, LinkStagingBackend
 from delivery.services.file_system_service import FileSystemService
 from delivery.services.external_program_service import ExternalProgramService
 from delivery.models.db_models import StagingOrder, StagingStatus
@@ -26,7 +30,7 @@ class TestStagingService(AsyncTestCase):
         def __init__(self):
             self.orders_state = []
 
-        def get_staging_order_by_id(self, identifier, custom_session=None):
+        def get_staging_order_by_id(self, identifier):
             return list(filter(lambda x: x.id == identifier, self.orders_state))[0]
 
         def create_staging_order(self, source, status, staging_target_dir):
@@ -73,25 +77,29 @@ class TestStagingService(AsyncTestCase):
 
         self.mock_file_system_service = mock.create_autospec(FileSystemService)
 
+        progress_mimicing_rsync = ["     98,304,000  47%   93.75MB/s    0:00:01 (xfr#1, to-chk=0/1)",
+                                   "    207,707,566 100%   98.76MB/s    0:00:02 (xfr#1, to-chk=0/1)"]
+
         @coroutine
-        def wait_as_coroutine(x):
+        def wait_as_coroutine(x, stdout_line_callback=None):
+            for line in progress_mimicing_rsync:
+                stdout_line_callback(line)
             return ExecutionResult(stdout=stdout_mimicing_rsync, stderr="", status_code=0)
 
         self.mock_external_runner_service.wait_for_execution = wait_as_coroutine
         mock_staging_repo = mock.MagicMock()
         mock_staging_repo.get_staging_order_by_id.return_value = self.staging_order1
         mock_staging_repo.create_staging_order.return_value = self.staging_order1
+        mock_staging_repo.get_pending_staging_orders.side_effect = \
+            lambda: [order for order in [self.staging_order1] if order.status == StagingStatus.pending]
 
         self.mock_runfolder_repo = mock.MagicMock()
 
-        mock_db_session_factory = mock.MagicMock()
-
         self.staging_service = StagingService(staging_dir="/tmp",
                                               project_links_directory="/tmp",
                                               external_program_service=self.mock_external_runner_service,
                                               staging_repo=mock_staging_repo,
                                               runfolder_repo=self.mock_runfolder_repo,
-                                              session_factory=mock_db_session_factory,
                                               project_dir_repo=self.mock_general_project_repo,
                                               file_system_service=self.mock_file_system_service)
         self.staging_service.io_loop_factory = MockIOLoop
@@ -112,11 +120,16 @@ class TestStagingService(AsyncTestCase):
         assert_eventually_equals(self, 1, _get_stating_status, StagingStatus.staging_successful)
         self.assertEqual(self.staging_order1.size, 207707566)
 
+        # the last progress reported by rsync is kept
+        self.assertEqual(self.staging_order1.bytes_transferred, 207707566)
+        self.assertAlmostEqual(self.staging_order1.transfer_rate, 98.76 * 1024 ** 2)
+        self.assertEqual(self.staging_order1.eta, 2)
+
     # - Set status to failed if rsyncing is not successful
     @tornado.testing.gen_test
     def test_unsuccessful_staging_order(self):
         @coroutine
-        def wait_as_coroutine(x):
+        def wait_as_coroutine(x, stdout_line_callback=None):
             return ExecutionResult(stdout="", stderr="", status_code=1)
 
         self.mock_external_runner_service.wait_for_execution = wait_as_coroutine
@@ -131,7 +144,7 @@ class TestStagingService(AsyncTestCase):
     # - Set status to failed if there is an exception is not successful
     def test_exception_in_staging_order(self):
 
-        def raise_exception(x):
+        def raise_exception(x, stdout_line_callback=None):
             raise Exception
         self.mock_external_runner_service.wait_for_execution = raise_exception
         self.staging_service.stage_order(stage_order=self.staging_order1)
@@ -172,21 +185,173 @@ class TestStagingService(AsyncTestCase):
         self.staging_order1.status = StagingStatus.staging_in_progress
         self.staging_order1.pid = 1337
         actual = self.staging_service.kill_process_of_staging_order(self.staging_order1.id)
-        mock_os.kill.assert_called_with(self.staging_order1.pid, signal.SIGTERM)
+        mock_os.killpg.assert_called_with(self.staging_order1.pid, signal.SIGTERM)
         self.assertTrue(actual)
 
         # It should handle if kill raises a OSError gracefully
         self.staging_order1.status = StagingStatus.staging_in_progress
         self.staging_order1.pid = 1337
-        mock_os.kill.side_effect = OSError
+        mock_os.killpg.side_effect = OSError
         actual = self.staging_service.kill_process_of_staging_order(self.staging_order1.id)
-        mock_os.kill.assert_called_with(self.staging_order1.pid, signal.SIGTERM)
+        mock_os.killpg.assert_called_with(self.staging_order1.pid, signal.SIGTERM)
         self.assertFalse(actual)
 
+    # - Re-queue and restart stagings which were in progress when the service was stopped
+    @mock.patch('delivery.services.staging_service.os')
+    def test_restart_unfinished_orders(self, mock_os):
+        self.staging_order1.status = StagingStatus.staging_in_progress
+        self.staging_order1.pid = 1337
+        self.staging_service.staging_repo.get_staging_orders_by_status.return_value = [self.staging_order1]
+
+        rsync_command_line = ['rsync', '-r', '/test/this/', self.staging_order1.staging_target]
+        with mock.patch.object(StagingService, '_process_command_line', return_value=rsync_command_line):
+            self.staging_service.restart_unfinished_orders()
+
+        self.staging_service.staging_repo.get_staging_orders_by_status.assert_called_once_with(
+            StagingStatus.staging_in_progress)
+        mock_os.kill.assert_any_call(1337, 0)
+        mock_os.killpg.assert_called_with(1337, signal.SIGTERM)
+        self.assertEqual(StagingStatus.staging_successful, self.staging_order1.status)
+
+    @mock.patch('delivery.services.staging_service.os')
+    def test_restart_unfinished_orders_does_not_kill_other_processes(self, mock_os):
+        self.staging_order1.status = StagingStatus.staging_in_progress
+        self.staging_order1.pid = 1337
+        self.staging_service.staging_repo.get_staging_orders_by_status.return_value = [self.staging_order1]
+
+        # the pid has been reused by an unrelated process
+        with mock.patch.object(StagingService, '_process_command_line', return_value=['sleep', '100']):
+            self.staging_service.restart_unfinished_orders()
+        mock_os.kill.assert_called_once_with(1337, 0)
+        self.assertEqual(StagingStatus.staging_successful, self.staging_order1.status)
+
+        # the process is no longer running
+        mock_os.kill.reset_mock()
+        mock_os.kill.side_effect = OSError
+        self.staging_order1.status = StagingStatus.staging_in_progress
+        self.staging_order1.pid = 1337
+        self.staging_service.restart_unfinished_orders()
+        mock_os.kill.assert_called_once_with(1337, 0)
+        self.assertEqual(StagingStatus.staging_successful, self.staging_order1.status)
+
     @mock.patch('delivery.services.staging_service.os')
     def test_kill_stage_order_not_valid_state(self, mock_os):
         # If the status is not in progress it should not be possible to kill it.
         self.staging_order1.status = StagingStatus.staging_successful
         actual = self.staging_service.kill_process_of_staging_order(self.staging_order1.id)
-        mock_os.kill.assert_not_called()
+        mock_os.killpg.assert_not_called()
         self.assertFalse(actual)
+
+    @tornado.testing.gen_test
+    def test_kill_stage_order_without_process(self):
+        # the native and link backends copy the files in threads, so their staging orders have no process to kill
+        source = tempfile.mkdtemp()
+        staging_dir = tempfile.mkdtemp()
+        with open(os.path.join(source, 'file.txt'), 'w') as f:
+            f.write('foo')
+        executor = ThreadPoolExecutor(max_workers=1)
+        for backend in [NativeCopyStagingBackend(executor),
+                        LinkStagingBackend(executor, fallback_backend=mock.MagicMock())]:
+            self.staging_order1.source = source
+            self.staging_order1.staging_target = os.path.join(staging_dir, type(backend).__name__)
+            self.staging_order1.status = StagingStatus.staging_in_progress
+            self.staging_order1.pid = None
+            os.makedirs(self.staging_order1.staging_target)
+            yield backend.stage(self.staging_order1, mock.MagicMock())
+            self.assertIsNone(self.staging_order1.pid)
+
+            with mock.patch('delivery.services.staging_service.os') as mock_os:
+                actual = self.staging_service.kill_process_of_staging_order(self.staging_order1.id)
+            mock_os.killpg.assert_not_called()
+            self.assertFalse(actual)
+            self.assertEqual(StagingStatus.staging_in_progress, self.staging_order1.status)
+        executor.shutdown()
+        shutil.rmtree(source)
+        shutil.rmtree(staging_dir)
+
+
+class TestStagingScheduler(AsyncTestCase):
+
+    RSYNC_STDOUT = "Total file size: 1,024 bytes"
+
+    def setUp(self):
+        # orders 1 and 2 are on one file system, and orders 3 and 4 are on another
+        self.devices = {'/fs1/a': 1, '/fs1/b': 1, '/fs2/a': 2, '/fs2/b': 2}
+        self.orders = [
+            StagingOrder(id=1, source='/fs1/a', staging_target='/staging/1', status=StagingStatus.pending, priority=0),
+            StagingOrder(id=2, source='/fs1/b', staging_target='/staging/2', status=StagingStatus.pending, priority=0),
+            StagingOrder(id=3, source='/fs2/a', staging_target='/staging/3', status=StagingStatus.pending, priority=0),
+            StagingOrder(id=4, source='/fs2/b', staging_target='/staging/4', status=StagingStatus.pending, priority=5)]
+
+        mock_staging_repo = mock.MagicMock()
+        mock_staging_repo.get_staging_order_by_id.side_effect = \
+            lambda identifier: self.orders[identifier - 1]
+        mock_staging_repo.get_pending_staging_orders.side_effect = lambda: sorted(
+            [order for order in self.orders if order.status == StagingStatus.pending],
+            key=lambda order: (-order.priority, order.id))
+
+        mock_file_system_service = mock.create_autospec(FileSystemService)
+        mock_file_system_service.stat.side_effect = lambda path: mock.MagicMock(st_dev=self.devices[path])
+
+        # keep track of the running rsyncs, so that they can be finished one at a time
+        self.executions = {}
+        mock_external_runner_service = mock.create_autospec(ExternalProgramService)
+
+        def _run(cmd, stream_output=False, process_group=None):
+            source = cmd[-2].rstrip("/")
+            execution = Execution(pid=random.randint(1, 1000), process_obj=mock.MagicMock())
+            self.executions[source] = Future()
+            execution.source = source
+            return execution
+
+        mock_external_runner_service.run.side_effect = _run
+        mock_external_runner_service.wait_for_execution = \
+            lambda execution, stdout_line_callback=None: self.executions[execution.source]
+
+        self.staging_service = StagingService(staging_dir="/staging",
+                                              project_links_directory="/tmp",
+                                              external_program_service=mock_external_runner_service,
+                                              staging_repo=mock_staging_repo,
+                                              runfolder_repo=mock.MagicMock(),
+                                              project_dir_repo=mock.MagicMock(),
+                                              file_system_service=mock_file_system_service,
+                                              max_concurrent_stagings=2,
+                                              max_concurrent_stagings_per_device=1)
+        self.staging_service.io_loop_factory = MockIOLoop
+        super(TestStagingScheduler, self).setUp()
+
+    def _statuses(self):
+        return [order.status for order in self.orders]
+
+    @coroutine
+    def _finish_staging(self, source, status_code):
+        self.executions[source].set_result(ExecutionResult(stdout=self.RSYNC_STDOUT, stderr="", status_code=status_code))
+        # let the IOLoop run the callbacks of the finished staging
+        for _ in range(5):
+            yield moment
+
+    @tornado.testing.gen_test
+    def test_limits_concurrent_stagings(self):
+        # all orders are queued, so staging one of them dispatches as many of them as possible
+        yield self.staging_service.stage_order(stage_order=self.orders[0])
+
+        # order 4 has the highest priority, and order 1 is the oldest order on the other file system
+        self.assertListEqual(
+            [StagingStatus.staging_in_progress, StagingStatus.pending,
+             StagingStatus.pending, StagingStatus.staging_in_progress],
+            self._statuses())
+
+        # when order 4 finishes, order 2 must still wait for order 1 on the same file system, so order 3 is started
+        yield self._finish_staging('/fs2/b', status_code=0)
+        self.assertListEqual(
+            [StagingStatus.staging_in_progress, StagingStatus.pending,
+             StagingStatus.staging_in_progress, StagingStatus.staging_successful],
+            self._statuses())
+
+        # a failed staging also frees up its slot
+        yield self._finish_staging('/fs1/a', status_code=1)
+        self.assertListEqual(
+            [StagingStatus.staging_failed, StagingStatus.staging_in_progress,
+             StagingStatus.staging_in_progress, StagingStatus.staging_successful],
+            self._statuses())
+